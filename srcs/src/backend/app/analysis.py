@@ -5,10 +5,13 @@ from typing import Dict, Any, Optional, Literal, Sequence, Tuple
 
 from sqlmodel import Session
 
-from .models import FileMeta
+from .extraction import ExtractedDocument, extract_document
+from .metrics import EXTRACTED_CHARS, EXTRACTION_TRUNCATED
+from .models import FileMeta, FileFacet
 from .ollama_client import ask_llm  # helper for calling ollama
 
-UPLOAD_DIR = "/data/uploads"  # or whatever tusd uses inside /data
+# where tusd stores uploads inside the container, the same setting as worker.UPLOAD_ROOT
+UPLOAD_DIR = os.getenv("UPLOAD_ROOT", "/data/uploads")
 
 FieldType = Literal["list", "string", "date"]
 FieldSchema = Sequence[Tuple[str, FieldType]]
@@ -64,21 +67,13 @@ for schema in SCHEMA_BY_TYPE.values():
         if field not in STRUCTURED_FIELD_TYPES:
             STRUCTURED_FIELD_TYPES[field] = field_type
 VALID_ANALYSIS_TYPES = set(SCHEMA_BY_TYPE.keys()) | {"record"}
+FACET_FIELDS = [field for field, field_type in STRUCTURED_FIELD_TYPES.items() if field_type == "list"]
+
+def extract_text_from_file(path: str, filename: Optional[str] = None) -> str:
+    return extract_document(path, filename).text
 
-def extract_text_from_file(path: str) -> str:
-    # Very rough sketch, you can branch by extension
-    if path.lower().endswith(".pdf"):
-        from pypdf import PdfReader
-        reader = PdfReader(path)
-        return "\n".join(page.extract_text() or "" for page in reader.pages)
-    elif path.lower().endswith(".docx"):
-        import docx
-        doc = docx.Document(path)
-        return "\n".join(p.text for p in doc.paragraphs)
-    else:
-        # assume plaintext
-        with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
+
+BASIC_STATS_KEYS = ("word_count", "sentence_count", "avg_words_per_sentence", "char_count")
 
 
 def compute_basic_stats(text: str) -> Dict[str, Any]:
@@ -280,7 +275,22 @@ def _hydrate_common_fields(file_meta: FileMeta, data: Dict[str, Any]) -> None:
             setattr(file_meta, field, normalized)
 
 
+def sync_facets(file_meta: FileMeta) -> None:
+    """Rebuild the FileFacet rows from the list-valued structured fields."""
+    facets = []
+    for field in FACET_FIELDS:
+        for value in dict.fromkeys(getattr(file_meta, field) or []):
+            facets.append(FileFacet(field=field, value=value))
+    # replacing the collection deletes the stale rows (delete-orphan cascade)
+    file_meta.facets = facets
+
+
 def apply_structured_metadata(file_meta: FileMeta, llm_json: Dict[str, Any]) -> None:
+    _apply_structured_fields(file_meta, llm_json)
+    sync_facets(file_meta)
+
+
+def _apply_structured_fields(file_meta: FileMeta, llm_json: Dict[str, Any]) -> None:
     file_meta.analysis_summary_text = None
     file_meta.analysis_type = None
     _reset_structured_fields(file_meta)
@@ -312,34 +322,50 @@ def apply_structured_metadata(file_meta: FileMeta, llm_json: Dict[str, Any]) ->
     elif data:
         file_meta.analysis_type = "record"
 
+def extract_file(file_meta: FileMeta) -> ExtractedDocument:
+    """
+    Parse the uploaded file once and persist its text and block structure,
+    so that analysis and vector indexing both work from the same text.
+    """
+    # resolve path from tus_id (depends on how tusd stores files; adjust if needed)
+    path = os.path.join(UPLOAD_DIR, file_meta.tus_id)
+    doc = extract_document(path, file_meta.filename)
+    EXTRACTED_CHARS.observe(len(doc.text))
+    if doc.truncated:
+        EXTRACTION_TRUNCATED.inc()
+
+    content = file_meta.get_content()
+    content.extracted_text = doc.text
+    content.document_structure = doc.blocks
+    return doc
+
+
 def analyze_file(
     session: Session,
     file_meta: FileMeta,
     override_text: Optional[str] = None,
+    timeout: float = 300,
 ) -> None:
     """
     Analyze the file and generate metadata.
 
-    If override_text is provided (e.g. a Whisper transcript for audio),
-    use that instead of reading/extracting from the original file.
+    If override_text is provided (e.g. a Whisper transcript for audio, or text
+    already produced by extract_file), use that instead of reading/extracting
+    from the original file. `timeout` bounds the LLM call.
     """
     if override_text is not None:
         text = override_text
     else:
-        # resolve path from tus_id (depends on how tusd stores files; adjust if needed)
-        path = os.path.join(UPLOAD_DIR, file_meta.tus_id)
-        if not os.path.exists(path):
-            raise FileNotFoundError(path)
-
-        text = extract_text_from_file(path)
+        text = extract_file(file_meta).text
 
     basic_stats = compute_basic_stats(text)
     prompt = build_llm_prompt(text)
-    llm_json = ask_llm(prompt)
+    llm_json = ask_llm(prompt, timeout=timeout)
 
-    file_meta.extracted_text = text  # optional, maybe store only if small
-    file_meta.basic_stats = basic_stats
-    file_meta.llm_summary = llm_json
+    content = file_meta.get_content()
+    content.extracted_text = text
+    content.basic_stats = basic_stats
+    content.llm_summary = llm_json
     apply_structured_metadata(file_meta, llm_json)
 
     session.add(file_meta)
@@ -0,0 +1,153 @@
+"""
+Ingestion of ZIP / TAR archives that were uploaded through tusd.
+
+Members are copied one at a time from the archive into the upload directory,
+each under a fresh id with a tusd .info file next to it, so they can be
+downloaded like any other upload. Nothing is unpacked into memory or into a
+temporary directory first.
+"""
+import json
+import os
+import tarfile
+import uuid
+import zipfile
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import IO, Iterator, List, Tuple
+
+UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", "/data/uploads")
+ARCHIVE_MAX_MEMBERS = int(os.getenv("ARCHIVE_MAX_MEMBERS", "20000"))
+# guards against archive bombs: total size of the extracted members
+ARCHIVE_MAX_BYTES = int(os.getenv("ARCHIVE_MAX_BYTES", str(50 * 1024 ** 3)))
+COPY_BUFFER_SIZE = 1024 * 1024
+
+IGNORED_NAMES = {".DS_Store", "Thumbs.db", "desktop.ini"}
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+@dataclass
+class StoredMember:
+    tus_id: str
+    filename: str
+    size: int
+
+
+@dataclass
+class IngestResult:
+    stored: List[StoredMember] = field(default_factory=list)
+    skipped: List[str] = field(default_factory=list)
+
+
+def _wanted(name: str) -> bool:
+    path = PurePosixPath(name)
+    if path.name in IGNORED_NAMES or path.name.startswith("._"):
+        return False
+    return not any(part == "__MACOSX" for part in path.parts)
+
+
+def _iter_zip(path: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            with archive.open(info) as member:
+                yield info.filename, member
+
+
+def _iter_tar(path: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    # "r|*" reads the (possibly compressed) tar as a stream, member after member
+    with tarfile.open(path, mode="r|*") as archive:
+        for info in archive:
+            if not info.isfile():
+                continue
+            member = archive.extractfile(info)
+            if member is not None:
+                yield info.name, member
+
+
+def iter_members(path: str) -> Iterator[Tuple[str, IO[bytes]]]:
+    """Yield (name inside the archive, readable stream) for every regular file."""
+    if zipfile.is_zipfile(path):
+        return _iter_zip(path)
+    try:
+        if tarfile.is_tarfile(path):
+            return _iter_tar(path)
+    except OSError:
+        pass
+    raise ArchiveError("Not a ZIP or TAR archive")
+
+
+def _write_tus_info(tus_id: str, filename: str, size: int) -> None:
+    """Minimal tusd filestore metadata, so tusd serves the member for download."""
+    path = os.path.join(UPLOAD_ROOT, tus_id)
+    info = {
+        "ID": tus_id,
+        "Size": size,
+        "SizeIsDeferred": False,
+        "Offset": size,
+        "MetaData": {"filename": filename, "name": filename},
+        "IsPartial": False,
+        "IsFinal": False,
+        "PartialUploads": None,
+        "Storage": {"Type": "filestore", "Path": path, "InfoPath": f"{path}.info"},
+    }
+    with open(f"{path}.info", "w") as f:
+        json.dump(info, f)
+
+
+def remove_stored(members: List[StoredMember]) -> None:
+    for member in members:
+        for suffix in ("", ".info"):
+            try:
+                os.remove(os.path.join(UPLOAD_ROOT, member.tus_id + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def ingest_archive(tus_id: str) -> IngestResult:
+    """
+    Copy every member of the uploaded archive `tus_id` into its own upload.
+    On error, members stored so far are removed again.
+    """
+    path = os.path.join(UPLOAD_ROOT, tus_id)
+    if not os.path.exists(path):
+        raise FileNotFoundError(tus_id)
+
+    result = IngestResult()
+    total = 0
+    try:
+        for name, member in iter_members(path):
+            if not _wanted(name):
+                result.skipped.append(name)
+                continue
+            if len(result.stored) >= ARCHIVE_MAX_MEMBERS:
+                raise ArchiveError(f"Archive has more than {ARCHIVE_MAX_MEMBERS} files")
+
+            member_id = uuid.uuid4().hex
+            target = os.path.join(UPLOAD_ROOT, member_id)
+            size = 0
+            stored = StoredMember(member_id, PurePosixPath(name).name, 0)
+            # registered before writing so a failure below cleans up the partial file too
+            result.stored.append(stored)
+            with open(target, "wb") as out:
+                while True:
+                    buffer = member.read(COPY_BUFFER_SIZE)
+                    if not buffer:
+                        break
+                    size += len(buffer)
+                    total += len(buffer)
+                    if total > ARCHIVE_MAX_BYTES:
+                        raise ArchiveError(f"Archive expands to more than {ARCHIVE_MAX_BYTES} bytes")
+                    out.write(buffer)
+            stored.size = size
+            _write_tus_info(member_id, stored.filename, size)
+    except (zipfile.BadZipFile, tarfile.TarError) as e:
+        remove_stored(result.stored)
+        raise ArchiveError(f"Corrupt archive: {e}") from e
+    except BaseException:
+        remove_stored(result.stored)
+        raise
+    return result
@@ -0,0 +1,67 @@
+"""
+Rebuild derived data of files analyzed before it existed: the filefacet rows
+and the statsrollup dashboard aggregates.
+
+    python -m app.backfill [--batch-size N] [--skip-facets] [--skip-stats]
+"""
+import argparse
+
+from sqlmodel import Session, select
+
+from .analysis import sync_facets
+from .db import engine, init_db
+from .models import FileMeta
+from .stats import done_files, rebuild_rollups
+
+
+def backfill_facets(batch_size: int = 500) -> int:
+    done = 0
+    last_id = 0
+    while True:
+        with Session(engine) as session:
+            files = session.exec(
+                select(FileMeta)
+                .where(FileMeta.id > last_id, FileMeta.analysis_type.is_not(None))
+                .order_by(FileMeta.id)
+                .limit(batch_size)
+            ).all()
+            if not files:
+                break
+
+            for file_meta in files:
+                sync_facets(file_meta)
+                session.add(file_meta)
+            last_id = files[-1].id
+
+            session.commit()
+            done += len(files)
+            print(f"Rebuilt facets of {done} files (last id {last_id})")
+
+    return done
+
+
+def backfill_stats(batch_size: int = 500) -> int:
+    with Session(engine) as session:
+        total = rebuild_rollups(session, done_files(session, batch_size=batch_size))
+        session.commit()
+    print(f"Rebuilt stats rollups from {total} files")
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--skip-facets", action="store_true")
+    parser.add_argument("--skip-stats", action="store_true")
+    args = parser.parse_args()
+
+    init_db()
+    if not args.skip_facets:
+        backfill_facets(batch_size=args.batch_size)
+    if not args.skip_stats:
+        backfill_stats(batch_size=args.batch_size)
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Synthetic corpora for benchmarks, scaled up from the samples in dummy_data.
+
+Every generated file is a variation of one sample: the lines of text samples
+are reshuffled within their section and a numbered heading is added, so
+copies differ in content and in their chunk hashes while keeping a realistic
+structure. Audio samples are hard-linked (or copied) unchanged. Files are
+written the way tusd stores them: under a random id and without extension.
+
+    python -m app.bench.corpus --files 1000 --output /tmp/corpus [--samples ../dummy_data]
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import uuid
+from dataclasses import asdict, dataclass
+from typing import List
+
+DEFAULT_SAMPLES_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(__file__), "..", "..", "..", "dummy_data")
+)
+TEXT_EXTENSIONS = {".md", ".txt"}
+AUDIO_EXTENSIONS = {".m4a", ".mp3", ".wav", ".flac"}
+
+
+@dataclass
+class CorpusFile:
+    tus_id: str
+    filename: str
+    size: int
+    sample: str
+
+
+def load_samples(samples_dir: str, audio: bool = True) -> List[str]:
+    extensions = TEXT_EXTENSIONS | (AUDIO_EXTENSIONS if audio else set())
+    samples = sorted(
+        os.path.join(samples_dir, name)
+        for name in os.listdir(samples_dir)
+        if os.path.splitext(name)[1].lower() in extensions
+    )
+    if not samples:
+        raise FileNotFoundError(f"No samples in {samples_dir}")
+    return samples
+
+
+def vary_text(text: str, copy: int, rng: random.Random) -> str:
+    """Shuffle the lines inside every blank-line separated block, keeping its first line in place."""
+    blocks = []
+    for block in text.split("\n\n"):
+        lines = block.split("\n")
+        head, rest = lines[:1], lines[1:]
+        rng.shuffle(rest)
+        blocks.append("\n".join(head + rest))
+    return f"# Kopie {copy}\n\n" + "\n\n".join(blocks)
+
+
+def _link_or_copy(source: str, target: str) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def generate_corpus(
+    upload_root: str,
+    count: int,
+    samples_dir: str = DEFAULT_SAMPLES_DIR,
+    audio: bool = True,
+    seed: int = 0,
+) -> List[CorpusFile]:
+    """Write `count` files into `upload_root`, cycling through the samples."""
+    os.makedirs(upload_root, exist_ok=True)
+    samples = load_samples(samples_dir, audio)
+    texts = {}
+    rng = random.Random(seed)
+
+    corpus = []
+    for i in range(count):
+        sample = samples[i % len(samples)]
+        name, extension = os.path.splitext(os.path.basename(sample))
+        tus_id = uuid.UUID(int=rng.getrandbits(128)).hex
+        target = os.path.join(upload_root, tus_id)
+
+        if extension.lower() in AUDIO_EXTENSIONS:
+            _link_or_copy(sample, target)
+        else:
+            if sample not in texts:
+                with open(sample, encoding="utf-8") as f:
+                    texts[sample] = f.read()
+            with open(target, "w", encoding="utf-8") as f:
+                f.write(vary_text(texts[sample], i, rng))
+
+        corpus.append(CorpusFile(tus_id, f"{name}-{i}{extension}", os.path.getsize(target), os.path.basename(sample)))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--output", required=True, help="upload directory to write the files to")
+    parser.add_argument("--samples", default=DEFAULT_SAMPLES_DIR)
+    parser.add_argument("--no-audio", action="store_true", help="leave out the audio samples")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.output, args.files, args.samples, not args.no_audio, args.seed)
+    manifest = os.path.join(args.output, "manifest.json")
+    with open(manifest, "w") as f:
+        json.dump([asdict(item) for item in corpus], f, indent=2)
+    print(f"Wrote {len(corpus)} files to {args.output}, manifest in {manifest}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+"""
+End-to-end benchmark of the backend and the worker against local stand-ins.
+
+Starts a fake Ollama and a fake Whisper server, optionally an embedded Chroma
+(`chroma run`), then the backend and one worker on a fresh SQLite database in
+a temporary directory. A synthetic corpus generated from dummy_data is
+registered through POST /files in batches, and the run measures
+
+  * GET /files latency after every batch, as the table grows
+  * worker throughput and upload-to-done latency until the queue is drained
+  * chunks indexed per second, from the worker's embedding metrics
+  * chat time to first token with concurrent WebSocket clients
+
+Results are written as JSON (with the git revision), so runs of different
+versions can be compared. Exits with status 1 when a file failed or the
+queue did not drain within --timeout, so it can gate CI.
+
+    python -m app.bench.e2e --files 500 --output results.json [--vector-store chroma]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+from .corpus import DEFAULT_SAMPLES_DIR, generate_corpus
+
+BACKEND_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".."))
+QUEUED_STATUSES = ("pending", "processing", "parked")
+CHAT_QUERIES = [
+    "Jaké workshopy proběhly na školách?",
+    "Jak byli učitelé spokojeni s intervencí?",
+    "Kteří žáci chyběli na docházce?",
+    "Shrň zpětnou vazbu z dotazníků.",
+]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "p50": statistics.median(ordered),
+        "p95": ordered[min(int(0.95 * len(ordered)), len(ordered) - 1)],
+        "max": ordered[-1],
+    }
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Services:
+    """Child processes of one benchmark run, stopped together."""
+
+    def __init__(self, workdir: str, env: Dict[str, str]):
+        self.workdir = workdir
+        self.env = env
+        self.processes: List[subprocess.Popen] = []
+        self.logs = []
+
+    def start(self, name: str, args: List[str], ready_url: Optional[str] = None, timeout: float = 120) -> None:
+        log = open(os.path.join(self.workdir, f"{name}.log"), "w")
+        self.logs.append(log)
+        process = subprocess.Popen(args, cwd=BACKEND_DIR, env=self.env, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+        if ready_url is None:
+            return
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{name} exited with {process.returncode}, see {log.name}")
+            try:
+                if httpx.get(ready_url, timeout=2).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.5)
+        raise TimeoutError(f"{name} did not come up within {timeout}s, see {log.name}")
+
+    def stop(self) -> None:
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        for log in self.logs:
+            log.close()
+
+
+def scrape(url: str) -> Dict[str, float]:
+    """Prometheus text exposition as {"name{label=value,...}": value}."""
+    samples = {}
+    for family in text_string_to_metric_families(httpx.get(url, timeout=10).text):
+        for sample in family.samples:
+            labels = ",".join(f"{key}={value}" for key, value in sorted(sample.labels.items()))
+            samples[f"{sample.name}{{{labels}}}" if labels else sample.name] = sample.value
+    return samples
+
+
+def queue_depth(backend: str) -> Dict[str, float]:
+    metrics = scrape(f"{backend}/metrics")
+    prefix = "analysis_queue_files{status="
+    return {key[len(prefix):-1]: value for key, value in metrics.items() if key.startswith(prefix)}
+
+
+def list_latency(client: httpx.Client, count: int) -> Dict[str, float]:
+    latencies = []
+    for _ in range(count):
+        started = time.perf_counter()
+        client.get("/files", params={"limit": 100}).raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return _percentiles(latencies)
+
+
+def create_schools(client: httpx.Client, count: int) -> List[int]:
+    region = client.post("/regions", json={"name": "Benchmark"}).json()
+    return [
+        client.post("/schools", json={"name": f"Benchmark school {i}", "region_id": region["id"]}).json()["id"]
+        for i in range(count)
+    ]
+
+
+def register_corpus(client: httpx.Client, corpus, school_ids: List[int], batch: int, list_requests: int) -> dict:
+    listing = []
+    started = time.perf_counter()
+    for start in range(0, len(corpus), batch):
+        for i, item in enumerate(corpus[start:start + batch], start):
+            client.post("/files", json={
+                "tus_id": item.tus_id,
+                "filename": item.filename,
+                "school_id": school_ids[i % len(school_ids)],
+            }).raise_for_status()
+        listing.append({"rows": min(start + batch, len(corpus)), **list_latency(client, list_requests)})
+        print(f"registered {listing[-1]['rows']} files, GET /files p50 {listing[-1]['p50']:.1f} ms")
+    return {"seconds": time.perf_counter() - started, "files_listing_ms": listing}
+
+
+def wait_for_drain(backend: str, timeout: float) -> Tuple[Dict[str, float], bool]:
+    """Return the final queue depth per status and whether the queue drained in time."""
+    deadline = time.monotonic() + timeout
+    while True:
+        depth = queue_depth(backend)
+        queued = sum(depth.get(status, 0) for status in QUEUED_STATUSES)
+        if not queued:
+            return depth, True
+        if time.monotonic() > deadline:
+            print(f"{queued:.0f} files still queued after {timeout}s")
+            return depth, False
+        time.sleep(1)
+
+
+def upload_to_done(client: httpx.Client) -> List[float]:
+    latencies = []
+    response = client.get("/export/files", params={"format": "ndjson"})
+    response.raise_for_status()
+    for line in response.text.splitlines():
+        record = json.loads(line)
+        if record["analysis_status"] != "done":
+            continue
+        uploaded = datetime.fromisoformat(record["uploaded_at"])
+        finished = datetime.fromisoformat(record["analysis_finished_at"])
+        latencies.append((finished - uploaded).total_seconds())
+    return latencies
+
+
+async def _chat_client(url: str, queries: int, offset: int, ttft: List[float], totals: List[float]) -> None:
+    import websockets
+
+    async with websockets.connect(url, open_timeout=30, max_size=None) as ws:
+        for i in range(queries):
+            started = time.perf_counter()
+            first = None
+            await ws.send(CHAT_QUERIES[(offset + i) % len(CHAT_QUERIES)])
+            while True:
+                message = json.loads(await ws.recv())
+                if message.get("event") == "done":
+                    break
+                if first is None and message.get("role") == "model":
+                    first = time.perf_counter() - started
+            totals.append(time.perf_counter() - started)
+            if first is not None:
+                ttft.append(first)
+
+
+def chat_load(url: str, clients: int, queries: int) -> dict:
+    ttft: List[float] = []
+    totals: List[float] = []
+
+    async def run():
+        await asyncio.gather(*(_chat_client(url, queries, i, ttft, totals) for i in range(clients)))
+
+    started = time.perf_counter()
+    asyncio.run(run())
+    return {
+        "clients": clients,
+        "queries": clients * queries,
+        "seconds": time.perf_counter() - started,
+        "time_to_first_token_s": _percentiles(ttft),
+        "response_s": _percentiles(totals),
+    }
+
+
+def run(args, workdir: str) -> dict:
+    upload_root = os.path.join(workdir, "uploads")
+    corpus = generate_corpus(upload_root, args.files, args.samples, not args.no_audio, args.seed)
+
+    ports = {name: _free_port() for name in ("ollama", "whisper", "chroma", "backend", "worker")}
+    backend = f"http://127.0.0.1:{ports['backend']}"
+    env = {
+        **os.environ,
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'app.db')}",
+        "UPLOAD_ROOT": upload_root,
+        "OLLAMA_HOST": f"http://127.0.0.1:{ports['ollama']}",
+        "WHISPER_URL": f"http://127.0.0.1:{ports['whisper']}/transcribe",
+        "VECTOR_STORE": args.vector_store,
+        "VECTOR_STORE_DIR": os.path.join(workdir, "vectors"),
+        "CHROMA_HOST": f"http://127.0.0.1:{ports['chroma']}",
+        "WORKER_METRICS_PORT": str(ports["worker"]),
+        "PYTHONUNBUFFERED": "1",
+    }
+    for key in ("OLLAMA_HOSTS", "OLLAMA_CHAT_HOSTS", "OLLAMA_EMBED_HOSTS", "OLLAMA_ANALYSIS_HOSTS"):
+        env.pop(key, None)
+
+    services = Services(workdir, env)
+    try:
+        services.start("ollama", [
+            sys.executable, "-m", "app.bench.fake_ollama", "--host", "127.0.0.1", "--port", str(ports["ollama"]),
+            "--latency", str(args.llm_latency), "--parallel", str(args.llm_parallel),
+        ], f"{env['OLLAMA_HOST']}/api/tags")
+        services.start("whisper", [
+            sys.executable, "-m", "app.bench.fake_whisper", "--host", "127.0.0.1", "--port", str(ports["whisper"]),
+            # the worker sends paths relative to the directory above the uploads
+            "--data-root", workdir, "--latency", str(args.whisper_latency), "--rtf", str(args.whisper_rtf),
+        ], f"http://127.0.0.1:{ports['whisper']}/health")
+        if args.vector_store == "chroma":
+            services.start("chroma", [
+                "chroma", "run", "--path", os.path.join(workdir, "chroma"), "--port", str(ports["chroma"]),
+            ], f"{env['CHROMA_HOST']}/api/v2/heartbeat")
+        services.start("backend", [
+            sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(ports["backend"]),
+        ], f"{backend}/regions")
+        services.start("worker", [sys.executable, "-m", "app.worker"], f"http://127.0.0.1:{ports['worker']}/metrics")
+
+        with httpx.Client(base_url=backend, timeout=60) as client:
+            school_ids = create_schools(client, args.schools)
+            started = time.perf_counter()
+            ingest = register_corpus(client, corpus, school_ids, args.batch, args.list_requests)
+            depth, drained = wait_for_drain(backend, args.timeout)
+            drain_seconds = time.perf_counter() - started
+
+            latencies = upload_to_done(client)
+            stages = client.get("/stats/stages").json()
+            listing_done = list_latency(client, args.list_requests)
+
+        worker_metrics = scrape(f"http://127.0.0.1:{ports['worker']}/metrics")
+        chunks = worker_metrics.get("embedding_batch_size_sum", 0.0)
+        embedding_seconds = worker_metrics.get("embedding_seconds_sum", 0.0)
+
+        chat = None
+        if args.chat_clients:
+            chat = chat_load(f"ws://127.0.0.1:{ports['backend']}/chat/", args.chat_clients, args.chat_queries)
+    finally:
+        services.stop()
+
+    return {
+        "revision": _git_revision(),
+        "started_at": datetime.utcnow().isoformat(),
+        "config": vars(args),
+        "registration": {
+            "files": len(corpus),
+            "files_per_s": len(corpus) / ingest["seconds"],
+        },
+        "worker": {
+            "drained": drained,
+            "files_done": depth.get("done", 0),
+            "files_failed": depth.get("failed", 0),
+            "files_queued": sum(depth.get(status, 0) for status in QUEUED_STATUSES),
+            "seconds": drain_seconds,
+            "throughput_files_per_s": (depth.get("done", 0) + depth.get("failed", 0)) / drain_seconds,
+            "upload_to_done_s": _percentiles(latencies),
+            "stages_s": stages,
+        },
+        "indexing": {
+            "chunks": chunks,
+            "embedding_seconds": embedding_seconds,
+            "chunks_per_s": chunks / embedding_seconds if embedding_seconds else None,
+        },
+        "files_listing_ms": ingest["files_listing_ms"] + [{"rows": len(corpus), "after_drain": True, **listing_done}],
+        "chat": chat,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=50, help="files registered between GET /files measurements")
+    parser.add_argument("--schools", type=int, default=5)
+    parser.add_argument("--samples", default=DEFAULT_SAMPLES_DIR)
+    parser.add_argument("--no-audio", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-parallel", type=int, default=4)
+    parser.add_argument("--whisper-latency", type=float, default=0.5)
+    parser.add_argument("--whisper-rtf", type=float, default=0.0)
+    parser.add_argument("--vector-store", default="local", choices=["local", "chroma"])
+    parser.add_argument("--list-requests", type=int, default=20)
+    parser.add_argument("--chat-clients", type=int, default=8, help="concurrent WebSocket clients, 0 to skip")
+    parser.add_argument("--chat-queries", type=int, default=3, help="queries per client")
+    parser.add_argument("--timeout", type=float, default=3600, help="seconds to wait for the queue to drain")
+    parser.add_argument("--keep", action="store_true", help="keep the working directory with logs and database")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="e2e-bench-")
+    try:
+        result = run(args, workdir)
+    finally:
+        if args.keep:
+            print(f"Working directory kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(result, indent=2, default=str))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2, default=str)
+
+    failed = False
+    if not result["worker"]["drained"]:
+        print(f"Queue did not drain within {args.timeout}s")
+        failed = True
+    if result["worker"]["files_failed"]:
+        print(f"{result['worker']['files_failed']:.0f} files failed")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+A fake Ollama server for exercising the router and the pipeline without a GPU.
+
+Implements /api/tags, /api/generate, /api/chat (streaming or not), /api/embed
+and the legacy /api/embeddings with a configurable latency and a limit on
+concurrently served requests, like OLLAMA_NUM_PARALLEL on a real server.
+
+    python -m app.bench.fake_ollama --port 11435 --latency 0.5 --parallel 2
+
+Point the backend at a few of them, e.g.
+OLLAMA_HOSTS=http://localhost:11435,http://localhost:11436
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import List
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+MODELS = os.getenv("FAKE_OLLAMA_MODELS", "llama3.1:8b,embeddinggemma:latest")
+LATENCY = float(os.getenv("FAKE_OLLAMA_LATENCY", "0.2"))
+PARALLEL = int(os.getenv("FAKE_OLLAMA_PARALLEL", "4"))
+EMBED_DIM = int(os.getenv("FAKE_OLLAMA_EMBED_DIM", "768"))
+
+ANALYSIS_RESPONSE = {
+    "summary": "Prezenční listina z workshopu pro pedagogy.",
+    "data": {
+        "type": "attendance_checklist",
+        "school_year": ["2024/2025"],
+        "date": "2024-10-15",
+        "year": ["2024"],
+        "month": ["10"],
+        "semester": ["winter"],
+        "intervention": ["workshop"],
+        "intervention_type": ["training"],
+        "intervention_detail": "",
+        "target_group": ["teachers"],
+        "participant_name": "",
+        "organization_school": [],
+        "school_grade": [],
+        "school_type": ["ZŠ"],
+        "region": [],
+        "feedback": "",
+    },
+}
+CHAT_REPLY = "This is a canned answer from the fake Ollama server."
+
+app = FastAPI()
+app.state.models = [m.strip() for m in MODELS.split(",") if m.strip()]
+app.state.latency = LATENCY
+app.state.slots = None
+app.state.served = 0
+
+
+def _slots() -> asyncio.Semaphore:
+    if app.state.slots is None:
+        app.state.slots = asyncio.Semaphore(PARALLEL)
+    return app.state.slots
+
+
+async def _work(seconds: float) -> None:
+    async with _slots():
+        await asyncio.sleep(seconds)
+        app.state.served += 1
+
+
+def _embedding(text: str) -> List[float]:
+    seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest(), "little")
+    vector = np.random.RandomState(seed).standard_normal(EMBED_DIM)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+
+@app.get("/api/tags")
+async def tags():
+    return {"models": [{"name": name, "model": name} for name in app.state.models]}
+
+
+@app.get("/fake/stats")
+async def stats():
+    return {"served": app.state.served, "latency": app.state.latency}
+
+
+@app.post("/api/generate")
+async def generate(request: Request):
+    body = await request.json()
+    await _work(app.state.latency)
+    response = json.dumps(ANALYSIS_RESPONSE, ensure_ascii=False) if body.get("format") == "json" else CHAT_REPLY
+    return {
+        "model": body.get("model"),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "response": response,
+        "done": True,
+        "prompt_eval_count": len(body.get("prompt", "")) // 4,
+        "eval_count": len(response) // 4,
+    }
+
+
+@app.post("/api/chat")
+async def chat(request: Request):
+    body = await request.json()
+    model = body.get("model")
+    words = CHAT_REPLY.split(" ")
+
+    def message(content: str, done: bool) -> dict:
+        return {
+            "model": model,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+            **({"done_reason": "stop", "eval_count": len(words)} if done else {}),
+        }
+
+    if not body.get("stream", True):
+        await _work(app.state.latency)
+        return message(CHAT_REPLY, True)
+
+    async def stream():
+        async with _slots():
+            # time to first token, then the rest of the reply word by word
+            await asyncio.sleep(app.state.latency)
+            for i, word in enumerate(words):
+                yield json.dumps(message(word if i == 0 else " " + word, False)) + "\n"
+                await asyncio.sleep(app.state.latency / 10)
+            yield json.dumps(message("", True)) + "\n"
+            app.state.served += 1
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+@app.post("/api/embed")
+async def embed(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    await _work(app.state.latency)
+    return {"model": body.get("model"), "embeddings": [_embedding(text) for text in inputs]}
+
+
+@app.post("/api/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    await _work(app.state.latency)
+    return {"embedding": _embedding(body.get("prompt", ""))}
+
+
+def main():
+    global PARALLEL
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=LATENCY, help="seconds per request")
+    parser.add_argument("--parallel", type=int, default=PARALLEL, help="requests served at the same time")
+    parser.add_argument("--models", default=MODELS, help="comma separated models reported by /api/tags")
+    args = parser.parse_args()
+
+    app.state.latency = args.latency
+    app.state.models = [m.strip() for m in args.models.split(",") if m.strip()]
+    PARALLEL = args.parallel
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+A fake Whisper service with the same /health and /transcribe API as the
+whisper container, returning a canned Czech transcript after a configurable
+delay: a fixed latency plus a real-time factor per second of estimated audio.
+
+    python -m app.bench.fake_whisper --port 8001 --latency 0.5 --rtf 0.05
+"""
+import argparse
+import asyncio
+import os
+
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from pydantic import BaseModel
+
+DATA_ROOT = os.getenv("FAKE_WHISPER_DATA_ROOT", "/data")
+LATENCY = float(os.getenv("FAKE_WHISPER_LATENCY", "0.5"))
+RTF = float(os.getenv("FAKE_WHISPER_RTF", "0"))
+PARALLEL = int(os.getenv("FAKE_WHISPER_PARALLEL", "1"))
+# used to turn the file size into seconds of audio, like the worker's cost model
+ASSUMED_BITRATE = 128000
+
+TRANSCRIPT = [
+    "Dobrý den, vítejte na dnešním workshopu o digitální gramotnosti.",
+    "Nejprve si projdeme, co jste si odnesli z minulého setkání.",
+    "Žáci sedmých ročníků pracovali ve skupinách na tématu digitální stopa.",
+    "Učitelé ocenili praktické ukázky a chtěli by podobné aktivity zopakovat.",
+    "Na závěr prosím vyplňte krátký dotazník spokojenosti.",
+]
+
+
+class TranscriptionRequest(BaseModel):
+    path: str
+    language: str = "cs"
+
+
+app = FastAPI(title="Fake Whisper")
+app.state.data_root = DATA_ROOT
+app.state.latency = LATENCY
+app.state.rtf = RTF
+app.state.slots = None
+app.state.served = 0
+
+
+def _slots() -> asyncio.Semaphore:
+    if app.state.slots is None:
+        app.state.slots = asyncio.Semaphore(PARALLEL)
+    return app.state.slots
+
+
+@app.get("/health")
+def health():
+    return {"status": "ok", "model": "fake", "device": "cpu"}
+
+
+@app.get("/fake/stats")
+def stats():
+    return {"served": app.state.served, "latency": app.state.latency, "rtf": app.state.rtf}
+
+
+@app.post("/transcribe")
+async def transcribe(req: TranscriptionRequest):
+    audio_path = req.path if req.path.startswith("/") else os.path.join(app.state.data_root, req.path)
+    if not os.path.exists(audio_path):
+        raise HTTPException(status_code=404, detail=f"File not found: {audio_path}")
+
+    duration = os.path.getsize(audio_path) * 8 / ASSUMED_BITRATE
+    async with _slots():
+        await asyncio.sleep(app.state.latency + duration * app.state.rtf)
+        app.state.served += 1
+
+    step = duration / len(TRANSCRIPT) if duration else 10.0
+    segments = [
+        {"start": i * step, "end": (i + 1) * step, "text": " " + sentence}
+        for i, sentence in enumerate(TRANSCRIPT)
+    ]
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments}
+
+
+def main():
+    global PARALLEL
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data-root", default=DATA_ROOT, help="directory relative paths are resolved against")
+    parser.add_argument("--latency", type=float, default=LATENCY, help="seconds per request")
+    parser.add_argument("--rtf", type=float, default=RTF, help="extra seconds per second of audio")
+    parser.add_argument("--parallel", type=int, default=PARALLEL, help="requests served at the same time")
+    args = parser.parse_args()
+
+    app.state.data_root = args.data_root
+    app.state.latency = args.latency
+    app.state.rtf = args.rtf
+    PARALLEL = args.parallel
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Check how long `import app.main` takes in a fresh interpreter.
+
+Runs `python -X importtime`, prints the slowest imports made directly by the
+module and exits with status 1 when the total is over the budget or when one
+of the heavy chat dependencies is imported at startup (they belong behind the
+lazy RAG in routers/chat.py). Meant to run in CI:
+
+    python -m app.bench.import_time [--budget 2.5] [--runs 3] [--module app.main]
+
+The budget is there to catch a heavy dependency pulled in by accident, which
+costs seconds; it leaves room for a slower CI machine.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", ".."))
+# `import app.main` takes about 1.5s on a developer laptop
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "2.5"))
+# must not be imported by the API at startup
+DEFERRED_MODULES = ["langchain", "langgraph", "langchain_ollama", "langchain_chroma", "chromadb", "unstructured"]
+
+
+def measure(module: str) -> Tuple[float, Dict[str, float], List[str]]:
+    """
+    Return (total seconds, cumulative seconds per import made directly by
+    `module`, deferred modules that got imported).
+    """
+    code = (
+        f"import sys, json; import {module}; "
+        f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    total = 0.0
+    children, below = {}, {}
+    for line in result.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # nested imports are indented by two spaces per level and listed before
+        # the import that caused them
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name, seconds = name.strip(), int(cumulative) / 1e6
+        if depth == 1:
+            below[name] = seconds
+        elif depth == 0:
+            total += seconds
+            if name == module:
+                children = below
+            below = {}
+    return total, children, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget", type=float, default=IMPORT_BUDGET_SECONDS, help="seconds")
+    parser.add_argument("--runs", type=int, default=3, help="the median of the runs is compared to the budget")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        run_total, imports, deferred = measure(args.module)
+        totals.append(run_total)
+    total = statistics.median(totals)
+
+    for name, seconds in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f"{seconds * 1000:9.1f} ms  {name}")
+    print(f"import {args.module}: {total:.3f}s (median of {args.runs}), budget {args.budget:.3f}s")
+
+    failed = False
+    if deferred:
+        print(f"Imported at startup but should be lazy: {', '.join(deferred)}")
+        failed = True
+    if total > args.budget:
+        print("Over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
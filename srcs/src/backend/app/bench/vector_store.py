@@ -0,0 +1,127 @@
+"""
+Benchmark the embedded LocalVectorStore against the Chroma HTTP service.
+
+Both stores get the same synthetic vectors from a deterministic fake embedding
+model, so only storage and search are measured, not Ollama.
+
+    python -m app.bench.vector_store --docs 20000 --queries 200 [--skip-chroma]
+"""
+import argparse
+import hashlib
+import json
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from ..chat.vector_store import LocalVectorStore
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic pseudo-random unit vectors derived from the text."""
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=4).digest(), "little")
+        vector = np.random.RandomState(seed).standard_normal(self.dim)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def bench_store(name: str, store, docs: int, queries: int, batch: int, k: int) -> dict:
+    texts = [f"document {i} school {i % 50} intervention {i % 7}" for i in range(docs)]
+    metadatas = [{"school": str(i % 50)} for i in range(docs)]
+
+    started = time.perf_counter()
+    for start in range(0, docs, batch):
+        store.add_texts(
+            texts[start:start + batch],
+            metadatas[start:start + batch],
+            ids=[f"doc-{i}" for i in range(start, min(start + batch, docs))],
+        )
+    ingest_seconds = time.perf_counter() - started
+
+    latencies = []
+    for i in range(queries):
+        started = time.perf_counter()
+        store.similarity_search(f"query {i}", k=k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    filtered = []
+    for i in range(queries):
+        started = time.perf_counter()
+        store.similarity_search(f"query {i}", k=k, filter={"school": str(i % 50)})
+        filtered.append((time.perf_counter() - started) * 1000)
+
+    result = {
+        "store": name,
+        "docs": docs,
+        "ingest_docs_per_s": docs / ingest_seconds,
+        "query_ms_p50": statistics.median(latencies),
+        "query_ms_p95": _percentile(latencies, 0.95),
+        "filtered_query_ms_p50": statistics.median(filtered),
+        "filtered_query_ms_p95": _percentile(filtered, 0.95),
+    }
+    print(json.dumps(result))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("-k", type=int, default=4)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--dtype", default="float16", choices=["float16", "float32"])
+    parser.add_argument("--chroma-host", default="http://chromadb:8000")
+    parser.add_argument("--skip-chroma", action="store_true")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    args = parser.parse_args()
+
+    embeddings = FakeEmbeddings(args.dim)
+    results = []
+
+    tmp_dir = tempfile.mkdtemp(prefix="vector-bench-")
+    try:
+        local = LocalVectorStore(embeddings, collection_name="bench", persist_directory=tmp_dir, dtype=args.dtype)
+        results.append(bench_store(f"local-{args.dtype}", local, args.docs, args.queries, args.batch, args.k))
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    if not args.skip_chroma:
+        import chromadb
+        from langchain_chroma import Chroma
+
+        client = chromadb.HttpClient(host=args.chroma_host)
+        collection_name = f"bench-{uuid.uuid4().hex[:8]}"
+        chroma = Chroma(collection_name=collection_name, embedding_function=embeddings, client=client)
+        try:
+            results.append(bench_store("chroma-http", chroma, args.docs, args.queries, args.batch, args.k))
+        finally:
+            client.delete_collection(collection_name)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
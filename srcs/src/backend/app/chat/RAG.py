@@ -1,26 +1,61 @@
 import os
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
-from pathlib import Path
+from typing import Dict, Iterator, List, Optional
 
 import anyio
-import chromadb
 from langchain.agents import create_agent
-from langchain_community.document_loaders import UnstructuredWordDocumentLoader, UnstructuredPDFLoader, \
-    UnstructuredExcelLoader, UnstructuredMarkdownLoader, TextLoader, UnstructuredFileLoader
+from langchain_core.documents import Document
 from langchain_ollama import ChatOllama
 from langchain_ollama import OllamaEmbeddings
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_chroma import Chroma
 from langchain.tools import tool
+from sqlmodel import Session, select
 
+from .chunking import chunk_document
+from .dedup import ChunkDeduplicator, remove_file_sources
 from .prompts import agent_system_prompt
-from ..models import School
+from .vector_store import LocalVectorStore
+from ..db import engine
+from ..extraction import ExtractedDocument
+from ..metrics import (
+    CHAT_SECONDS,
+    CHAT_TIME_TO_FIRST_TOKEN,
+    CHUNKS_DEDUPLICATED,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_SECONDS,
+    LLM_TOKENS,
+    RETRIEVAL_SECONDS,
+)
+from ..models import ChunkSource, FileMeta
+from ..ollama_router import client_kwargs
+from ..reference import SchoolInfo
 
-OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
 OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "embeddinggemma")
 
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma")  # "chroma" | "local"
+CHROMA_HOST = os.getenv("CHROMA_HOST", "http://chromadb:8000")
+COLLECTION_NAME = "example_collection"
+
+
+def create_vector_store(embeddings):
+    if VECTOR_STORE == "local":
+        return LocalVectorStore(embeddings, collection_name=COLLECTION_NAME)
+    if VECTOR_STORE != "chroma":
+        raise ValueError(f"Unknown VECTOR_STORE {VECTOR_STORE!r}, expected 'chroma' or 'local'")
+    # only needed with the Chroma service
+    import chromadb
+    from langchain_chroma import Chroma
+
+    return Chroma(
+        collection_name=COLLECTION_NAME,
+        embedding_function=embeddings,
+        client=chromadb.HttpClient(host=CHROMA_HOST),
+        client_settings=chromadb.Settings(chroma_api_impl="chromadb.api.fastapi.FastAPI")
+    )
+
 @dataclass
 class ModelResponse:
     role: str
@@ -30,73 +65,131 @@ class RAG:
     def __init__(self):
         self.llm = ChatOllama(
             model=OLLAMA_MODEL,
-            base_url=OLLAMA_HOST
+            **client_kwargs("chat")
         )
         self.embeddings = OllamaEmbeddings(
             model=OLLAMA_EMBED_MODEL,
-            base_url=OLLAMA_HOST
+            **client_kwargs("embeddings")
         )
 
-        self.vector_store = Chroma(
-            collection_name="example_collection",
-            embedding_function=self.embeddings,
-            client=chromadb.HttpClient(host="http://chromadb:8000"),
-            client_settings=chromadb.Settings(chroma_api_impl="chromadb.api.fastapi.FastAPI")
-        )
-        print(f"Current documents in ChromaDb: # {self.vector_store._collection.count()}")
-
-    def load_any_document(self, path: str, filename: str):
-        ext = Path(filename).suffix.lower()
-        print(f"Loading {ext} from {path}")
-
-        loader_map = {
-            ".pdf": UnstructuredPDFLoader,
-            ".docx": UnstructuredWordDocumentLoader,
-            ".doc": UnstructuredWordDocumentLoader,
-            ".xlsx": UnstructuredExcelLoader,
-            ".xls": UnstructuredExcelLoader,
-            ".md": UnstructuredMarkdownLoader,
-            ".txt": TextLoader,
-        }
-
-        loader_cls = loader_map.get(ext)
-        if loader_cls is None:
-            return None
-
-        loader = loader_cls(path)
-        return loader.load()
-
-    def add_document(self, path: str, filename: str, school: School, uploaded_at: datetime):
-        print(f"Adding document: {path}")
-        docs = self.load_any_document(path, filename)
-        if docs is None:
-            print("Error, not supported file type")
-            return None
-        assert len(docs) == 1
-        doc = docs[0]
-        doc.metadata.update({
+        self.vector_store = create_vector_store(self.embeddings)
+        print(f"Current documents in {VECTOR_STORE} vector store: # {self._count()}")
+
+    def _count(self) -> int:
+        if isinstance(self.vector_store, LocalVectorStore):
+            return self.vector_store.count()
+        return self.vector_store._collection.count()
+
+    def delete_chunks(self, chunk_ids: List[str]) -> None:
+        if chunk_ids:
+            self.vector_store.delete(ids=chunk_ids)
+
+    @contextmanager
+    def _session(self, session: Optional[Session]) -> Iterator[Session]:
+        """The caller's session, committed by the caller, or a new one committed here."""
+        if session is not None:
+            yield session
+            return
+        with Session(engine) as own:
+            yield own
+            own.commit()
+
+    def add_document(
+        self,
+        doc: ExtractedDocument,
+        file_id: int,
+        filename: str,
+        school: Optional[SchoolInfo],
+        uploaded_at: datetime,
+        analysis_type: Optional[str] = None,
+        session: Optional[Session] = None,
+    ) -> List[str]:
+        """
+        Chunk and embed text that was already extracted by the worker's
+        extraction stage. Re-indexing a file replaces its previous chunks.
+
+        Pass the worker's `session` so the deduplication index is written in
+        its transaction: on SQLite a second session would wait for the worker's
+        uncommitted write (its status and facet rows) and fail as locked.
+        The ids of chunks the file no longer uses are then returned; pass them
+        to `delete_chunks` once that session is committed.
+        """
+        print(f"Adding document: {filename} (file id {file_id})")
+        metadata = {
+            "owner_file_id": file_id,
             "timestamp": uploaded_at.isoformat(),
             "filename": filename,
-            "school_name": school.name,
-            "region_name": school.region.name,
-        })
-        print(doc.metadata)
-        print(f"Total characters: {len(doc.page_content)}")
-
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,  # chunk size (characters)
-            chunk_overlap=200,  # chunk overlap (characters)
-            add_start_index=True,  # track index in original document
-        )
-        all_splits = text_splitter.split_documents(docs)
-        print(f"Split blog post into {len(all_splits)} sub-documents.")
-
-        res = self.vector_store.add_documents(all_splits)
-        print(f"Added {len(res)} sub-documents.")
-
+            "school_name": school.name if school else "",
+            "region_name": (school.region_name or "") if school else "",
+            "analysis_type": analysis_type or "",
+        }
+        print(metadata)
+        print(f"Total characters: {len(doc.text)}")
+
+        chunks = chunk_document(doc, analysis_type)
+        print(f"Split document into {len(chunks)} sub-documents.")
+
+        with self._session(session) as db:
+            orphans = remove_file_sources(db, file_id)
+            dedup = ChunkDeduplicator(db)
+            new_splits, new_ids, kept = [], [], set()
+            for chunk in chunks:
+                chunk_id, is_new = dedup.add(chunk.text, file_id)
+                kept.add(chunk_id)
+                if is_new:
+                    new_splits.append(
+                        Document(page_content=chunk.text, metadata={**metadata, **chunk.metadata})
+                    )
+                    new_ids.append(chunk_id)
+            print(f"Skipped {len(chunks) - len(new_splits)} near-duplicate sub-documents.")
+            CHUNKS_DEDUPLICATED.inc(len(chunks) - len(new_splits))
+
+            if new_splits:
+                EMBEDDING_BATCH_SIZE.observe(len(new_splits))
+                with EMBEDDING_SECONDS.time():
+                    res = self.vector_store.add_documents(new_splits, ids=new_ids)
+                print(f"Added {len(res)} sub-documents.")
+            # the chunks are committed only once they are really in the vector store
+
+        # unchanged text keeps its chunk id, and its vector was just replaced
+        stale = [chunk_id for chunk_id in orphans if chunk_id not in kept]
+        return self._stale_after_commit(stale, session)
+
+    def remove_document(self, file_id: int, session: Optional[Session] = None) -> List[str]:
+        """Drop the file from the chunk index; returns stale chunk ids like `add_document`."""
+        with self._session(session) as db:
+            orphans = remove_file_sources(db, file_id)
+        return self._stale_after_commit(orphans, session)
+
+    def _stale_after_commit(self, chunk_ids: List[str], session: Optional[Session]) -> List[str]:
+        # a rollback would bring the chunk rows back, so their vectors go only after the commit
+        if session is None:
+            self.delete_chunks(chunk_ids)
+            return []
+        return chunk_ids
+
+    def _chunk_sources(self, docs) -> None:
+        """Attach the names of all files containing each retrieved chunk, for citations."""
+        ids = [doc.id for doc in docs if getattr(doc, "id", None)]
+        if not ids:
+            return
+        with Session(engine) as session:
+            rows = session.exec(
+                select(ChunkSource.chunk_id, FileMeta.filename)
+                .join(FileMeta, FileMeta.id == ChunkSource.file_id)
+                .where(ChunkSource.chunk_id.in_(ids))
+            ).all()
+        sources: Dict[str, List[str]] = {}
+        for chunk_id, filename in rows:
+            sources.setdefault(chunk_id, []).append(filename)
+        for doc in docs:
+            if doc.id in sources:
+                doc.metadata["sources"] = ", ".join(sources[doc.id])
 
     def _retrieve_context(self, query: str):
-        retrieved_docs = self.vector_store.similarity_search(query, k=2)
+        with RETRIEVAL_SECONDS.time():
+            retrieved_docs = self.vector_store.similarity_search(query, k=2)
+        self._chunk_sources(retrieved_docs)
         serialized = "\n\n".join(
             (f"Source: {doc.metadata}\nContent: {doc.page_content}")
             for doc in retrieved_docs
@@ -110,12 +203,18 @@ class RAG:
             return self._retrieve_context(query)
 
         agent = create_agent(self.llm, [retrieve_context], system_prompt=agent_system_prompt)
+        started = time.perf_counter()
+        first_token = True
         async for token, metadata in agent.astream(
                 {"messages": [{"role": "user", "content": query}]},
                 stream_mode="messages",
         ):
             print("Node received")
             node = metadata['langgraph_node']
+            usage = getattr(token, "usage_metadata", None)
+            if usage:
+                LLM_TOKENS.labels("chat", "prompt").inc(usage.get("input_tokens", 0))
+                LLM_TOKENS.labels("chat", "completion").inc(usage.get("output_tokens", 0))
             if len(token.content_blocks) > 0:
                 content = token.content_blocks[0]
                 type = content["type"] if "type" in content else None
@@ -123,5 +222,9 @@ class RAG:
                     continue
 
                 if type == "text":
+                    if first_token and node == "model":
+                        CHAT_TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - started)
+                        first_token = False
                     print("Yielding response")
                     yield ModelResponse(role=node, content=content['text'])
+        CHAT_SECONDS.observe(time.perf_counter() - started)
@@ -0,0 +1,234 @@
+"""
+Structure-aware chunking of extracted documents for the vector index.
+
+Instead of one generic character splitter with 20% overlap for everything,
+each kind of content is cut along its natural units:
+
+- tables / sheets / attendance lists: groups of rows, each repeating the
+  header (shortened to TABLE_HEADER_MAX_CHARS)
+- feedback forms: question + answer units
+- Whisper transcripts: time windows over the transcript segments
+- other prose: lines packed as they are; only units larger than a chunk go
+  through the generic recursive character splitter
+
+Units are packed greedily up to CHUNK_SIZE characters without overlap, so
+there are fewer, denser chunks to embed.
+"""
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from ..extraction import CELL_SEPARATOR, ExtractedDocument
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+TRANSCRIPT_WINDOW_SECONDS = float(os.getenv("TRANSCRIPT_WINDOW_SECONDS", "60"))
+# longer table headers are cut before being repeated, so every chunk keeps room for rows
+TABLE_HEADER_MAX_CHARS = int(os.getenv("TABLE_HEADER_MAX_CHARS", str(CHUNK_SIZE // 4)))
+
+TABLE_BLOCK_KINDS = {"table", "sheet"}
+# a short line ending with ":" opens a form question; the answer follows on the next lines
+QUESTION_RE = re.compile(r"^[^\n:]{3,120}:\s*$")
+MARKDOWN_RULE_RE = re.compile(r"^\s*\|?\s*:?-{3,}")
+
+
+@dataclass
+class Chunk:
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+def _generic_splitter(chunk_size: int = CHUNK_SIZE) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=min(CHUNK_OVERLAP, chunk_size // 2))
+
+
+def _pack(units: Iterable[str], chunk_type: str, prefix: str = "") -> List[Chunk]:
+    """
+    Greedily pack text units into chunks of at most CHUNK_SIZE characters,
+    starting every chunk with `prefix` (e.g. a table header). Units larger
+    than a chunk fall back to the generic splitter.
+    """
+    chunks: List[Chunk] = []
+    current: List[str] = []
+    size = len(prefix)
+
+    def flush():
+        nonlocal current, size
+        if current:
+            body = "\n".join(current)
+            chunks.append(Chunk(f"{prefix}\n{body}" if prefix else body, {"chunk_type": chunk_type}))
+        current = []
+        size = len(prefix)
+
+    for unit in units:
+        if not unit.strip():
+            continue
+        if len(prefix) + len(unit) > CHUNK_SIZE:
+            flush()
+            # leave room for the prefix and its newline in every piece
+            room = max(CHUNK_SIZE - len(prefix) - 1, CHUNK_SIZE // 4) if prefix else CHUNK_SIZE
+            for piece in _generic_splitter(room).split_text(unit):
+                chunks.append(Chunk(f"{prefix}\n{piece}" if prefix else piece, {"chunk_type": chunk_type}))
+            continue
+        if size + len(unit) + 1 > CHUNK_SIZE:
+            flush()
+        current.append(unit)
+        size += len(unit) + 1
+    flush()
+    return chunks
+
+
+def _is_table_row(line: str) -> bool:
+    return "\t" in line or CELL_SEPARATOR in line or line.lstrip().startswith("|")
+
+
+def chunk_table(text: str) -> List[Chunk]:
+    """Row groups, each starting with the table header."""
+    lines = [line for line in text.split("\n") if line.strip() and not MARKDOWN_RULE_RE.match(line)]
+    if not lines:
+        return []
+    header, rows = lines[0], lines[1:]
+    if not rows:
+        return [Chunk(header, {"chunk_type": "table_rows"})]
+    if len(header) > TABLE_HEADER_MAX_CHARS:
+        # the full header is indexed once as a row, the chunks repeat its start
+        rows = [header] + rows
+        header = header[:TABLE_HEADER_MAX_CHARS].rstrip() + " …"
+    return _pack(rows, "table_rows", prefix=header)
+
+
+def chunk_tabular_text(text: str) -> List[Chunk]:
+    """
+    Free text with embedded tables (e.g. attendance lists exported as text):
+    prose runs are packed as they are, each table run becomes row groups.
+    """
+    chunks: List[Chunk] = []
+    prose: List[str] = []
+    table: List[str] = []
+
+    def flush_prose():
+        if prose:
+            chunks.extend(_pack(prose, "text"))
+            prose.clear()
+
+    def flush_table():
+        if len(table) > 1:
+            chunks.extend(chunk_table("\n".join(table)))
+        else:
+            prose.extend(table)
+        table.clear()
+
+    for line in text.split("\n"):
+        if _is_table_row(line):
+            if not table:
+                flush_prose()
+            table.append(line)
+        else:
+            if table:
+                flush_table()
+            prose.append(line)
+    flush_table()
+    flush_prose()
+    return chunks
+
+
+def chunk_form(text: str) -> List[Chunk]:
+    """Question/answer units: a question line together with the lines answering it."""
+    units: List[str] = []
+    current: List[str] = []
+    for line in text.split("\n"):
+        if QUESTION_RE.match(line) and current:
+            units.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        units.append("\n".join(current))
+    return _pack(units, "form_answers")
+
+
+def _format_seconds(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes:02d}:{secs:02d}"
+
+
+def chunk_transcript_segments(doc: ExtractedDocument, segments: List[Dict[str, Any]]) -> List[Chunk]:
+    """Time windows of TRANSCRIPT_WINDOW_SECONDS (or CHUNK_SIZE characters) over Whisper segments."""
+    chunks: List[Chunk] = []
+    current: List[str] = []
+    window_start: Optional[float] = None
+    window_end = 0.0
+    size = 0
+
+    def flush():
+        nonlocal current, window_start, size
+        if current:
+            chunks.append(Chunk(" ".join(current), {
+                "chunk_type": "transcript_window",
+                "label": f"{_format_seconds(window_start or 0)}-{_format_seconds(window_end)}",
+            }))
+        current = []
+        window_start = None
+        size = 0
+
+    for segment in segments:
+        text = doc.text[segment["start"]:segment["end"]].strip()
+        if not text:
+            continue
+        t_start = float(segment.get("t_start", 0.0))
+        too_long = window_start is not None and t_start - window_start >= TRANSCRIPT_WINDOW_SECONDS
+        if current and (too_long or size + len(text) + 1 > CHUNK_SIZE):
+            flush()
+        if window_start is None:
+            window_start = t_start
+        window_end = float(segment.get("t_end", t_start))
+        current.append(text)
+        size += len(text) + 1
+    flush()
+    return chunks
+
+
+def chunk_sentences(text: str, chunk_type: str = "transcript_window") -> List[Chunk]:
+    """Transcripts without timestamps: whole sentences packed without overlap."""
+    sentences = re.split(r"(?<=[.!?])\s+", text)
+    return _pack(sentences, chunk_type)
+
+
+def chunk_document(doc: ExtractedDocument, analysis_type: Optional[str] = None) -> List[Chunk]:
+    """Pick a chunking strategy per block kind and document type."""
+    segments = [block for block in doc.blocks if block["kind"] == "segment"]
+    if segments:
+        return chunk_transcript_segments(doc, segments)
+
+    chunks: List[Chunk] = []
+    prose: List[str] = []
+
+    def flush_prose():
+        if not prose:
+            return
+        text = "\n".join(prose)
+        prose.clear()
+        if analysis_type == "feedback_form":
+            chunks.extend(chunk_form(text))
+        else:
+            # attendance lists, records with markdown tables and plain prose alike
+            chunks.extend(chunk_tabular_text(text))
+
+    for block in doc.blocks:
+        text = doc.text[block["start"]:block["end"]]
+        if block["kind"] in TABLE_BLOCK_KINDS:
+            flush_prose()
+            table_chunks = chunk_table(text)
+            if block.get("label"):
+                for chunk in table_chunks:
+                    chunk.metadata["label"] = block["label"]
+            chunks.extend(table_chunks)
+        elif block["kind"] == "transcript":
+            flush_prose()
+            chunks.extend(chunk_sentences(text))
+        else:
+            prose.append(text)
+    flush_prose()
+    return chunks
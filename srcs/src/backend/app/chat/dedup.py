@@ -0,0 +1,131 @@
+"""
+Near-duplicate chunk suppression for the vector index (MinHash + LSH).
+
+Schools upload many almost identical documents (weekly attendance sheets with
+the same header and roster, ...). Before a chunk is embedded, its MinHash
+signature is looked up in an LSH index kept in the database; if a chunk with
+an estimated Jaccard similarity of at least DEDUP_THRESHOLD is already in the
+vector store, the new file is only recorded as another source of that chunk
+instead of embedding and storing a clone.
+"""
+import hashlib
+import os
+import re
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from ..models import ChunkBand, ChunkSource, IndexedChunk
+
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.9"))
+SHINGLE_SIZE = 5  # words
+
+NUM_PERM = 128
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(20251)
+_A = _rng.randint(1, _PRIME, NUM_PERM).astype(np.int64)
+_B = _rng.randint(0, _PRIME, NUM_PERM).astype(np.int64)
+
+
+def _hash32(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=4).digest(), "little")
+
+
+def shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def minhash(text: str) -> np.ndarray:
+    hashes = np.fromiter((_hash32(s) % _PRIME for s in shingles(text)), dtype=np.int64)
+    # (a * h + b) mod p stays below 2**63 because a, b, h < 2**31
+    return ((_A[:, None] * hashes[None, :] + _B[:, None]) % _PRIME).min(axis=1).astype(np.uint32)
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    keys = []
+    for band in range(BANDS):
+        data = bytes([band]) + signature[band * ROWS:(band + 1) * ROWS].tobytes()
+        keys.append(int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little", signed=True))
+    return keys
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two signatures."""
+    return float(np.mean(a == b))
+
+
+class ChunkDeduplicator:
+    """Registers the chunks of one file, telling which ones still need to be embedded."""
+
+    def __init__(self, session: Session, threshold: float = DEDUP_THRESHOLD):
+        self.session = session
+        self.threshold = threshold
+
+    def _find_duplicate(self, signature: np.ndarray, keys: List[int]) -> Optional[str]:
+        candidates = self.session.exec(
+            select(IndexedChunk)
+            .join(ChunkBand, ChunkBand.chunk_id == IndexedChunk.id)
+            .where(ChunkBand.band_key.in_(keys))
+            .distinct()
+        ).all()
+        best_id, best = None, self.threshold
+        for candidate in candidates:
+            score = similarity(signature, np.frombuffer(candidate.signature, dtype=np.uint32))
+            if score >= best:
+                best_id, best = candidate.id, score
+        return best_id
+
+    def add(self, text: str, file_id: int) -> Tuple[str, bool]:
+        """
+        Return (chunk id, is_new). When is_new is False the chunk is a
+        near-duplicate of an already embedded one and must not be embedded again.
+        """
+        signature = minhash(text)
+        keys = band_keys(signature)
+
+        chunk_id = self._find_duplicate(signature, keys) if DEDUP_ENABLED else None
+        is_new = chunk_id is None
+        if is_new:
+            chunk_id = f"{file_id}-{hashlib.sha1(text.encode('utf-8')).hexdigest()[:16]}"
+            if self.session.get(IndexedChunk, chunk_id) is None:
+                self.session.add(IndexedChunk(id=chunk_id, file_id=file_id, signature=signature.tobytes()))
+                for key in dict.fromkeys(keys):
+                    self.session.add(ChunkBand(band_key=key, chunk_id=chunk_id))
+            else:
+                # identical text twice in the same file
+                is_new = False
+
+        if self.session.get(ChunkSource, (chunk_id, file_id)) is None:
+            self.session.add(ChunkSource(chunk_id=chunk_id, file_id=file_id))
+        # make the chunk visible to the lookups of the next chunks of this file
+        self.session.flush()
+        return chunk_id, is_new
+
+
+def remove_file_sources(session: Session, file_id: int) -> List[str]:
+    """
+    Drop `file_id` as a source of its chunks and return the ids of chunks that
+    no file refers to anymore; those must be deleted from the vector store.
+    """
+    chunk_ids = session.exec(select(ChunkSource.chunk_id).where(ChunkSource.file_id == file_id)).all()
+    if not chunk_ids:
+        return []
+
+    session.execute(delete(ChunkSource).where(ChunkSource.file_id == file_id))
+    still_used = set(session.exec(
+        select(ChunkSource.chunk_id).where(ChunkSource.chunk_id.in_(chunk_ids)).distinct()
+    ).all())
+    orphans = [chunk_id for chunk_id in chunk_ids if chunk_id not in still_used]
+    if orphans:
+        session.execute(delete(ChunkBand).where(ChunkBand.chunk_id.in_(orphans)))
+        session.execute(delete(IndexedChunk).where(IndexedChunk.id.in_(orphans)))
+    return orphans
@@ -0,0 +1,362 @@
+"""
+Embedded, in-process vector store: an alternative to the Chroma HTTP service
+for single-node deployments, selected with VECTOR_STORE=local.
+
+Layout under VECTOR_STORE_DIR/<collection>/:
+
+- header.json   dimension and dtype of the vectors
+- vectors.bin   row-major matrix of L2-normalized vectors, append-only,
+                memory-mapped for search
+- records.jsonl append-only log: one {"row", "id", "text", "metadata"} line per
+                added vector, one {"delete": id} line per deletion
+
+Searching is a batched NumPy dot product over the memory-mapped matrix, so
+no JSON crosses the network. The worker appends, the backend only reads:
+readers pick up new log lines and matrix rows on their next search.
+
+Compaction replaces all three files. Writers hold an exclusive flock on
+.lock and readers a shared one while they load, so a reader never combines
+files of two generations; on a new generation in the header it reloads
+everything and maps the new matrix.
+"""
+import fcntl
+import json
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", "/data/vectors")
+VECTOR_DTYPE = os.getenv("VECTOR_DTYPE", "float16")  # float16 | float32
+SEARCH_BATCH_ROWS = 65536
+# rewrite the files once this share of rows is deleted
+COMPACT_DELETED_RATIO = 0.3
+
+Filter = Dict[str, Any]
+
+
+def _matches(metadata: Dict[str, Any], where: Optional[Filter]) -> bool:
+    """Chroma-style equality filter: {"key": value} or {"key": {"$in": [...]}}, all must hold."""
+    if not where:
+        return True
+    for key, expected in where.items():
+        value = metadata.get(key)
+        if isinstance(expected, dict):
+            if "$in" in expected and value not in expected["$in"]:
+                return False
+            if "$ne" in expected and value == expected["$ne"]:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    def __init__(
+        self,
+        embedding_function: Embeddings,
+        collection_name: str = "example_collection",
+        persist_directory: str = VECTOR_STORE_DIR,
+        dtype: str = VECTOR_DTYPE,
+    ):
+        self._embedding = embedding_function
+        self.path = os.path.join(persist_directory, collection_name)
+        os.makedirs(self.path, exist_ok=True)
+        self._header_path = os.path.join(self.path, "header.json")
+        self._vectors_path = os.path.join(self.path, "vectors.bin")
+        self._log_path = os.path.join(self.path, "records.jsonl")
+        self._lock_path = os.path.join(self.path, ".lock")
+
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        # bumped by every compaction, so readers know to reload from scratch
+        self.generation = 0
+        self._lock = threading.RLock()
+        self._reset()
+        self._refresh()
+
+    def _reset(self) -> None:
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        self._alive = bytearray()
+        self._matrix: Optional[np.ndarray] = None
+        self._log_offset = 0
+
+    def _read_header(self) -> None:
+        if not os.path.exists(self._header_path):
+            return
+        with open(self._header_path) as f:
+            header = json.load(f)
+        self.dim = header["dim"]
+        self.dtype = np.dtype(header["dtype"])
+        if header.get("generation", 0) != self.generation:
+            self.generation = header.get("generation", 0)
+            self._reset()
+
+    def _write_header(self) -> None:
+        tmp = self._header_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"dim": self.dim, "dtype": self.dtype.name, "generation": self.generation}, f)
+        os.replace(tmp, self._header_path)
+
+    def _alive_mask(self) -> np.ndarray:
+        return np.frombuffer(bytes(self._alive), dtype=bool)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    # ------------------------------------------------------------------
+    # persistence
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        """
+        Serialize writers across processes (backend and worker share /data).
+        Readers take the lock shared. flock is per open file, so never take it
+        again while holding it.
+        """
+        with open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _apply_record(self, record: Dict[str, Any]) -> None:
+        if "delete" in record:
+            row = self._row_of.pop(record["delete"], None)
+            if row is not None:
+                self._alive[row] = 0
+            return
+
+        row = record["row"]
+        if row != len(self._ids):
+            raise RuntimeError(f"Vector log out of order at row {row} in {self._log_path}")
+        old = self._row_of.get(record["id"])
+        if old is not None:
+            self._alive[old] = 0
+        self._ids.append(record["id"])
+        self._texts.append(record["text"])
+        self._metadatas.append(record["metadata"])
+        self._row_of[record["id"]] = row
+        self._alive.append(1)
+
+    def _refresh(self) -> None:
+        """Apply log lines written since the last refresh, possibly by another process."""
+        with self._lock, self._file_lock(shared=True):
+            self._load_changes()
+
+    def _load_changes(self) -> None:
+        """_refresh() for callers that already hold the file lock."""
+        with self._lock:
+            self._read_header()
+            if not os.path.exists(self._log_path):
+                return
+            if os.path.getsize(self._log_path) != self._log_offset:
+                with open(self._log_path, "rb") as f:
+                    f.seek(self._log_offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break  # partially written line, pick it up next time
+                        self._apply_record(json.loads(line))
+                        self._log_offset += len(line)
+            # map the matrix under the lock too, so it belongs to the same generation as the log
+            self._vectors()
+
+    def _vectors(self) -> np.ndarray:
+        if self._matrix is None or len(self._matrix) != len(self._ids):
+            if not self._ids:
+                return np.zeros((0, self.dim or 0), dtype=self.dtype)
+            self._matrix = np.memmap(
+                self._vectors_path, dtype=self.dtype, mode="r", shape=(len(self._ids), self.dim)
+            )
+        return self._matrix
+
+    # ------------------------------------------------------------------
+    # VectorStore API
+    # ------------------------------------------------------------------
+
+    def add_embeddings(
+        self,
+        texts: Sequence[str],
+        vectors: Sequence[Sequence[float]],
+        metadatas: Optional[Sequence[Dict[str, Any]]] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> List[str]:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.size == 0:
+            return []
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+        ids = list(ids) if ids else [str(uuid.uuid4()) for _ in texts]
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+
+        with self._lock, self._file_lock():
+            self._load_changes()
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                self._write_header()
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Expected vectors of dimension {self.dim}, got {matrix.shape[1]}")
+
+            # vectors first, then the log: a reader never sees a record without its row
+            with open(self._vectors_path, "ab") as f:
+                # drop rows of an earlier write that crashed before its log lines
+                f.truncate(len(self._ids) * self.dim * self.dtype.itemsize)
+                f.write(matrix.astype(self.dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self._log_path, "ab") as f:
+                for offset, (id_, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                    record = {"row": len(self._ids) + offset, "id": id_, "text": text, "metadata": metadata}
+                    f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._load_changes()
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        return self.add_embeddings(texts, self._embedding.embed_documents(texts), metadatas, ids)
+
+    def delete(self, ids: Optional[List[str]] = None, where: Optional[Filter] = None, **kwargs: Any) -> bool:
+        with self._lock, self._file_lock():
+            self._load_changes()
+            targets = set(ids or [])
+            if where:
+                targets.update(
+                    self._ids[row] for row in np.flatnonzero(self._alive_mask())
+                    if _matches(self._metadatas[row], where)
+                )
+            targets = [id_ for id_ in targets if id_ in self._row_of]
+            if not targets:
+                return True
+            with open(self._log_path, "ab") as f:
+                for id_ in targets:
+                    f.write(json.dumps({"delete": id_}).encode("utf-8") + b"\n")
+            self._load_changes()
+
+            if len(self._ids) and 1 - self._alive_mask().mean() > COMPACT_DELETED_RATIO:
+                self._compact()
+        return True
+
+    def count(self) -> int:
+        self._refresh()
+        return int(self._alive_mask().sum())
+
+    def _compact(self) -> None:
+        """
+        Rewrite vectors and log without deleted rows (caller holds both locks).
+        The header with the new generation is written last.
+        """
+        alive = np.flatnonzero(self._alive_mask())
+        vectors = np.array(self._vectors()[alive])
+        tmp_vectors = self._vectors_path + ".tmp"
+        tmp_log = self._log_path + ".tmp"
+        with open(tmp_vectors, "wb") as f:
+            f.write(vectors.tobytes())
+        with open(tmp_log, "wb") as f:
+            for new_row, row in enumerate(alive):
+                record = {"row": new_row, "id": self._ids[row], "text": self._texts[row], "metadata": self._metadatas[row]}
+                f.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._matrix = None
+        os.replace(tmp_vectors, self._vectors_path)
+        os.replace(tmp_log, self._log_path)
+        self.generation += 1
+        self._write_header()
+
+        self._reset()
+        self._load_changes()
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: Sequence[float],
+        k: int = 4,
+        filter: Optional[Filter] = None,
+    ) -> List[Tuple[Document, float]]:
+        self._refresh()
+        with self._lock:
+            rows = np.flatnonzero(self._alive_mask())
+            if filter:
+                rows = np.array([row for row in rows if _matches(self._metadatas[row], filter)], dtype=np.int64)
+            if not len(rows) or k <= 0:
+                return []
+
+            query = np.asarray(embedding, dtype=np.float32)
+            query = query / max(float(np.linalg.norm(query)), 1e-12)
+            matrix = self._vectors()
+
+            best_rows: List[np.ndarray] = []
+            best_scores: List[np.ndarray] = []
+            # bounded memory: score the matrix in slices and keep each slice's top k
+            for start in range(0, len(rows), SEARCH_BATCH_ROWS):
+                batch = rows[start:start + SEARCH_BATCH_ROWS]
+                scores = np.asarray(matrix[batch], dtype=np.float32) @ query
+                top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+                best_rows.append(batch[top])
+                best_scores.append(scores[top])
+
+            all_rows = np.concatenate(best_rows)
+            all_scores = np.concatenate(best_scores)
+            order = np.argsort(-all_scores)[:k]
+            return [
+                (
+                    Document(
+                        id=self._ids[all_rows[i]],
+                        page_content=self._texts[all_rows[i]],
+                        metadata=dict(self._metadatas[all_rows[i]]),
+                    ),
+                    float(all_scores[i]),
+                )
+                for i in order
+            ]
+
+    def similarity_search_with_score(
+        self, query: str, k: int = 4, filter: Optional[Filter] = None, **kwargs: Any
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(
+        self, query: str, k: int = 4, filter: Optional[Filter] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def similarity_search_by_vector(
+        self, embedding: List[float], k: int = 4, filter: Optional[Filter] = None, **kwargs: Any
+    ) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # cosine similarity in [-1, 1] -> relevance in [0, 1]
+        return lambda score: (score + 1) / 2
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        *,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> "LocalVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids=ids)
+        return store
@@ -0,0 +1,387 @@
+"""
+Single text extraction stage shared by the analysis pipeline and the RAG index.
+
+Every upload is parsed exactly once here. The normalized text and its block
+structure (pages, paragraphs, tables, sheets) are persisted on FileContent and
+then fed both to `analysis.analyze_file` and to `RAG.add_document`.
+
+Extraction streams: every format is read page by page / sheet by sheet /
+chunk by chunk, large PDFs are spread over a process pool, and the amount of
+text kept per document is capped, so memory stays bounded for huge uploads.
+"""
+import codecs
+import multiprocessing
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+BLOCK_SEPARATOR = "\n"
+CELL_SEPARATOR = " | "
+
+# at most this many characters of text are kept per document
+MAX_EXTRACTED_CHARS = int(os.getenv("MAX_EXTRACTED_CHARS", str(2_000_000)))
+# PDFs with at least this many pages are extracted in parallel
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "40"))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "10"))
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", str(os.cpu_count() or 1)))
+# page ranges submitted to the pool ahead of the one being consumed
+PDF_MAX_IN_FLIGHT = int(os.getenv("PDF_MAX_IN_FLIGHT", str(2 * EXTRACTION_WORKERS)))
+PLAINTEXT_READ_SIZE = 64 * 1024
+UTF16_BOMS = (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)
+
+# (kind, text, label)
+Block = Tuple[str, str, Optional[str]]
+
+
+class UnsupportedFormatError(ValueError):
+    pass
+
+
+@dataclass
+class ExtractedDocument:
+    text: str = ""
+    # [{"kind": "page" | "paragraph" | "table" | "sheet" | "text" | "transcript",
+    #   "start": int, "end": int, "label": str | None}], offsets into text
+    blocks: List[Dict[str, Any]] = field(default_factory=list)
+    truncated: bool = False
+
+    def block_texts(self, kind: Optional[str] = None) -> List[str]:
+        return [
+            self.text[block["start"]:block["end"]]
+            for block in self.blocks
+            if kind is None or block["kind"] == kind
+        ]
+
+    @classmethod
+    def from_stored(cls, text: Optional[str], blocks: Optional[List[Dict[str, Any]]]) -> "ExtractedDocument":
+        text = text or ""
+        return cls(text=text, blocks=blocks or [{"kind": "text", "start": 0, "end": len(text)}])
+
+
+class DocumentBuilder:
+    """Collects blocks into an ExtractedDocument, stopping at max_chars."""
+
+    def __init__(self, max_chars: int = MAX_EXTRACTED_CHARS):
+        self.max_chars = max_chars
+        self.parts: List[str] = []
+        self.blocks: List[Dict[str, Any]] = []
+        self.length = 0
+        self.truncated = False
+
+    def add_block(self, kind: str, text: str, label: Optional[str] = None, **extra: Any) -> bool:
+        """Append a block; returns False once the character cap is reached."""
+        if self.truncated:
+            return False
+        if not text.strip():
+            return True
+
+        if self.parts:
+            self.parts.append(BLOCK_SEPARATOR)
+            self.length += len(BLOCK_SEPARATOR)
+
+        room = self.max_chars - self.length
+        if room <= 0:
+            self.truncated = True
+            return False
+        if len(text) > room:
+            text = text[:room]
+            self.truncated = True
+
+        start = self.length
+        self.parts.append(text)
+        self.length += len(text)
+        block = {"kind": kind, "start": start, "end": self.length}
+        if label:
+            block["label"] = label
+        block.update(extra)
+        self.blocks.append(block)
+        return not self.truncated
+
+    def build(self) -> ExtractedDocument:
+        return ExtractedDocument(text="".join(self.parts), blocks=self.blocks, truncated=self.truncated)
+
+
+# ---------------------------------------------------------------------------
+# format detection
+# ---------------------------------------------------------------------------
+
+OLE_EXTENSIONS = {".doc": "doc", ".xls": "xls", ".ppt": "ppt"}
+AUDIO_EXTENSIONS = {".wav", ".mp3", ".m4a", ".flac", ".ogg", ".aac"}
+# ISO base media files (MP4, MOV, HEIC, AVIF, ...) name their content in the
+# major brand of the leading ftyp box
+ISO_AUDIO_BRANDS = {b"M4A ", b"M4B ", b"M4P ", b"F4A ", b"F4B "}
+ISO_IMAGE_BRANDS = {b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"mif1", b"msf1", b"avif", b"avis"}
+# used for audio-only and video files alike, so the extension decides
+ISO_GENERIC_BRANDS = {b"isom", b"iso2", b"iso4", b"iso5", b"iso6", b"mp41", b"mp42", b"dash", b"3gp4", b"3gp5", b"3g2a"}
+
+
+def _detect_zip_format(path: str) -> Optional[str]:
+    try:
+        with zipfile.ZipFile(path) as archive:
+            names = set(archive.namelist())
+            if "word/document.xml" in names:
+                return "docx"
+            if "xl/workbook.xml" in names:
+                return "xlsx"
+            if "ppt/presentation.xml" in names:
+                return "pptx"
+            if "mimetype" in names and b"opendocument.text" in archive.read("mimetype"):
+                return "odt"
+    except zipfile.BadZipFile:
+        return None
+    return None
+
+
+def _looks_like_text(head: bytes) -> bool:
+    if not head:
+        return True
+    if b"\x00" in head:
+        return False
+    try:
+        head.decode("utf-8")
+        return True
+    except UnicodeDecodeError as e:
+        # a multi-byte character cut off at the end of the sample is fine
+        return e.start >= len(head) - 3
+
+
+def _iso_media_format(head: bytes, ext: str) -> str:
+    brand = head[8:12]
+    if brand in ISO_AUDIO_BRANDS or (brand in ISO_GENERIC_BRANDS and ext in AUDIO_EXTENSIONS):
+        return "audio"
+    if brand in ISO_IMAGE_BRANDS:
+        return "image"
+    # MOV, M4V and MP4 videos: not worth a Whisper run
+    return "video"
+
+
+def detect_format(path: str, filename: Optional[str] = None) -> str:
+    """
+    Detect the file format from its leading bytes. tusd stores uploads under
+    an id without extension, so the original filename is only a tiebreaker
+    (e.g. for OLE containers, which look the same for .doc and .xls).
+    """
+    with open(path, "rb") as f:
+        head = f.read(4096)
+    ext = Path(filename or path).suffix.lower()
+
+    if head.startswith(b"%PDF"):
+        return "pdf"
+    if head.startswith(b"PK\x03\x04"):
+        return _detect_zip_format(path) or "zip"
+    if head.startswith(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"):
+        return OLE_EXTENSIONS.get(ext, "ole")
+    if head[4:8] == b"ftyp":
+        return _iso_media_format(head, ext)
+    if (
+        head.startswith((b"ID3", b"fLaC", b"OggS", b"\xff\xfb", b"\xff\xf3", b"\xff\xf1", b"\xff\xf9"))
+        or (head[:4] == b"RIFF" and head[8:12] == b"WAVE")
+    ):
+        return "audio"
+    # UTF-16 text is full of NUL bytes, so it has to be recognized by its BOM
+    if head.startswith(UTF16_BOMS) or _looks_like_text(head):
+        return "text"
+    if ext in AUDIO_EXTENSIONS:
+        return "audio"
+    return "binary"
+
+
+# ---------------------------------------------------------------------------
+# streaming extractors, each yields (kind, text, label) blocks
+# ---------------------------------------------------------------------------
+
+def _row_text(values) -> str:
+    return CELL_SEPARATOR.join("" if value is None else str(value).strip() for value in values)
+
+
+def _pdf_page_range(path: str, start: int, stop: int) -> List[str]:
+    # runs in a pool process: open the file there instead of pickling pages
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the worker holds database connections and HTTP
+        # sessions (and maybe threads) that must not be copied into the children
+        _pool = ProcessPoolExecutor(max_workers=EXTRACTION_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def _iter_pdf(path: str, max_chars: int) -> Iterator[Block]:
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+
+    if page_count < PDF_PARALLEL_MIN_PAGES or EXTRACTION_WORKERS < 2:
+        for number, page in enumerate(reader.pages, start=1):
+            yield "page", page.extract_text() or "", f"page {number}"
+        return
+
+    del reader
+    pool = _get_pool()
+    # only a few ranges are queued at a time, in page order, so a document that
+    # hits max_chars early (the caller closes this generator) leaves little work behind
+    in_flight: Deque[Tuple[int, Future]] = deque()
+
+    def pages(start: int, future: Future) -> Iterator[Block]:
+        for offset, text in enumerate(future.result()):
+            yield "page", text, f"page {start + offset + 1}"
+
+    try:
+        for start in range(0, page_count, PDF_PAGES_PER_TASK):
+            stop = min(start + PDF_PAGES_PER_TASK, page_count)
+            in_flight.append((start, pool.submit(_pdf_page_range, path, start, stop)))
+            if len(in_flight) >= PDF_MAX_IN_FLIGHT:
+                yield from pages(*in_flight.popleft())
+        while in_flight:
+            yield from pages(*in_flight.popleft())
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+
+def _iter_docx(path: str, max_chars: int) -> Iterator[Block]:
+    import docx
+    from docx.table import Table
+    from docx.text.paragraph import Paragraph
+
+    document = docx.Document(path)
+    # walk the body in order so tables stay where they were in the document
+    for child in document.element.body.iterchildren():
+        tag = child.tag.rsplit("}", 1)[-1]
+        if tag == "p":
+            yield "paragraph", Paragraph(child, document).text, None
+        elif tag == "tbl":
+            table = Table(child, document)
+            rows = [_row_text(cell.text for cell in row.cells) for row in table.rows]
+            yield "table", "\n".join(rows), None
+
+
+def _iter_xlsx(path: str, max_chars: int) -> Iterator[Block]:
+    from openpyxl import load_workbook
+
+    # read_only streams rows instead of loading the whole workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            rows: List[str] = []
+            size = 0
+            for row in sheet.iter_rows(values_only=True):
+                if not any(value is not None for value in row):
+                    continue
+                line = _row_text(row)
+                rows.append(line)
+                size += len(line) + 1
+                if size > max_chars:
+                    break
+            yield "sheet", "\n".join(rows), sheet.title
+    finally:
+        workbook.close()
+
+
+def _iter_unstructured(path: str, max_chars: int) -> Iterator[Block]:
+    # legacy binary formats (.doc, .xls, .ppt, ...) that have no lightweight parser
+    from unstructured.partition.auto import partition
+
+    for element in partition(filename=path):
+        kind = "table" if element.category == "Table" else "paragraph"
+        yield kind, element.text, None
+
+
+def _iter_plaintext(path: str, max_chars: int) -> Iterator[Block]:
+    with open(path, "rb") as f:
+        bom = f.read(2)
+    # the utf-16 codec reads the byte order from the BOM; utf-8-sig drops a UTF-8 BOM
+    encoding = "utf-16" if bom in UTF16_BOMS else "utf-8-sig"
+    with open(path, "r", encoding=encoding, errors="ignore") as f:
+        while True:
+            chunk = f.read(PLAINTEXT_READ_SIZE)
+            if not chunk:
+                return
+            # finish the current line so lines are not split across blocks
+            if not chunk.endswith("\n"):
+                chunk += f.readline(PLAINTEXT_READ_SIZE)
+            # the block separator stands in for the trailing newline
+            if chunk.endswith("\n"):
+                chunk = chunk[:-1]
+            yield "text", chunk, None
+
+
+ITERATORS = {
+    "pdf": _iter_pdf,
+    "docx": _iter_docx,
+    "xlsx": _iter_xlsx,
+    "pptx": _iter_unstructured,
+    "odt": _iter_unstructured,
+    "doc": _iter_unstructured,
+    "xls": _iter_unstructured,
+    "ppt": _iter_unstructured,
+    "ole": _iter_unstructured,
+    "text": _iter_plaintext,
+}
+
+
+def iter_blocks(path: str, filename: Optional[str] = None, max_chars: int = MAX_EXTRACTED_CHARS) -> Iterator[Block]:
+    """
+    Stream the blocks of a file without holding the whole document in memory.
+    Extractors that buffer a block (a spreadsheet sheet) stop it at `max_chars`.
+    """
+    fmt = detect_format(path, filename)
+    iterator = ITERATORS.get(fmt)
+    if iterator is None:
+        raise UnsupportedFormatError(f"Cannot extract text from {fmt} file {filename or path}")
+    return iterator(path, max_chars)
+
+
+def extract_document(
+    path: str,
+    filename: Optional[str] = None,
+    max_chars: int = MAX_EXTRACTED_CHARS,
+) -> ExtractedDocument:
+    """Parse the file at `path` once, keeping at most `max_chars` characters of text."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    builder = DocumentBuilder(max_chars=max_chars)
+    blocks = iter_blocks(path, filename, max_chars)
+    try:
+        for kind, text, label in blocks:
+            if not builder.add_block(kind, text, label):
+                break
+    finally:
+        close = getattr(blocks, "close", None)
+        if close:
+            close()
+    return builder.build()
+
+
+def transcript_document(transcript: str, segments: Optional[List[Dict[str, Any]]] = None) -> ExtractedDocument:
+    """
+    Build a document from a Whisper transcript. With timestamped segments,
+    every segment becomes its own block carrying t_start / t_end seconds.
+    """
+    builder = DocumentBuilder()
+    if not segments:
+        builder.add_block("transcript", transcript)
+        return builder.build()
+
+    for segment in segments:
+        builder.add_block(
+            "segment",
+            segment.get("text", "").strip(),
+            t_start=segment.get("start"),
+            t_end=segment.get("end"),
+        )
+    return builder.build()
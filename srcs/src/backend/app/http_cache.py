@@ -0,0 +1,20 @@
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+
+def etag_response(request: Request, content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    JSON response with an ETag of its body. Clients revalidate every time
+    (no-cache) and get an empty 304 when their If-None-Match still matches.
+    """
+    body = json.dumps(jsonable_encoder(content), separators=(",", ":")).encode("utf-8")
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -1,9 +1,14 @@
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 
-from .db import init_db
-from .routers import regions, schools, files, chat
+from .db import engine, init_db
+from .metrics import QueueDepthCollector
+from .routers import regions, schools, files, stats, export, chat
 
 app = FastAPI(title="DigiEduHack Backend")
 
@@ -13,13 +18,47 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Link", "X-Next-Cursor", "X-Export-Until", "Content-Disposition"],
 )
 
 app.include_router(chat.router)
 app.include_router(regions.router)
 app.include_router(schools.router)
 app.include_router(files.router)
+app.include_router(stats.router)
+app.include_router(export.router)
 
 @app.on_event("startup")
 def on_startup():
     init_db()
+
+REGISTRY.register(QueueDepthCollector(engine))
+
+
+@app.get("/health", include_in_schema=False)
+def health():
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+def ready():
+    """
+    Ready once the database answers. The chat pipeline starts in the background
+    and is reported separately, since everything else works without it.
+    """
+    try:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+        database = "ready"
+    except SQLAlchemyError as e:
+        database = f"unavailable: {type(e).__name__}"
+
+    body = {"database": database, "chat": chat.rag.state}
+    if chat.rag.error is not None and chat.rag.state != "ready":
+        body["chat_error"] = chat.rag.error
+    return JSONResponse(body, status_code=200 if database == "ready" else 503)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,107 @@
+"""
+Prometheus metrics shared by the backend and the worker.
+
+The backend serves them on GET /metrics, the worker on its own port
+(WORKER_METRICS_PORT). Per-file stage durations are also stored on FileMeta
+(see STAGE_COLUMNS), so percentiles can be queried per school or file type.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9100"))
+
+# seconds, from sub-second text files up to long recordings
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600)
+
+# stage name -> FileMeta column holding its duration for the last run of the file
+STAGE_COLUMNS = {
+    "wait": "wait_seconds",
+    "transcribe": "transcribe_seconds",
+    "extract": "extract_seconds",
+    "analysis": "analysis_seconds",
+    "index": "index_seconds",
+    "total": "processing_seconds",
+}
+
+STAGE_SECONDS = Histogram(
+    "worker_stage_seconds", "Duration of a file processing stage", ["stage"], buckets=STAGE_BUCKETS,
+)
+FILES_PROCESSED = Counter("worker_files_total", "Files processed by the worker, by outcome", ["outcome"])
+DEPENDENCY_FAILURES = Counter(
+    "worker_dependency_failures_total", "Transient failures of external dependencies", ["dependency"],
+)
+
+EXTRACTED_CHARS = Histogram(
+    "extraction_chars", "Characters of text extracted per document",
+    buckets=(100, 1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 2_000_000),
+)
+EXTRACTION_TRUNCATED = Counter("extraction_truncated_total", "Documents cut off at MAX_EXTRACTED_CHARS")
+
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_seconds", "Duration of LLM requests", ["pool"], buckets=STAGE_BUCKETS,
+)
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens processed", ["pool", "kind"])
+
+EMBEDDING_BATCH_SIZE = Histogram(
+    "embedding_batch_size", "Chunks embedded per vector store write",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+EMBEDDING_SECONDS = Histogram(
+    "embedding_seconds", "Duration of embedding and storing one batch of chunks", buckets=STAGE_BUCKETS,
+)
+CHUNKS_DEDUPLICATED = Counter("rag_chunks_deduplicated_total", "Chunks skipped as near-duplicates")
+
+CHAT_TIME_TO_FIRST_TOKEN = Histogram(
+    "chat_time_to_first_token_seconds", "Time from a chat query to the first streamed answer token",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30, 60),
+)
+CHAT_SECONDS = Histogram(
+    "chat_response_seconds", "Time to stream a complete chat answer", buckets=STAGE_BUCKETS,
+)
+RETRIEVAL_SECONDS = Histogram(
+    "rag_retrieval_seconds", "Duration of a vector store similarity search",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+@contextmanager
+def stage_timer(stage: str, durations: Optional[Dict[str, float]] = None) -> Iterator[None]:
+    """Observe the duration of a stage, also adding it to `durations` if given."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        if durations is not None:
+            durations[stage] = durations.get(stage, 0.0) + elapsed
+
+
+class QueueDepthCollector:
+    """Number of files per analysis status, read from the database on every scrape."""
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    def describe(self):
+        return []
+
+    def collect(self):
+        from sqlalchemy import func
+        from sqlmodel import Session, select
+
+        from .models import FileMeta
+
+        gauge = GaugeMetricFamily("analysis_queue_files", "Files by analysis status", labels=["status"])
+        with Session(self.engine) as session:
+            rows = session.exec(
+                select(FileMeta.analysis_status, func.count()).group_by(FileMeta.analysis_status)
+            ).all()
+        for status, count in rows:
+            gauge.add_metric([status], count)
+        yield gauge
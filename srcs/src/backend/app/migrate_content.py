@@ -0,0 +1,101 @@
+"""
+One-off migration: move the large text / JSON blobs that used to live inline
+on the filemeta table into the compressed filecontent table.
+
+    python -m app.migrate_content [--drop-columns] [--batch-size N]
+
+Safe to re-run: rows that were already moved are skipped.
+"""
+import argparse
+import json
+
+from sqlalchemy import inspect, text
+from sqlmodel import Session
+
+from .db import engine, init_db
+from .models import FileContent
+
+LEGACY_COLUMNS = ["extracted_text", "transcript_text", "basic_stats", "llm_summary"]
+JSON_COLUMNS = {"basic_stats", "llm_summary"}
+
+
+def _decode(column: str, value):
+    if value is None or column not in JSON_COLUMNS or not isinstance(value, str):
+        return value
+    try:
+        return json.loads(value)
+    except json.JSONDecodeError:
+        return None
+
+
+def migrate(batch_size: int = 200, drop_columns: bool = False) -> int:
+    init_db()
+
+    existing = {c["name"] for c in inspect(engine).get_columns("filemeta")}
+    legacy = [c for c in LEGACY_COLUMNS if c in existing]
+    if not legacy:
+        print("Nothing to migrate: filemeta has no inline content columns.")
+        return 0
+
+    not_null = " OR ".join(f"{c} IS NOT NULL" for c in legacy)
+    select_sql = text(
+        f"SELECT id, {', '.join(legacy)} FROM filemeta "
+        f"WHERE id > :last_id AND ({not_null}) ORDER BY id LIMIT :limit"
+    )
+    clear_sql = text(
+        f"UPDATE filemeta SET {', '.join(f'{c} = NULL' for c in legacy)} WHERE id = :id"
+    )
+
+    moved = 0
+    last_id = 0
+    while True:
+        with Session(engine) as session:
+            rows = session.execute(select_sql, {"last_id": last_id, "limit": batch_size}).all()
+            if not rows:
+                break
+
+            for row in rows:
+                file_id = row[0]
+                content = session.get(FileContent, file_id) or FileContent(file_id=file_id)
+                for column, value in zip(legacy, row[1:]):
+                    # never overwrite content that was written after the split
+                    if getattr(content, column) is None:
+                        setattr(content, column, _decode(column, value))
+                session.add(content)
+                session.execute(clear_sql, {"id": file_id})
+                last_id = file_id
+
+            session.commit()
+            moved += len(rows)
+            print(f"Moved content of {moved} files (last id {last_id})")
+
+    if drop_columns:
+        with engine.begin() as conn:
+            for column in legacy:
+                conn.execute(text(f"ALTER TABLE filemeta DROP COLUMN {column}"))
+        print(f"Dropped legacy columns: {', '.join(legacy)}")
+
+    if engine.dialect.name == "sqlite":
+        # give the freed pages back so status scans touch fewer of them
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.execute(text("VACUUM"))
+
+    return moved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument(
+        "--drop-columns",
+        action="store_true",
+        help="drop the emptied legacy columns (needs SQLite >= 3.35 or Postgres)",
+    )
+    args = parser.parse_args()
+
+    moved = migrate(batch_size=args.batch_size, drop_columns=args.drop_columns)
+    print(f"Done, migrated {moved} files.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,46 @@
+import json
+import zlib
 from typing import Optional, Dict, Any
+from sqlalchemy import BigInteger, Index, LargeBinary, UniqueConstraint
+from sqlalchemy.types import TypeDecorator
 from sqlmodel import SQLModel, Field, Column, JSON, Relationship
 from datetime import datetime
 
+COMPRESSION_LEVEL = 6
+
+
+class CompressedText(TypeDecorator):
+    """Text stored as a zlib-compressed blob, decompressed transparently on load."""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(value.encode("utf-8"), COMPRESSION_LEVEL)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.decompress(value).decode("utf-8")
+
+
+class CompressedJSON(CompressedText):
+    """JSON document stored as a zlib-compressed blob."""
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return super().process_bind_param(json.dumps(value, ensure_ascii=False), dialect)
+
+    def process_result_value(self, value, dialect):
+        text = super().process_result_value(value, dialect)
+        if text is None:
+            return None
+        return json.loads(text)
+
+
 class Region(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str
@@ -19,6 +58,23 @@ class School(SQLModel, table=True):
 
 
 class FileMeta(SQLModel, table=True):
+    __table_args__ = (
+        # worker queue and filtered listings; GET /files pages on id, so the
+        # filter column is followed by id and no page has to be sorted
+        Index("ix_filemeta_status_id", "analysis_status", "id"),
+        # queue claims, see scheduler.py: a school's cheapest and its oldest queued files
+        Index("ix_filemeta_queue_cost", "analysis_status", "queue_priority", "school_id", "cost_estimate", "id"),
+        Index("ix_filemeta_queue_age", "analysis_status", "queue_priority", "school_id", "uploaded_at", "id"),
+        # per-school listings and dashboards
+        Index("ix_filemeta_school_id", "school_id", "id"),
+        Index("ix_filemeta_type_id", "analysis_type", "id"),
+        Index("ix_filemeta_uploaded_at", "uploaded_at"),
+        # duplicate checks when registering uploads in bulk
+        Index("ix_filemeta_tus_id", "tus_id"),
+        # incremental exports of analyzed files
+        Index("ix_filemeta_finished_at", "analysis_finished_at", "id"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
 
     tus_id: str
@@ -28,24 +84,36 @@ class FileMeta(SQLModel, table=True):
     uploaded_at: datetime = Field(default_factory=datetime.utcnow)
 
     # analysis
-    analysis_status: str = Field(default="pending")  # "pending" | "processing" | "done" | "failed"
+    analysis_status: str = Field(default="pending")  # "pending" | "processing" | "parked" | "done" | "failed"
     analysis_started_at: Optional[datetime] = None
     analysis_finished_at: Optional[datetime] = None
     analysis_error: Optional[str] = None
+    # transient failures so far; a "parked" file is picked up again at analysis_retry_at
+    analysis_attempts: Optional[int] = Field(default=0)
+    analysis_retry_at: Optional[datetime] = None
+    # scheduling, see scheduler.py: priority class and estimated processing seconds
+    queue_priority: Optional[int] = Field(default=1)
+    cost_estimate: Optional[float] = None
+    audio_seconds: Optional[float] = None
+    # stage durations of the last processing run in seconds, see metrics.STAGE_COLUMNS
+    wait_seconds: Optional[float] = None
+    transcribe_seconds: Optional[float] = None
+    extract_seconds: Optional[float] = None
+    analysis_seconds: Optional[float] = None
+    index_seconds: Optional[float] = None
+    processing_seconds: Optional[float] = None
 
-    # raw text (optional, if you want to reuse it)
-    extracted_text: Optional[str] = None
-
-    # stats + LLM result (use JSON column)
-    basic_stats: Optional[Dict[str, Any]] = Field(
-        default=None, sa_column=Column(JSON)
+    # large text / JSON blobs live in FileContent and are loaded on demand
+    content: Optional["FileContent"] = Relationship(
+        back_populates="file",
+        sa_relationship_kwargs={"uselist": False, "cascade": "all, delete-orphan"},
     )
-    llm_summary: Optional[Dict[str, Any]] = Field(
-        default=None, sa_column=Column(JSON)
+    # normalized (field, value) rows of the list-valued structured fields below
+    facets: list["FileFacet"] = Relationship(
+        back_populates="file",
+        sa_relationship_kwargs={"cascade": "all, delete-orphan"},
     )
 
-    transcript_text: Optional[str] = Field(default=None, sa_column_kwargs={"nullable": True})
-
     # normalized LLM output for easier querying
     analysis_summary_text: Optional[str] = Field(default=None, sa_column_kwargs={"nullable": True})
     analysis_type: Optional[str] = Field(default=None, sa_column_kwargs={"nullable": True})
@@ -71,3 +139,83 @@ class FileMeta(SQLModel, table=True):
     planned_goals: Optional[list[str]] = Field(default=None, sa_column=Column(JSON))
     gained_professional_development: Optional[list[str]] = Field(default=None, sa_column=Column(JSON))
     open_feedback: Optional[str] = Field(default=None, sa_column_kwargs={"nullable": True})
+
+    def get_content(self) -> "FileContent":
+        """Return the content row of this file, creating it if it does not exist yet."""
+        if self.content is None:
+            self.content = FileContent()
+        return self.content
+
+
+class FileContent(SQLModel, table=True):
+    """Large, rarely read per-file data, kept out of the hot FileMeta rows."""
+    file_id: Optional[int] = Field(default=None, primary_key=True, foreign_key="filemeta.id")
+
+    # raw text (optional, if you want to reuse it)
+    extracted_text: Optional[str] = Field(default=None, sa_column=Column(CompressedText))
+    transcript_text: Optional[str] = Field(default=None, sa_column=Column(CompressedText))
+    # block offsets into extracted_text, see extraction.ExtractedDocument
+    document_structure: Optional[list[Dict[str, Any]]] = Field(default=None, sa_column=Column(CompressedJSON))
+
+    # stats + LLM result
+    basic_stats: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(CompressedJSON))
+    llm_summary: Optional[Dict[str, Any]] = Field(default=None, sa_column=Column(CompressedJSON))
+
+    file: Optional[FileMeta] = Relationship(back_populates="content")
+
+
+class FileFacet(SQLModel, table=True):
+    """One value of a list-valued structured field, e.g. ("intervention", "Mentoring")."""
+    __table_args__ = (
+        Index("ix_filefacet_field_value", "field", "value", "file_id"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    file_id: int = Field(foreign_key="filemeta.id", index=True)
+    field: str
+    value: str
+
+    file: Optional[FileMeta] = Relationship(back_populates="facets")
+
+
+class StatsRollup(SQLModel, table=True):
+    """
+    Pre-aggregated count of analyzed ("done") files, maintained incrementally by
+    the worker. Rows with an empty field count files per group; the other rows
+    count files per structured field value. Empty strings stand in for "unknown"
+    so that the unique key also covers them.
+    """
+    __table_args__ = (
+        UniqueConstraint(
+            "school_id", "month", "analysis_type", "field", "value",
+            name="uq_statsrollup_key",
+        ),
+        Index("ix_statsrollup_field_value", "field", "value"),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    school_id: int
+    month: str  # "YYYY-MM"
+    analysis_type: str = ""
+    field: str = ""
+    value: str = ""
+    file_count: int = 0
+
+
+class IndexedChunk(SQLModel, table=True):
+    """A chunk embedded in the vector store, with its MinHash signature for near-duplicate lookup."""
+    id: str = Field(primary_key=True)  # id in the vector store
+    file_id: int = Field(index=True)  # file the chunk was first embedded for
+    signature: bytes = Field(sa_column=Column(LargeBinary, nullable=False))
+
+
+class ChunkBand(SQLModel, table=True):
+    """LSH band hashes of an IndexedChunk; chunks sharing a band are near-duplicate candidates."""
+    band_key: int = Field(sa_column=Column(BigInteger, primary_key=True))
+    chunk_id: str = Field(primary_key=True, foreign_key="indexedchunk.id")
+
+
+class ChunkSource(SQLModel, table=True):
+    """Every file whose text contains an IndexedChunk (or a near-duplicate of it), for citations."""
+    chunk_id: str = Field(primary_key=True, foreign_key="indexedchunk.id")
+    file_id: int = Field(primary_key=True, index=True)
@@ -1,12 +1,19 @@
 import os
+import time
 import requests
 import json
 
-OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://ollama:11434")
+from .metrics import LLM_REQUEST_SECONDS, LLM_TOKENS
+from .ollama_router import get_router
+
 # OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "deepseek-r1:1.5b")
 OLLAMA_MODEL = os.environ.get("OLLAMA_MODEL", "llama3.1:8b")
 
-def ask_llm(prompt: str):
+def ask_llm(prompt: str, timeout: float = 300):
+    """
+    Ask the analysis model for JSON. `timeout` covers the whole call: the time
+    spent waiting for a free endpoint is taken off the HTTP request's timeout.
+    """
     payload = {
         "model": OLLAMA_MODEL,
         "prompt": prompt,
@@ -14,9 +21,28 @@ def ask_llm(prompt: str):
         "stream": False,
     }
     
-    r = requests.post(f"{OLLAMA_HOST}/api/generate", json=payload, timeout=300)
+    router = get_router()
+    tried = []
+    started = time.perf_counter()
+    deadline = started + timeout
+    while True:
+        with router.endpoint("analysis", exclude=tried, timeout=max(deadline - time.perf_counter(), 0)) as endpoint:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise requests.Timeout(f"No time left for the LLM request after waiting {timeout:.0f}s for an endpoint")
+            try:
+                r = requests.post(f"{endpoint.url}/api/generate", json=payload, timeout=remaining)
+                break
+            except requests.ConnectionError as e:
+                router.mark_down(endpoint, e)
+                tried.append(endpoint)
+                if len(tried) >= len(router.pools["analysis"]):
+                    raise
     r.raise_for_status()
     data = r.json()
+    LLM_REQUEST_SECONDS.labels("analysis").observe(time.perf_counter() - started)
+    LLM_TOKENS.labels("analysis", "prompt").inc(data.get("prompt_eval_count") or 0)
+    LLM_TOKENS.labels("analysis", "completion").inc(data.get("eval_count") or 0)
     raw = data.get("response", "")
 
     raw = raw.strip()
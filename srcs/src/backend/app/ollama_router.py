@@ -0,0 +1,380 @@
+"""
+Routing of Ollama requests over several inference endpoints.
+
+Every workload has its own pool of endpoints:
+
+- chat:       interactive RAG chat (ChatOllama)
+- embeddings: OllamaEmbeddings for indexing and retrieval
+- analysis:   the worker's structured analysis (`ollama_client.ask_llm`)
+
+Pools may share endpoints. Inside a pool a request goes to the healthy endpoint
+that serves the pool's model and has the fewest outstanding requests. Pools
+are ordered by priority (OLLAMA_POOL_PRIORITY): on a shared endpoint a lower
+priority pool leaves OLLAMA_RESERVED_SLOTS slots free for every higher priority
+pool and steps back while a higher priority request is waiting, so chat does
+not queue behind a batch of analyses.
+
+A background thread polls /api/tags on every endpoint to track health and the
+models it has pulled. Connection failures mark an endpoint down right away and
+the request is retried on another endpoint of the pool.
+"""
+import asyncio
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+
+OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://ollama:11434")
+# comma separated, default for every pool
+OLLAMA_HOSTS = os.getenv("OLLAMA_HOSTS", OLLAMA_HOST)
+OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "embeddinggemma")
+
+# highest priority first
+OLLAMA_POOL_PRIORITY = os.getenv("OLLAMA_POOL_PRIORITY", "chat,embeddings,analysis")
+OLLAMA_MAX_OUTSTANDING = int(os.getenv("OLLAMA_MAX_OUTSTANDING", "4"))
+OLLAMA_RESERVED_SLOTS = int(os.getenv("OLLAMA_RESERVED_SLOTS", "1"))
+OLLAMA_HEALTH_INTERVAL = float(os.getenv("OLLAMA_HEALTH_INTERVAL", "15"))
+OLLAMA_HEALTH_TIMEOUT = float(os.getenv("OLLAMA_HEALTH_TIMEOUT", "3"))
+# how long a request waits for a free slot before giving up
+OLLAMA_QUEUE_TIMEOUT = float(os.getenv("OLLAMA_QUEUE_TIMEOUT", "600"))
+
+POOL_MODELS = {
+    "chat": OLLAMA_MODEL,
+    "embeddings": OLLAMA_EMBED_MODEL,
+    "analysis": OLLAMA_MODEL,
+}
+POOL_HOSTS_ENV = {
+    "chat": "OLLAMA_CHAT_HOSTS",
+    "embeddings": "OLLAMA_EMBED_HOSTS",
+    "analysis": "OLLAMA_ANALYSIS_HOSTS",
+}
+
+
+class NoEndpointAvailable(ConnectionError):
+    pass
+
+
+def _split_hosts(value: str) -> List[str]:
+    return [host.strip().rstrip("/") for host in value.split(",") if host.strip()]
+
+
+def _model_key(name: str) -> str:
+    return name if ":" in name else f"{name}:latest"
+
+
+class Endpoint:
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.healthy = True
+        self.models: Optional[set] = None  # unknown until the first health check
+        self.last_error: Optional[str] = None
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or _model_key(model) in self.models
+
+    def as_dict(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "models": sorted(self.models) if self.models is not None else None,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaRouter:
+    def __init__(self, pools: Dict[str, List[str]], priority: List[str]):
+        self.endpoints: Dict[str, Endpoint] = {}
+        self.pools: Dict[str, List[Endpoint]] = {}
+        for name, hosts in pools.items():
+            self.pools[name] = [self.endpoints.setdefault(url, Endpoint(url)) for url in hosts]
+        self.priority = {name: rank for rank, name in enumerate(priority)}
+        self.waiting: Dict[str, int] = {name: 0 for name in pools}
+        self._cond = threading.Condition()
+        self._health_thread: Optional[threading.Thread] = None
+
+    # -- health ------------------------------------------------------------
+
+    def check_endpoint(self, endpoint: Endpoint) -> None:
+        try:
+            r = requests.get(f"{endpoint.url}/api/tags", timeout=OLLAMA_HEALTH_TIMEOUT)
+            r.raise_for_status()
+            models = {_model_key(m["name"]) for m in r.json().get("models", [])}
+        except Exception as e:
+            with self._cond:
+                endpoint.healthy = False
+                endpoint.last_error = str(e)
+            return
+        with self._cond:
+            endpoint.healthy = True
+            endpoint.models = models
+            endpoint.last_error = None
+            self._cond.notify_all()
+
+    def check_all(self) -> None:
+        for endpoint in list(self.endpoints.values()):
+            self.check_endpoint(endpoint)
+
+    def _health_loop(self) -> None:
+        while True:
+            self.check_all()
+            time.sleep(OLLAMA_HEALTH_INTERVAL)
+
+    def start_health_checks(self) -> None:
+        with self._cond:
+            if self._health_thread is not None:
+                return
+            self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+        self._health_thread.start()
+
+    def mark_down(self, endpoint: Endpoint, error: Exception) -> None:
+        print(f"Ollama endpoint {endpoint.url} failed, taking it out of rotation: {error}")
+        with self._cond:
+            endpoint.healthy = False
+            endpoint.last_error = str(error)
+            self._cond.notify_all()
+
+    # -- slot accounting ---------------------------------------------------
+
+    def _limit(self, pool: str, endpoint: Endpoint) -> int:
+        """Slots `pool` may use on `endpoint`, after reserving some for higher priority pools."""
+        rank = self.priority.get(pool, len(self.priority))
+        above = [
+            name for name, endpoints in self.pools.items()
+            if self.priority.get(name, len(self.priority)) < rank and endpoint in endpoints
+        ]
+        if any(self.waiting[name] for name in above):
+            return 0
+        return max(OLLAMA_MAX_OUTSTANDING - OLLAMA_RESERVED_SLOTS * len(above), 1)
+
+    def _pick(self, pool: str, exclude=()) -> Optional[Endpoint]:
+        model = POOL_MODELS.get(pool, OLLAMA_MODEL)
+        candidates = [e for e in self.pools[pool] if e not in exclude and e.serves(model)]
+        healthy = [e for e in candidates if e.healthy]
+        # with every endpoint marked down, keep trying rather than failing outright
+        candidates = healthy or candidates
+        free = [e for e in candidates if e.outstanding < self._limit(pool, e)]
+        if not free:
+            return None
+        return min(free, key=lambda e: e.outstanding)
+
+    def try_acquire(self, pool: str, exclude=()) -> Optional[Endpoint]:
+        with self._cond:
+            endpoint = self._pick(pool, exclude)
+            if endpoint is not None:
+                endpoint.outstanding += 1
+            return endpoint
+
+    def acquire(self, pool: str, exclude=(), timeout: float = OLLAMA_QUEUE_TIMEOUT) -> Endpoint:
+        self.start_health_checks()
+        if not any(e not in exclude for e in self.pools[pool]):
+            raise NoEndpointAvailable(f"No Ollama endpoint left for the {pool} pool")
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.waiting[pool] += 1
+            try:
+                while True:
+                    endpoint = self._pick(pool, exclude)
+                    if endpoint is not None:
+                        endpoint.outstanding += 1
+                        return endpoint
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise NoEndpointAvailable(f"Timed out waiting for an Ollama endpoint in the {pool} pool")
+                    self._cond.wait(min(remaining, 1.0))
+            finally:
+                self.waiting[pool] -= 1
+                # lower priority pools may have been held back by this waiter
+                self._cond.notify_all()
+
+    async def acquire_async(self, pool: str, exclude=(), timeout: float = OLLAMA_QUEUE_TIMEOUT) -> Endpoint:
+        self.start_health_checks()
+        if not any(e not in exclude for e in self.pools[pool]):
+            raise NoEndpointAvailable(f"No Ollama endpoint left for the {pool} pool")
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self.waiting[pool] += 1
+        try:
+            while True:
+                with self._cond:
+                    endpoint = self._pick(pool, exclude)
+                    if endpoint is not None:
+                        endpoint.outstanding += 1
+                        return endpoint
+                if time.monotonic() >= deadline:
+                    raise NoEndpointAvailable(f"Timed out waiting for an Ollama endpoint in the {pool} pool")
+                await asyncio.sleep(0.05)
+        finally:
+            with self._cond:
+                self.waiting[pool] -= 1
+                self._cond.notify_all()
+
+    def release(self, endpoint: Endpoint) -> None:
+        with self._cond:
+            endpoint.outstanding -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def endpoint(self, pool: str, exclude=(), timeout: float = OLLAMA_QUEUE_TIMEOUT) -> Iterator[Endpoint]:
+        endpoint = self.acquire(pool, exclude, timeout)
+        try:
+            yield endpoint
+        finally:
+            self.release(endpoint)
+
+    def status(self) -> dict:
+        with self._cond:
+            return {
+                "endpoints": [e.as_dict() for e in self.endpoints.values()],
+                "pools": {name: [e.url for e in endpoints] for name, endpoints in self.pools.items()},
+                "waiting": dict(self.waiting),
+            }
+
+
+# ---------------------------------------------------------------------------
+# httpx transports, so the ollama client used by langchain_ollama is routed too
+# ---------------------------------------------------------------------------
+
+def _rewrite(request: httpx.Request, endpoint: Endpoint) -> None:
+    target = urlsplit(endpoint.url)
+    request.url = request.url.copy_with(scheme=target.scheme, host=target.hostname, port=target.port)
+    request.headers["host"] = target.netloc
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    # the slot stays taken until a streamed response has been read to the end
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _once(fn):
+    done = []
+
+    def wrapper():
+        if not done:
+            done.append(True)
+            fn()
+    return wrapper
+
+
+class RoutingTransport(httpx.BaseTransport):
+    def __init__(self, router: OllamaRouter, pool: str):
+        self.router = router
+        self.pool = pool
+        self._transport = httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        tried = []
+        while True:
+            endpoint = self.router.acquire(self.pool, exclude=tried)
+            _rewrite(request, endpoint)
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.ConnectError as e:
+                self.router.release(endpoint)
+                self.router.mark_down(endpoint, e)
+                tried.append(endpoint)
+                if len(tried) >= len(self.router.pools[self.pool]):
+                    raise
+                continue
+            except BaseException:
+                self.router.release(endpoint)
+                raise
+            release = _once(lambda: self.router.release(endpoint))
+            response.stream = _ReleasingStream(response.stream, release)
+            return response
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncRoutingTransport(httpx.AsyncBaseTransport):
+    def __init__(self, router: OllamaRouter, pool: str):
+        self.router = router
+        self.pool = pool
+        self._transport = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        tried = []
+        while True:
+            endpoint = await self.router.acquire_async(self.pool, exclude=tried)
+            _rewrite(request, endpoint)
+            try:
+                response = await self._transport.handle_async_request(request)
+            except httpx.ConnectError as e:
+                self.router.release(endpoint)
+                self.router.mark_down(endpoint, e)
+                tried.append(endpoint)
+                if len(tried) >= len(self.router.pools[self.pool]):
+                    raise
+                continue
+            except BaseException:
+                self.router.release(endpoint)
+                raise
+            release = _once(lambda: self.router.release(endpoint))
+            response.stream = _AsyncReleasingStream(response.stream, release)
+            return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def client_kwargs(pool: str) -> dict:
+    """Keyword arguments for ChatOllama / OllamaEmbeddings that route through `pool`."""
+    r = get_router()
+    return {
+        "base_url": r.pools[pool][0].url,
+        "sync_client_kwargs": {"transport": RoutingTransport(r, pool)},
+        "async_client_kwargs": {"transport": AsyncRoutingTransport(r, pool)},
+    }
+
+
+_router: Optional[OllamaRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_router() -> OllamaRouter:
+    global _router
+    with _router_lock:
+        if _router is None:
+            default = _split_hosts(OLLAMA_HOSTS)
+            pools = {
+                name: _split_hosts(os.getenv(env, "")) or default
+                for name, env in POOL_HOSTS_ENV.items()
+            }
+            priority = [name.strip() for name in OLLAMA_POOL_PRIORITY.split(",") if name.strip()]
+            _router = OllamaRouter(pools, priority)
+        return _router
@@ -0,0 +1,127 @@
+"""
+Process-local cache of the Region / School hierarchy.
+
+Regions and schools change rarely but are looked up on every upload, school
+listing and indexed document. The whole hierarchy is loaded with one query
+per table and kept as plain frozen dataclasses, so lookups are dictionary
+hits. The regions and schools routers invalidate it after every write; other
+processes (the worker, further uvicorn workers) pick such writes up after at
+most REFERENCE_CACHE_TTL seconds, or right away when they look up an id they
+do not know yet.
+"""
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlmodel import Session, select
+
+from .db import engine
+from .models import Region, School
+
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "60"))
+# unknown ids reload the cache at most this often, so made-up ids cannot hammer the database
+MISS_RELOAD_INTERVAL = 1.0
+
+
+@dataclass(frozen=True)
+class RegionInfo:
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class SchoolInfo:
+    id: int
+    name: str
+    region_id: int
+    region_name: Optional[str]
+
+
+@dataclass(frozen=True)
+class Hierarchy:
+    regions: Dict[int, RegionInfo]
+    schools: Dict[int, SchoolInfo]
+    loaded_at: float
+
+
+class ReferenceCache:
+    def __init__(self, engine):
+        self.engine = engine
+        self._data: Optional[Hierarchy] = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _load(self) -> Hierarchy:
+        with Session(self.engine) as session:
+            regions = {
+                region_id: RegionInfo(region_id, name)
+                for region_id, name in session.exec(select(Region.id, Region.name).order_by(Region.id))
+            }
+            rows = session.exec(select(School.id, School.name, School.region_id).order_by(School.id)).all()
+        schools = {
+            school_id: SchoolInfo(
+                school_id, name, region_id, regions[region_id].name if region_id in regions else None
+            )
+            for school_id, name, region_id in rows
+        }
+        return Hierarchy(regions, schools, time.monotonic())
+
+    def _reload(self, stale: Optional[Hierarchy]) -> Hierarchy:
+        with self._lock:
+            if self._data is not stale and self._data is not None:
+                # somebody else reloaded while we waited for the lock
+                return self._data
+            generation = self._generation
+            data = self._load()
+            # a write that invalidated the cache during the load may be missing from it
+            if generation == self._generation:
+                self._data = data
+            return data
+
+    def get(self) -> Hierarchy:
+        data = self._data
+        if data is None or time.monotonic() - data.loaded_at > REFERENCE_CACHE_TTL:
+            data = self._reload(data)
+        return data
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._data = None
+
+    def _get_fresh_on_miss(self, contains) -> Hierarchy:
+        data = self.get()
+        if not contains(data) and time.monotonic() - data.loaded_at > MISS_RELOAD_INTERVAL:
+            data = self._reload(data)
+        return data
+
+    def region(self, region_id: Optional[int]) -> Optional[RegionInfo]:
+        if region_id is None:
+            return None
+        return self._get_fresh_on_miss(lambda data: region_id in data.regions).regions.get(region_id)
+
+    def school(self, school_id: Optional[int]) -> Optional[SchoolInfo]:
+        if school_id is None:
+            return None
+        return self._get_fresh_on_miss(lambda data: school_id in data.schools).schools.get(school_id)
+
+    def missing_schools(self, school_ids) -> List[int]:
+        wanted = {school_id for school_id in school_ids if school_id is not None}
+        if not wanted:
+            return []
+        data = self._get_fresh_on_miss(lambda data: wanted <= data.schools.keys())
+        return sorted(wanted - data.schools.keys())
+
+    def regions(self) -> List[RegionInfo]:
+        return list(self.get().regions.values())
+
+    def schools(self, region_id: Optional[int] = None) -> List[SchoolInfo]:
+        schools = self.get().schools.values()
+        if region_id is not None:
+            return [school for school in schools if school.region_id == region_id]
+        return list(schools)
+
+
+reference_cache = ReferenceCache(engine)
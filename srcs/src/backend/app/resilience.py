@@ -0,0 +1,232 @@
+"""
+Failure handling for the worker's calls to Whisper, the LLM and the index.
+
+- Every dependency has a circuit breaker. After BREAKER_FAILURES consecutive
+  transient failures it opens for BREAKER_RESET_SECONDS; files that need it
+  are left in the queue instead of each waiting for its own timeout. Then a
+  single trial call decides whether it closes again.
+- Transient failures (connection errors, timeouts, 5xx / 429, open breakers,
+  a locked SQLite database) are retried with jittered exponential backoff,
+  first a few times inside the stage, then by parking the file and picking
+  it up again later.
+- Each file gets a Deadline covering all its stages; stage timeouts are cut
+  down to the time that is left.
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, TypeVar
+
+import requests
+from sqlalchemy import exc as sa_exc
+
+from .metrics import DEPENDENCY_FAILURES
+
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "60"))
+
+# quick retries inside a stage
+STAGE_RETRIES = int(os.getenv("STAGE_RETRIES", "2"))
+STAGE_RETRY_BASE_SECONDS = float(os.getenv("STAGE_RETRY_BASE_SECONDS", "1"))
+STAGE_RETRY_MAX_SECONDS = float(os.getenv("STAGE_RETRY_MAX_SECONDS", "15"))
+
+# retries of a whole file after it was parked
+MAX_FILE_ATTEMPTS = int(os.getenv("MAX_FILE_ATTEMPTS", "6"))
+PARK_BASE_SECONDS = float(os.getenv("PARK_BASE_SECONDS", "60"))
+PARK_MAX_SECONDS = float(os.getenv("PARK_MAX_SECONDS", "3600"))
+
+T = TypeVar("T")
+
+# SQLite's answers to a write that did not get the lock within busy_timeout
+SQLITE_BUSY_MESSAGES = ("database is locked", "database table is locked", "database is busy")
+
+
+class TransientError(RuntimeError):
+    """A failure that is expected to go away when retried later."""
+
+
+class CircuitOpenError(TransientError):
+    def __init__(self, name: str, retry_at: float):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+        self.retry_at = retry_at
+
+
+class DeadlineExceeded(TransientError):
+    pass
+
+
+def is_database_lock(error: BaseException) -> bool:
+    """Our own SQLite database was locked, which says nothing about the dependency being called."""
+    # a retry on a session whose flush hit the lock raises PendingRollbackError,
+    # whose message quotes the original error
+    if isinstance(error, (sa_exc.OperationalError, sa_exc.PendingRollbackError, sqlite3.OperationalError)):
+        return any(message in str(error) for message in SQLITE_BUSY_MESSAGES)
+    return False
+
+
+def is_transient(error: BaseException) -> bool:
+    if isinstance(error, TransientError):
+        return True
+    if isinstance(error, (requests.ConnectionError, requests.Timeout, TimeoutError, ConnectionError)):
+        return True
+    if is_database_lock(error):
+        return True
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    # httpx is what the ollama and chroma clients use underneath
+    try:
+        import httpx
+    except ImportError:
+        return False
+    if isinstance(error, (httpx.TransportError, httpx.TimeoutException)):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    # the ollama client wraps HTTP errors in its own ResponseError
+    status_code = getattr(error, "status_code", None)
+    return isinstance(status_code, int) and (status_code >= 500 or status_code == 429)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failures: int = BREAKER_FAILURES, reset_seconds: float = BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failures
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at < self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def retry_at(self) -> float:
+        """Monotonic time at which a trial call will be let through."""
+        return (self.opened_at or 0) + self.reset_seconds
+
+    def available(self) -> bool:
+        """Whether a call would currently be allowed, without claiming the trial call."""
+        state = self.state
+        return state == "closed" or (state == "half_open" and not self._trial_running)
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.opened_at is not None:
+                print(f"Circuit for {self.name} closed again")
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self._trial_running or (self.opened_at is None and self.failures >= self.failure_threshold):
+                print(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.opened_at = time.monotonic()
+            self._trial_running = False
+
+    def release_trial(self) -> None:
+        # the trial call ended without telling anything about the dependency
+        with self._lock:
+            self._trial_running = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    if name not in _breakers:
+        _breakers[name] = CircuitBreaker(name)
+    return _breakers[name]
+
+
+class Deadline:
+    """Time budget of one file across all its stages."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def check(self, stage: str) -> None:
+        if self.remaining() <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before {stage}")
+
+    def timeout(self, cap: float, stage: str) -> float:
+        """Timeout for the next call: the stage's own cap, or less if the budget is nearly used up."""
+        self.check(stage)
+        return min(cap, self.remaining())
+
+
+def call_dependency(name: str, deadline: Deadline, fn: Callable[[], T]) -> T:
+    """
+    Call `fn` through the circuit breaker of dependency `name`, retrying
+    transient failures with jittered backoff while the deadline allows.
+    A locked database is raised right away: the session needs a rollback
+    before it can do anything, which is up to the worker.
+    """
+    breaker = get_breaker(name)
+    attempt = 0
+    while True:
+        deadline.check(name)
+        if not breaker.allow():
+            raise CircuitOpenError(name, breaker.retry_at())
+        try:
+            result = fn()
+        except Exception as e:
+            if not is_transient(e) or is_database_lock(e):
+                breaker.release_trial()
+                raise
+            if deadline.remaining() <= 0:
+                # the call timed out on the file's budget, not on the dependency's own timeout
+                breaker.release_trial()
+                raise DeadlineExceeded(f"Deadline exceeded during {name}") from e
+            breaker.record_failure()
+            DEPENDENCY_FAILURES.labels(name).inc()
+            if attempt >= STAGE_RETRIES:
+                raise
+            delay = backoff_delay(attempt, STAGE_RETRY_BASE_SECONDS, STAGE_RETRY_MAX_SECONDS)
+            if delay >= deadline.remaining():
+                raise
+            print(f"{name} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+def park_until(attempts: int, error: BaseException) -> datetime:
+    """When a parked file should be picked up again."""
+    # equal jitter: spread the files out, but do not come back right away
+    ceiling = min(PARK_MAX_SECONDS, PARK_BASE_SECONDS * (2 ** attempts))
+    delay = random.uniform(ceiling / 2, ceiling)
+    if isinstance(error, CircuitOpenError):
+        # no point in coming back before the breaker lets a trial call through
+        delay = max(delay, error.retry_at - time.monotonic())
+    return datetime.utcnow() + timedelta(seconds=max(delay, 1))
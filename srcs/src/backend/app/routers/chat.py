@@ -1,4 +1,8 @@
+import os
+import threading
+import time
 from dataclasses import asdict
+from typing import Optional
 
 import anyio
 from fastapi import APIRouter
@@ -6,14 +10,84 @@ from starlette.websockets import WebSocketDisconnect
 
 from fastapi import WebSocket
 
-from ..chat.RAG import RAG
-
 router = APIRouter(
     prefix="/chat",
     tags=["chat"]
 )
 
-rag = RAG()
+# start connecting to the vector store and Ollama in the background at startup
+CHAT_EAGER_INIT = os.getenv("CHAT_EAGER_INIT", "true").lower() in ("1", "true", "yes")
+# after a failed initialization, chat requests wait this long before trying again
+CHAT_INIT_RETRY_SECONDS = float(os.getenv("CHAT_INIT_RETRY_SECONDS", "10"))
+
+
+class ChatUnavailable(RuntimeError):
+    pass
+
+
+class LazyRAG:
+    """
+    The RAG pipeline, created on first use. Importing it pulls in langchain,
+    langgraph and the vector store client, and creating it connects to the
+    vector store, so neither happens when the API starts.
+    """
+
+    def __init__(self):
+        self._rag = None
+        self._lock = threading.Lock()
+        self.error: Optional[str] = None
+        self.failed_at = 0.0
+        self.initializing = False
+
+    @property
+    def state(self) -> str:
+        if self._rag is not None:
+            return "ready"
+        if self.initializing or self.error is None:
+            return "starting"
+        return "unavailable"
+
+    def get(self):
+        if self._rag is not None:
+            return self._rag
+        with self._lock:
+            if self._rag is not None:
+                return self._rag
+            if self.error is not None and time.monotonic() - self.failed_at < CHAT_INIT_RETRY_SECONDS:
+                raise ChatUnavailable(self.error)
+
+            self.initializing = True
+            try:
+                from ..chat.RAG import RAG
+                self._rag = RAG()
+                self.error = None
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                self.failed_at = time.monotonic()
+                print(f"Chat initialization failed: {self.error}")
+                raise ChatUnavailable(self.error) from e
+            finally:
+                self.initializing = False
+            return self._rag
+
+    def warm_up(self) -> None:
+        """Initialize in a background thread; failures are retried on the next chat request."""
+        def run():
+            try:
+                self.get()
+            except ChatUnavailable:
+                pass
+
+        threading.Thread(target=run, name="rag-init", daemon=True).start()
+
+
+rag = LazyRAG()
+
+
+@router.on_event("startup")
+def start_rag():
+    if CHAT_EAGER_INIT:
+        rag.warm_up()
 
 
 @router.websocket("/")
@@ -26,8 +100,16 @@ async def websocket_endpoint(websocket: WebSocket):
             query = data.strip()
             print("Answering query", query)
 
+            try:
+                pipeline = await anyio.to_thread.run_sync(rag.get)
+            except ChatUnavailable as e:
+                await websocket.send_json({"event": "error", "detail": f"Chat is not available: {e}"})
+                # 1013: try again later
+                await websocket.close(code=1013)
+                return
+
             # Run inference and stream result
-            async for chunk in rag.inference(query):
+            async for chunk in pipeline.inference(query):
                 print("Sending chunk", chunk)
                 await websocket.send_json(asdict(chunk))
 
@@ -35,4 +117,4 @@ async def websocket_endpoint(websocket: WebSocket):
             await websocket.send_json({"event": "done"})
 
     except WebSocketDisconnect:
-        pass
\ No newline at end of file
+        pass
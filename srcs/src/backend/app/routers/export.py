@@ -0,0 +1,258 @@
+import csv
+import io
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, or_
+from sqlmodel import Session, select
+
+from ..analysis import BASIC_STATS_KEYS, STRUCTURED_FIELD_TYPES
+from ..db import SQLITE_BUSY_TIMEOUT_MS, engine
+from ..models import FileContent, FileMeta, Region, School
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_CHUNK_SIZE = 10000
+
+BASE_COLUMNS = [
+    ("id", FileMeta.id),
+    ("filename", FileMeta.filename),
+    ("school_id", FileMeta.school_id),
+    ("school_name", School.name),
+    ("region_id", School.region_id),
+    ("region_name", Region.name),
+    ("uploaded_at", FileMeta.uploaded_at),
+    ("analysis_status", FileMeta.analysis_status),
+    ("analysis_finished_at", FileMeta.analysis_finished_at),
+    ("analysis_type", FileMeta.analysis_type),
+    ("analysis_summary_text", FileMeta.analysis_summary_text),
+]
+STRUCTURED_FIELDS = list(STRUCTURED_FIELD_TYPES.keys())
+STATS_COLUMNS = [f"stats_{key}" for key in BASIC_STATS_KEYS]
+COLUMNS = [name for name, _ in BASE_COLUMNS] + STRUCTURED_FIELDS + STATS_COLUMNS
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+LIST_SEPARATOR = "; "
+
+# The worker stamps analysis_finished_at before it commits, and the commit can wait
+# for the SQLite write lock (flush, then commit). An export stops this far in the
+# past, so every file stamped before its upper bound is committed and visible.
+EXPORT_SETTLE_SECONDS = float(os.getenv("EXPORT_SETTLE_SECONDS", str(2 * SQLITE_BUSY_TIMEOUT_MS / 1000 + 60)))
+
+
+def _iter_chunks(
+    since: Optional[datetime],
+    until: datetime,
+    status: str,
+    school_id: Optional[int],
+    analysis_type: Optional[str],
+    chunk_size: int,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Keyset-paginated reads ordered by (analysis_finished_at, id). Every chunk
+    runs in its own short read transaction, so a long export neither holds a
+    snapshot open for its whole duration (SQLite WAL checkpoints keep working)
+    nor keeps more than one chunk in memory. Within a chunk rows are fetched
+    with stream_results, which is a server-side cursor on Postgres.
+    """
+    statement = (
+        select(*(column for _, column in BASE_COLUMNS), *(getattr(FileMeta, f) for f in STRUCTURED_FIELDS),
+               FileContent.basic_stats)
+        .outerjoin(School, School.id == FileMeta.school_id)
+        .outerjoin(Region, Region.id == School.region_id)
+        .outerjoin(FileContent, FileContent.file_id == FileMeta.id)
+        .where(FileMeta.analysis_status == status, FileMeta.analysis_finished_at < until)
+        .order_by(FileMeta.analysis_finished_at, FileMeta.id)
+    )
+    if since is not None:
+        statement = statement.where(FileMeta.analysis_finished_at >= since)
+    if school_id is not None:
+        statement = statement.where(FileMeta.school_id == school_id)
+    if analysis_type is not None:
+        statement = statement.where(FileMeta.analysis_type == analysis_type)
+
+    base_names = [name for name, _ in BASE_COLUMNS]
+    last = None
+    while True:
+        page = statement
+        if last is not None:
+            last_finished, last_id = last
+            page = page.where(or_(
+                FileMeta.analysis_finished_at > last_finished,
+                and_(FileMeta.analysis_finished_at == last_finished, FileMeta.id > last_id),
+            ))
+        page = page.limit(chunk_size).execution_options(stream_results=True, yield_per=chunk_size)
+
+        rows = []
+        with Session(engine) as session:
+            for row in session.exec(page):
+                record = dict(zip(base_names, row[:len(base_names)]))
+                record.update(zip(STRUCTURED_FIELDS, row[len(base_names):-1]))
+                stats = row[-1] or {}
+                for key, column in zip(BASIC_STATS_KEYS, STATS_COLUMNS):
+                    record[column] = stats.get(key)
+                rows.append(record)
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last = (rows[-1]["analysis_finished_at"], rows[-1]["id"])
+
+
+def _csv_value(value: Any) -> Any:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return LIST_SEPARATOR.join(str(item) for item in value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _stream_csv(chunks: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so that Excel opens the Czech text as UTF-8
+    yield "\ufeff".encode("utf-8")
+    writer.writerow(COLUMNS)
+    for rows in chunks:
+        for record in rows:
+            writer.writerow([_csv_value(record[column]) for column in COLUMNS])
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+def _stream_ndjson(chunks: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps(record, ensure_ascii=False, default=str) + "\n" for record in rows
+        ).encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that collects what the Parquet writer produces until it is drained."""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _parquet_schema():
+    import pyarrow as pa
+
+    types = {
+        "id": pa.int64(),
+        "school_id": pa.int64(),
+        "region_id": pa.int64(),
+        "uploaded_at": pa.timestamp("us"),
+        "analysis_finished_at": pa.timestamp("us"),
+        "stats_word_count": pa.int64(),
+        "stats_sentence_count": pa.int64(),
+        "stats_avg_words_per_sentence": pa.float64(),
+        "stats_char_count": pa.int64(),
+    }
+    for field, field_type in STRUCTURED_FIELD_TYPES.items():
+        types[field] = pa.list_(pa.string()) if field_type == "list" else pa.string()
+    return pa.schema([(column, types.get(column, pa.string())) for column in COLUMNS])
+
+
+def _parquet_value(value: Any) -> Any:
+    if isinstance(value, list):
+        return [str(item) for item in value]
+    return value
+
+
+def _stream_parquet(chunks: Iterator[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema()
+    sink = _ChunkSink()
+    # one row group per chunk, flushed to the client as soon as it is written
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        for rows in chunks:
+            columns = {
+                column: [_parquet_value(record[column]) for record in rows]
+                for column in COLUMNS
+            }
+            writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+@router.get("/files")
+def export_files(
+    format: str = Query(default="csv", pattern="^(csv|ndjson|parquet)$"),
+    since: Optional[datetime] = Query(
+        default=None, description="only files whose analysis finished at or after this time"
+    ),
+    status: str = Query(default="done"),
+    school_id: Optional[int] = Query(default=None),
+    analysis_type: Optional[str] = Query(default=None),
+    chunk_size: int = Query(default=DEFAULT_CHUNK_SIZE, ge=1, le=MAX_CHUNK_SIZE),
+):
+    """
+    Stream the flattened structured fields and basic_stats of all analyzed
+    files. For incremental exports pass the X-Export-Until header of the
+    previous export as `since`: every file is exported exactly once, as long
+    as the worker commits a file within EXPORT_SETTLE_SECONDS of finishing it.
+    Files finished in the last EXPORT_SETTLE_SECONDS go into the next export.
+    """
+    if format == "parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Parquet export needs pyarrow installed")
+
+    # timestamps are stored as naive UTC
+    if since is not None and since.tzinfo is not None:
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    # fixed upper bound, so files finishing during the export go into the next one
+    until = datetime.utcnow() - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+    chunks = _iter_chunks(since, until, status, school_id, analysis_type, chunk_size)
+    body = {"csv": _stream_csv, "ndjson": _stream_ndjson, "parquet": _stream_parquet}[format](chunks)
+
+    filename = f"files-{until:%Y%m%dT%H%M%S}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Export-Until": until.isoformat(),
+        },
+    )
@@ -1,12 +1,33 @@
+from datetime import datetime
 from typing import Optional, List
-from fastapi import APIRouter, Depends, HTTPException
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlalchemy import func
 from sqlmodel import Session, select, SQLModel
 from ..db import get_session
-from ..models import FileMeta, School
-from ..chat.RAG import RAG
+from ..models import FileMeta, FileContent, FileFacet
+from ..analysis import FACET_FIELDS
+from ..archives import ArchiveError, ingest_archive, remove_stored
+from ..http_cache import etag_response
+from ..reference import reference_cache
+from ..scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, PRIORITY_UPLOAD, set_cost_estimate
+from ..stats import apply_rollup
 
 router = APIRouter(prefix="/files", tags=["files"])
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Large text / JSON columns live in FileContent and are only returned when explicitly requested
+CONTENT_FIELDS = [name for name in FileContent.model_fields.keys() if name != "file_id"]
+LIGHT_FIELDS = list(FileMeta.model_fields.keys())
+ALL_FIELDS = LIGHT_FIELDS + CONTENT_FIELDS
+
+
+def _column(name: str):
+    model = FileContent if name in CONTENT_FIELDS else FileMeta
+    return getattr(model, name)
+
 
 class FileMetaCreate(SQLModel):
     tus_id: str
@@ -14,36 +35,310 @@ class FileMetaCreate(SQLModel):
     school_id: Optional[int] = None
 
 
+class FileMetaBulkCreate(SQLModel):
+    files: List[FileMetaCreate]
+    # used for entries without their own school_id
+    school_id: Optional[int] = None
+
+
+class BulkResult(SQLModel):
+    created: int
+    ids: List[int]
+    # tus ids that were already registered, or archive members that were left out
+    skipped: List[str] = []
+
+
+class BulkRetry(SQLModel):
+    status: str = "failed"
+    school_id: Optional[int] = None
+    ids: Optional[List[int]] = None
+
+
+class ArchiveIngest(SQLModel):
+    tus_id: str
+    school_id: Optional[int] = None
+
+
+def _check_schools(school_ids) -> None:
+    missing = reference_cache.missing_schools(school_ids)
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"School does not exist: {', '.join(str(school_id) for school_id in missing)}",
+        )
+
+
+def _new_file(tus_id: str, filename: str, school_id: Optional[int], priority: int) -> FileMeta:
+    file_meta = FileMeta(tus_id=tus_id, filename=filename, school_id=school_id, queue_priority=priority)
+    set_cost_estimate(file_meta)
+    return file_meta
+
+
 @router.post("", response_model=FileMeta)
 def create_file(
     payload: FileMetaCreate,
     session: Session = Depends(get_session),
 ):
-    if payload.school_id is not None:
-        school = session.get(School, payload.school_id)
-        if not school:
-            raise HTTPException(status_code=400, detail="School does not exist")
-
-    file_meta = FileMeta(
-        tus_id=payload.tus_id,
-        filename=payload.filename,
-        school_id=payload.school_id,
-    )
+    _check_schools([payload.school_id])
+
+    file_meta = _new_file(payload.tus_id, payload.filename, payload.school_id, PRIORITY_UPLOAD)
     session.add(file_meta)
     session.commit()
     session.refresh(file_meta)
 
-    school = session.get(School, payload.school_id)
+    # text extraction and vector indexing happen once, in the worker
+    return file_meta
 
-    rag = RAG()
-    rag.add_document(f"/data/uploads/{payload.tus_id}", payload.filename, school, file_meta.uploaded_at)
 
-    return file_meta
+@router.post("/bulk", response_model=BulkResult)
+def create_files_bulk(
+    payload: FileMetaBulkCreate,
+    session: Session = Depends(get_session),
+):
+    """
+    Register many tusd uploads in one transaction. Uploads that are already
+    registered are skipped, so a failed batch can simply be sent again.
+    """
+    entries = [
+        (entry.tus_id, entry.filename, entry.school_id if entry.school_id is not None else payload.school_id)
+        for entry in payload.files
+    ]
+    _check_schools([school_id for _, _, school_id in entries])
+
+    tus_ids = [tus_id for tus_id, _, _ in entries]
+    existing = set()
+    for start in range(0, len(tus_ids), 500):
+        existing.update(session.exec(
+            select(FileMeta.tus_id).where(FileMeta.tus_id.in_(tus_ids[start:start + 500]))
+        ).all())
 
+    new_files = []
+    skipped = []
+    for tus_id, filename, school_id in entries:
+        if tus_id in existing:
+            skipped.append(tus_id)
+            continue
+        existing.add(tus_id)
+        new_files.append(_new_file(tus_id, filename, school_id, PRIORITY_BULK))
 
-@router.get("", response_model=List[FileMeta])
-def list_files(session: Session = Depends(get_session)):
-    return session.exec(select(FileMeta)).all()
+    session.add_all(new_files)
+    session.flush()
+    # read the ids before commit() expires the objects, instead of reloading them one by one
+    ids = [f.id for f in new_files]
+    session.commit()
+    return BulkResult(created=len(ids), ids=ids, skipped=skipped)
+
+
+@router.post("/archive", response_model=BulkResult)
+def ingest_archive_upload(
+    payload: ArchiveIngest,
+    session: Session = Depends(get_session),
+):
+    """
+    Unpack a ZIP or TAR archive uploaded through tusd member by member into
+    separate uploads and queue each one for analysis.
+    """
+    _check_schools([payload.school_id])
+    try:
+        result = ingest_archive(payload.tus_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except ArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    new_files = [
+        _new_file(member.tus_id, member.filename, payload.school_id, PRIORITY_BULK)
+        for member in result.stored
+    ]
+    session.add_all(new_files)
+    try:
+        session.flush()
+        ids = [f.id for f in new_files]
+        session.commit()
+    except Exception:
+        remove_stored(result.stored)
+        raise
+    return BulkResult(created=len(ids), ids=ids, skipped=result.skipped)
+
+
+def _resolve_fields(view: str, fields: Optional[str]) -> List[str]:
+    if fields:
+        requested = [name.strip() for name in fields.split(",") if name.strip()]
+        unknown = [name for name in requested if name not in ALL_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        # id is the pagination cursor, so it is always part of the projection
+        if "id" not in requested:
+            requested.insert(0, "id")
+        return requested
+
+    if view == "full":
+        return ALL_FIELDS
+    if view == "light":
+        return LIGHT_FIELDS
+    raise HTTPException(status_code=400, detail="view must be 'light' or 'full'")
+
+
+def _parse_facets(facets: Optional[List[str]]) -> List[tuple[str, str]]:
+    parsed = []
+    for raw in facets or []:
+        field, sep, value = raw.partition(":")
+        if not sep or field not in FACET_FIELDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"facet must be '<field>:<value>' with field one of: {', '.join(FACET_FIELDS)}",
+            )
+        parsed.append((field, value))
+    return parsed
+
+
+@router.get("")
+def list_files(
+    request: Request,
+    limit: int = Query(default=DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[int] = Query(default=None, description="id of the last file of the previous page"),
+    order: str = Query(default="asc", pattern="^(asc|desc)$"),
+    view: str = Query(default="light"),
+    fields: Optional[str] = Query(default=None, description="comma separated list of columns"),
+    status: Optional[str] = Query(default=None),
+    school_id: Optional[int] = Query(default=None),
+    region_id: Optional[int] = Query(default=None),
+    analysis_type: Optional[str] = Query(default=None),
+    uploaded_from: Optional[datetime] = Query(default=None),
+    uploaded_to: Optional[datetime] = Query(default=None),
+    facet: Optional[List[str]] = Query(default=None, description="field:value, repeat to combine"),
+    session: Session = Depends(get_session),
+):
+    """
+    List file metadata one page at a time.
+
+    Pages are keyset-paginated on id: pass the `X-Next-Cursor` response header
+    back as `cursor` to fetch the next page. The default "light" view leaves out
+    the large text blobs; use `view=full` or `fields=` to get them.
+    """
+    columns = _resolve_fields(view, fields)
+
+    statement = select(*[_column(name) for name in columns]).select_from(FileMeta)
+    if any(name in CONTENT_FIELDS for name in columns):
+        statement = statement.outerjoin(FileContent, FileContent.file_id == FileMeta.id)
+    if status is not None:
+        statement = statement.where(FileMeta.analysis_status == status)
+    if school_id is not None:
+        statement = statement.where(FileMeta.school_id == school_id)
+    if region_id is not None:
+        region_schools = [school.id for school in reference_cache.schools(region_id)]
+        statement = statement.where(FileMeta.school_id.in_(region_schools))
+    if analysis_type is not None:
+        statement = statement.where(FileMeta.analysis_type == analysis_type)
+    if uploaded_from is not None:
+        statement = statement.where(FileMeta.uploaded_at >= uploaded_from)
+    if uploaded_to is not None:
+        statement = statement.where(FileMeta.uploaded_at < uploaded_to)
+    for field, value in _parse_facets(facet):
+        statement = statement.where(
+            FileMeta.id.in_(
+                select(FileFacet.file_id).where(FileFacet.field == field, FileFacet.value == value)
+            )
+        )
+
+    if order == "desc":
+        if cursor is not None:
+            statement = statement.where(FileMeta.id < cursor)
+        statement = statement.order_by(FileMeta.id.desc())
+    else:
+        if cursor is not None:
+            statement = statement.where(FileMeta.id > cursor)
+        statement = statement.order_by(FileMeta.id)
+
+    # fetch one extra row to know whether another page exists
+    rows = session.exec(statement.limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    items = [dict(zip(columns, row)) for row in rows[:limit]]
+
+    headers = {}
+    if has_more:
+        next_cursor = str(items[-1]["id"])
+        headers["X-Next-Cursor"] = next_cursor
+        next_url = request.url.include_query_params(cursor=next_cursor)
+        headers["Link"] = f'<{next_url}>; rel="next"'
+
+    return etag_response(request, items, headers)
+
+
+@router.get("/facets")
+def list_facets(
+    field: Optional[str] = Query(default=None),
+    school_id: Optional[int] = Query(default=None),
+    analysis_type: Optional[str] = Query(default=None),
+    session: Session = Depends(get_session),
+):
+    """
+    Count analyzed files per value of the list-valued structured fields.
+    Facets of files that are still queued, parked or failed are left out.
+    """
+    if field is not None and field not in FACET_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of: {', '.join(FACET_FIELDS)}")
+
+    file_count = func.count(FileFacet.file_id)
+    statement = (
+        select(FileFacet.field, FileFacet.value, file_count)
+        .join(FileMeta, FileMeta.id == FileFacet.file_id)
+        .where(FileMeta.analysis_status == "done")
+    )
+    if field is not None:
+        statement = statement.where(FileFacet.field == field)
+    if school_id is not None:
+        statement = statement.where(FileMeta.school_id == school_id)
+    if analysis_type is not None:
+        statement = statement.where(FileMeta.analysis_type == analysis_type)
+
+    statement = statement.group_by(FileFacet.field, FileFacet.value).order_by(
+        FileFacet.field, file_count.desc(), FileFacet.value
+    )
+    return [
+        {"field": row_field, "value": value, "count": count}
+        for row_field, value, count in session.exec(statement).all()
+    ]
+
+
+def _reset_for_retry(file_meta: FileMeta, priority: int) -> None:
+    file_meta.analysis_status = "pending"
+    file_meta.analysis_error = None
+    file_meta.analysis_started_at = None
+    file_meta.analysis_finished_at = None
+    file_meta.analysis_attempts = 0
+    # due right away; also where its queue wait time is measured from
+    file_meta.analysis_retry_at = datetime.utcnow()
+    file_meta.queue_priority = priority
+    if file_meta.cost_estimate is None:
+        # registered before costs were estimated; the scheduler only claims estimated files
+        set_cost_estimate(file_meta)
+
+
+@router.post("/retry", response_model=BulkResult)
+def retry_files(
+    payload: BulkRetry,
+    session: Session = Depends(get_session),
+):
+    """Queue every file matching the filter again, behind interactive work."""
+    if payload.status == "processing":
+        raise HTTPException(status_code=400, detail="Files that are being processed cannot be retried")
+
+    statement = select(FileMeta).where(FileMeta.analysis_status == payload.status)
+    if payload.school_id is not None:
+        statement = statement.where(FileMeta.school_id == payload.school_id)
+    if payload.ids is not None:
+        statement = statement.where(FileMeta.id.in_(payload.ids))
+
+    ids = []
+    for file_meta in session.exec(statement).all():
+        apply_rollup(session, file_meta, -1)
+        _reset_for_retry(file_meta, PRIORITY_BULK)
+        session.add(file_meta)
+        ids.append(file_meta.id)
+
+    session.commit()
+    return BulkResult(created=0, ids=ids)
 
 
 @router.post("/{file_id}/retry", response_model=FileMeta)
@@ -55,18 +350,37 @@ def retry_file(
     if not file_meta:
         raise HTTPException(status_code=404, detail="File not found")
 
-    # Reset analysis metadata
-    file_meta.analysis_status = "pending"
-    file_meta.analysis_error = None
-    file_meta.analysis_started_at = None
-    file_meta.analysis_finished_at = None
+    # take the old result out of the dashboard rollups before it is re-analyzed
+    apply_rollup(session, file_meta, -1)
+
+    # Reset analysis metadata; someone is waiting for this one, so it runs ahead of uploads and backfills
+    _reset_for_retry(file_meta, PRIORITY_INTERACTIVE)
 
     # Optional: clear transcript & llm summary if you want to re-generate everything
-    # file_meta.transcript_text = None
-    # file_meta.llm_summary = None
+    # file_meta.get_content().transcript_text = None
+    # file_meta.get_content().llm_summary = None
 
     session.add(file_meta)
     session.commit()
     session.refresh(file_meta)
 
     return file_meta
+
+
+@router.get("/{file_id}")
+def get_file(
+    request: Request,
+    file_id: int,
+    view: str = Query(default="full"),
+    fields: Optional[str] = Query(default=None, description="comma separated list of columns"),
+    session: Session = Depends(get_session),
+):
+    """One file with its text and JSON blobs, for detail views that open a single row."""
+    columns = _resolve_fields(view, fields)
+    statement = select(*[_column(name) for name in columns]).select_from(FileMeta).where(FileMeta.id == file_id)
+    if any(name in CONTENT_FIELDS for name in columns):
+        statement = statement.outerjoin(FileContent, FileContent.file_id == FileMeta.id)
+    row = session.exec(statement).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    return etag_response(request, dict(zip(columns, row)))
@@ -1,10 +1,12 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlmodel import Session, select
 
 from ..db import get_session
-from ..models import Region
+from ..http_cache import etag_response
+from ..models import Region, School
+from ..reference import reference_cache
 
 router = APIRouter(prefix="/regions", tags=["regions"])
 
@@ -13,18 +15,19 @@ router = APIRouter(prefix="/regions", tags=["regions"])
 def create_region(region: Region, session: Session = Depends(get_session)):
     session.add(region)
     session.commit()
+    reference_cache.invalidate()
     session.refresh(region)
     return region
 
 
 @router.get("", response_model=List[Region])
-def list_regions(session: Session = Depends(get_session)):
-    return session.exec(select(Region)).all()
+def list_regions(request: Request):
+    return etag_response(request, reference_cache.regions())
 
 
 @router.get("/{region_id}", response_model=Region)
-def get_region(region_id: int, session: Session = Depends(get_session)):
-    region = session.get(Region, region_id)
+def get_region(region_id: int):
+    region = reference_cache.region(region_id)
     if not region:
         raise HTTPException(status_code=404, detail="Region not found")
     return region
@@ -39,23 +42,23 @@ def update_region(region_id: int, data: Region, session: Session = Depends(get_s
     region.name = data.name
     session.add(region)
     session.commit()
+    reference_cache.invalidate()
     session.refresh(region)
     return region
 
 
 @router.delete("/{region_id}")
 def delete_region(region_id: int, session: Session = Depends(get_session)):
-    from ..models import School  # avoid circular import
-
     region = session.get(Region, region_id)
     if not region:
         raise HTTPException(status_code=404, detail="Region not found")
 
-    # prevent deleting region if schools exist (simpler for now)
+    # prevent deleting region if schools exist (simpler for now);
+    # checked in the database, the cache may not know schools added by another process yet
     has_schools = session.exec(
-        select(School).where(School.region_id == region_id)
+        select(School.id).where(School.region_id == region_id)
     ).first()
-    if has_schools:
+    if has_schools is not None:
         raise HTTPException(
             status_code=400,
             detail="Cannot delete region with schools assigned. Remove or reassign schools first.",
@@ -63,4 +66,5 @@ def delete_region(region_id: int, session: Session = Depends(get_session)):
 
     session.delete(region)
     session.commit()
+    reference_cache.invalidate()
     return {"ok": True}
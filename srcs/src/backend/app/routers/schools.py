@@ -1,44 +1,50 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlmodel import Session, select
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from sqlmodel import Session, SQLModel
 
 from ..db import get_session
-from ..models import School, Region
+from ..http_cache import etag_response
+from ..models import School
+from ..reference import reference_cache
 
 router = APIRouter(prefix="/schools", tags=["schools"])
 
 
+class SchoolRead(SQLModel):
+    id: int
+    name: str
+    region_id: int
+    region_name: Optional[str] = None
+
+
 @router.post("", response_model=School)
 def create_school(
     school: School,
     session: Session = Depends(get_session),
 ):
     # ensure region exists
-    region = session.get(Region, school.region_id)
-    if not region:
+    if not reference_cache.region(school.region_id):
         raise HTTPException(status_code=400, detail="Region does not exist")
 
     session.add(school)
     session.commit()
+    reference_cache.invalidate()
     session.refresh(school)
     return school
 
 
-@router.get("", response_model=List[School])
+@router.get("", response_model=List[SchoolRead])
 def list_schools(
+    request: Request,
     region_id: Optional[int] = Query(default=None),
-    session: Session = Depends(get_session),
 ):
-    statement = select(School)
-    if region_id is not None:
-        statement = statement.where(School.region_id == region_id)
-    return session.exec(statement).all()
+    return etag_response(request, reference_cache.schools(region_id))
 
 
-@router.get("/{school_id}", response_model=School)
-def get_school(school_id: int, session: Session = Depends(get_session)):
-    school = session.get(School, school_id)
+@router.get("/{school_id}", response_model=SchoolRead)
+def get_school(school_id: int):
+    school = reference_cache.school(school_id)
     if not school:
         raise HTTPException(status_code=404, detail="School not found")
     return school
@@ -56,14 +62,14 @@ def update_school(
 
     # if region_id changes, check new region exists
     if data.region_id != school.region_id:
-        new_region = session.get(Region, data.region_id)
-        if not new_region:
+        if not reference_cache.region(data.region_id):
             raise HTTPException(status_code=400, detail="New region does not exist")
 
     school.name = data.name
     school.region_id = data.region_id
     session.add(school)
     session.commit()
+    reference_cache.invalidate()
     session.refresh(school)
     return school
 
@@ -76,4 +82,5 @@ def delete_school(school_id: int, session: Session = Depends(get_session)):
 
     session.delete(school)
     session.commit()
+    reference_cache.invalidate()
     return {"ok": True}
@@ -0,0 +1,111 @@
+import math
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from ..analysis import FACET_FIELDS
+from ..db import get_session
+from ..metrics import STAGE_COLUMNS
+from ..models import FileMeta, School, StatsRollup
+
+router = APIRouter(prefix="/stats", tags=["stats"])
+
+GROUP_COLUMNS = {
+    "region": School.region_id,
+    "school": StatsRollup.school_id,
+    "month": StatsRollup.month,
+    "analysis_type": StatsRollup.analysis_type,
+}
+
+
+@router.get("")
+def get_stats(
+    group_by: List[str] = Query(default=["region"]),
+    field: Optional[str] = Query(default=None, description="structured field to get a value distribution of"),
+    region_id: Optional[int] = Query(default=None),
+    school_id: Optional[int] = Query(default=None),
+    analysis_type: Optional[str] = Query(default=None),
+    month_from: Optional[str] = Query(default=None, pattern=r"^\d{4}-\d{2}$"),
+    month_to: Optional[str] = Query(default=None, pattern=r"^\d{4}-\d{2}$"),
+    session: Session = Depends(get_session),
+):
+    """
+    Counts of analyzed files from the pre-aggregated rollups.
+
+    Without `field`, returns the number of files per group. With `field`
+    (e.g. overall_satisfaction), returns the distribution of its values per group.
+    """
+    unknown = [name for name in group_by if name not in GROUP_COLUMNS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"group_by must be any of: {', '.join(GROUP_COLUMNS)}",
+        )
+    if field is not None and field not in FACET_FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of: {', '.join(FACET_FIELDS)}")
+
+    columns = [GROUP_COLUMNS[name].label(f"{name}_id" if name in ("region", "school") else name) for name in group_by]
+    if field is not None:
+        columns.append(StatsRollup.value)
+    file_count = func.sum(StatsRollup.file_count)
+
+    statement = select(*columns, file_count).where(StatsRollup.field == (field or ""))
+    if "region" in group_by or region_id is not None:
+        statement = statement.join(School, School.id == StatsRollup.school_id)
+    if region_id is not None:
+        statement = statement.where(School.region_id == region_id)
+    if school_id is not None:
+        statement = statement.where(StatsRollup.school_id == school_id)
+    if analysis_type is not None:
+        statement = statement.where(StatsRollup.analysis_type == analysis_type)
+    if month_from is not None:
+        statement = statement.where(StatsRollup.month >= month_from)
+    if month_to is not None:
+        statement = statement.where(StatsRollup.month <= month_to)
+
+    statement = statement.group_by(*columns).having(file_count > 0).order_by(*columns)
+
+    keys = [column.name for column in columns] + ["count"]
+    return [dict(zip(keys, row)) for row in session.exec(statement).all()]
+
+
+def _percentile(values: List[float], q: float) -> float:
+    # nearest-rank on an already sorted list
+    index = max(0, math.ceil(q * len(values)) - 1)
+    return values[index]
+
+
+@router.get("/stages")
+def get_stage_durations(
+    since: Optional[datetime] = Query(default=None, description="files whose analysis finished at or after this time"),
+    school_id: Optional[int] = Query(default=None),
+    analysis_type: Optional[str] = Query(default=None),
+    session: Session = Depends(get_session),
+):
+    """Count, p50, p95 and max of every processing stage duration, in seconds."""
+    columns = [getattr(FileMeta, column) for column in STAGE_COLUMNS.values()]
+    statement = select(*columns).where(FileMeta.processing_seconds.is_not(None))
+    if since is not None:
+        statement = statement.where(FileMeta.analysis_finished_at >= since)
+    if school_id is not None:
+        statement = statement.where(FileMeta.school_id == school_id)
+    if analysis_type is not None:
+        statement = statement.where(FileMeta.analysis_type == analysis_type)
+    rows = session.exec(statement).all()
+
+    result = {}
+    for index, stage in enumerate(STAGE_COLUMNS):
+        values = sorted(row[index] for row in rows if row[index] is not None)
+        if not values:
+            result[stage] = {"count": 0}
+            continue
+        result[stage] = {
+            "count": len(values),
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+            "max": values[-1],
+        }
+    return result
@@ -0,0 +1,222 @@
+"""
+Order in which the worker picks up queued files.
+
+1. Priority class: an operator's retry from the admin UI comes before fresh
+   uploads, and those come before bulk backfills.
+2. Fair share between schools inside a class (start-time fair queueing): each
+   school has a virtual time that grows by the estimated cost of every file
+   processed for it, and the school with the lowest virtual time goes next.
+   One school's 500 recordings then take turns with everybody else's uploads.
+3. Shortest job first inside a school, by an estimated processing cost from
+   file size and audio duration. Waiting time is credited against the cost,
+   so long files still get their turn.
+
+A claim does not load the whole queue. The priority classes and the schools
+queued in a class are read with one index seek per value, then only the
+school whose turn it is is asked for files: its SCHEDULER_CANDIDATES cheapest
+and SCHEDULER_CANDIDATES oldest, each a LIMIT query along ix_filemeta_queue_cost
+or ix_filemeta_queue_age. The file with the best aged cost is nearly always
+among them, and the oldest ones are always there, so no file starves. A claim
+costs the same with a backlog of a hundred files or a hundred thousand.
+"""
+import os
+import wave
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlmodel import Session, select
+
+from .extraction import detect_format
+from .models import FileMeta
+
+UPLOAD_ROOT = os.getenv("UPLOAD_ROOT", "/data/uploads")
+
+# priority classes, lower runs first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_UPLOAD = 1
+PRIORITY_BULK = 2
+
+# cost model, in estimated seconds of worker time
+COST_LLM_SECONDS = float(os.getenv("COST_LLM_SECONDS", "20"))
+COST_SECONDS_PER_MB = float(os.getenv("COST_SECONDS_PER_MB", "2"))
+# Whisper processing time per second of audio
+COST_WHISPER_RTF = float(os.getenv("COST_WHISPER_RTF", "0.5"))
+# used to guess the duration of compressed audio from its size
+AUDIO_ASSUMED_BITRATE = int(os.getenv("AUDIO_ASSUMED_BITRATE", "128000"))
+# seconds of estimated cost forgiven per second spent waiting
+SCHEDULER_AGING_RATE = float(os.getenv("SCHEDULER_AGING_RATE", "0.1"))
+# candidates of the school whose turn it is fetched for a claim, by cost and by age each
+SCHEDULER_CANDIDATES = int(os.getenv("SCHEDULER_CANDIDATES", "20"))
+# files queued before costs were estimated get an estimate this many at a time
+ESTIMATE_BATCH = 50
+
+QUEUED_STATUSES = ("pending", "parked")
+
+
+def audio_duration(path: str, size: int) -> float:
+    try:
+        with wave.open(path, "rb") as audio:
+            return audio.getnframes() / float(audio.getframerate())
+    except (wave.Error, EOFError, ZeroDivisionError):
+        return size * 8 / AUDIO_ASSUMED_BITRATE
+
+
+def estimate_cost(tus_id: str, filename: Optional[str] = None) -> Tuple[float, Optional[float]]:
+    """Return (estimated seconds of processing, audio duration in seconds or None)."""
+    path = os.path.join(UPLOAD_ROOT, tus_id)
+    if not os.path.exists(path):
+        return COST_LLM_SECONDS, None
+
+    size = os.path.getsize(path)
+    if detect_format(path, filename) == "audio":
+        duration = audio_duration(path, size)
+        return COST_LLM_SECONDS + duration * COST_WHISPER_RTF, duration
+    return COST_LLM_SECONDS + size / (1024 * 1024) * COST_SECONDS_PER_MB, None
+
+
+def set_cost_estimate(file_meta: FileMeta) -> None:
+    file_meta.cost_estimate, file_meta.audio_seconds = estimate_cost(file_meta.tus_id, file_meta.filename)
+
+
+@dataclass
+class QueuedFile:
+    id: int
+    school_id: int
+    priority: int
+    cost: float
+    is_audio: bool
+    uploaded_at: datetime
+
+
+def fill_missing_estimates(session: Session, limit: int = ESTIMATE_BATCH) -> int:
+    """
+    Give queued files registered before costs and priority classes existed
+    both, `limit` at a time; claims only see files that have them. Returns
+    how many files were filled in.
+    """
+    files = session.exec(
+        select(FileMeta)
+        .where(
+            FileMeta.analysis_status.in_(QUEUED_STATUSES),
+            or_(FileMeta.cost_estimate.is_(None), FileMeta.queue_priority.is_(None)),
+        )
+        .limit(limit)
+    ).all()
+    for file_meta in files:
+        if file_meta.cost_estimate is None:
+            set_cost_estimate(file_meta)
+        if file_meta.queue_priority is None:
+            file_meta.queue_priority = PRIORITY_UPLOAD
+        session.add(file_meta)
+    return len(files)
+
+
+def _distinct(session: Session, column, *where) -> List:
+    """Distinct values of `column`, one seek in ix_filemeta_queue_* per value instead of a scan."""
+    values = []
+    while True:
+        statement = select(column).where(*where, column.is_not(None))
+        if values:
+            statement = statement.where(column > values[-1])
+        value = session.exec(statement.order_by(column).limit(1)).first()
+        if value is None:
+            return values
+        values.append(value)
+
+
+def queue_classes(session: Session) -> List[int]:
+    """Priority classes with queued files, most urgent first."""
+    classes = set()
+    for status in QUEUED_STATUSES:
+        classes.update(_distinct(session, FileMeta.queue_priority, FileMeta.analysis_status == status))
+    return sorted(classes)
+
+
+def queued_schools(session: Session, priority: int) -> List[int]:
+    # read off the index in school order; one query beats a seek per school
+    schools = set()
+    for status in QUEUED_STATUSES:
+        schools.update(session.exec(
+            select(FileMeta.school_id)
+            .where(FileMeta.analysis_status == status, FileMeta.queue_priority == priority)
+            .distinct()
+        ).all())
+    return sorted(schools)
+
+
+def school_candidates(
+    session: Session,
+    priority: int,
+    school_id: int,
+    now: datetime,
+    skip_audio: bool = False,
+) -> List[QueuedFile]:
+    """
+    The SCHEDULER_CANDIDATES cheapest and SCHEDULER_CANDIDATES oldest due files
+    of one school in one priority class, read in index order without loading
+    whole rows.
+    """
+    candidates: Dict[int, QueuedFile] = {}
+    for status in QUEUED_STATUSES:
+        where = [
+            FileMeta.analysis_status == status,
+            FileMeta.queue_priority == priority,
+            FileMeta.school_id == school_id,
+            FileMeta.cost_estimate.is_not(None),
+        ]
+        if status == "parked":
+            where.append(FileMeta.analysis_retry_at <= now)
+        if skip_audio:
+            where.append(FileMeta.audio_seconds.is_(None))
+        statement = select(
+            FileMeta.id, FileMeta.cost_estimate, FileMeta.audio_seconds, FileMeta.uploaded_at,
+        ).where(*where)
+
+        for order in ((FileMeta.cost_estimate, FileMeta.id), (FileMeta.uploaded_at, FileMeta.id)):
+            for file_id, cost, audio_seconds, uploaded_at in session.exec(
+                statement.order_by(*order).limit(SCHEDULER_CANDIDATES)
+            ).all():
+                candidates[file_id] = QueuedFile(
+                    id=file_id,
+                    school_id=school_id,
+                    priority=priority,
+                    cost=cost,
+                    is_audio=audio_seconds is not None,
+                    uploaded_at=uploaded_at,
+                )
+    return list(candidates.values())
+
+
+class FairScheduler:
+    def __init__(self):
+        self.clock = 0.0
+        self.virtual_time: Dict[Optional[int], float] = {}
+
+    def _school_key(self, school_id: Optional[int]) -> float:
+        # a school that was idle restarts at the current clock, without saved-up credit
+        return max(self.virtual_time.get(school_id, self.clock), self.clock)
+
+    def pick(self, own: Iterable[QueuedFile], now: datetime) -> QueuedFile:
+        """Choose among the candidates of the school whose turn it is and charge the school for it."""
+        chosen = min(own, key=lambda q: (
+            q.cost - SCHEDULER_AGING_RATE * (now - q.uploaded_at).total_seconds(),
+            q.uploaded_at,
+            q.id,
+        ))
+        start = self._school_key(chosen.school_id)
+        self.clock = start
+        self.virtual_time[chosen.school_id] = start + chosen.cost
+        return chosen
+
+    def next_file(self, session: Session, skip_audio: bool = False) -> Optional[FileMeta]:
+        now = datetime.utcnow()
+        for priority in queue_classes(session):
+            schools = queued_schools(session, priority)
+            # a school whose queued files are all parked (or audio, with Whisper down) passes its turn
+            for school_id in sorted(schools, key=lambda s: (self._school_key(s), s)):
+                own = school_candidates(session, priority, school_id, now, skip_audio)
+                if own:
+                    return session.get(FileMeta, self.pick(own, now).id)
+        return None
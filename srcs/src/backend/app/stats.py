@@ -0,0 +1,98 @@
+from collections import Counter
+from datetime import datetime
+from typing import Iterable, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+
+from .analysis import FACET_FIELDS
+from .models import FileMeta, StatsRollup
+
+# (school_id, month, analysis_type, field, value)
+RollupKey = Tuple[int, str, str, str, str]
+
+
+def rollup_month(file_meta: FileMeta) -> str:
+    """Month the file is about: its normalized document date if known, else the upload month."""
+    if file_meta.date:
+        try:
+            return datetime.strptime(file_meta.date[:10], "%Y-%m-%d").strftime("%Y-%m")
+        except ValueError:
+            pass
+    return file_meta.uploaded_at.strftime("%Y-%m")
+
+
+def rollup_keys(file_meta: FileMeta) -> list[RollupKey]:
+    group = (file_meta.school_id or 0, rollup_month(file_meta), file_meta.analysis_type or "")
+    keys = [group + ("", "")]
+    for field in FACET_FIELDS:
+        for value in dict.fromkeys(getattr(file_meta, field) or []):
+            keys.append(group + (field, value))
+    return keys
+
+
+def _upsert(session: Session, counts: Counter) -> None:
+    dialect = session.get_bind().dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+    for (school_id, month, analysis_type, field, value), delta in counts.items():
+        if not delta:
+            continue
+        statement = insert(StatsRollup).values(
+            school_id=school_id,
+            month=month,
+            analysis_type=analysis_type,
+            field=field,
+            value=value,
+            file_count=delta,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["school_id", "month", "analysis_type", "field", "value"],
+            set_={"file_count": StatsRollup.file_count + statement.excluded.file_count},
+        )
+        session.execute(statement)
+
+
+def apply_rollup(session: Session, file_meta: FileMeta, delta: int) -> None:
+    """
+    Add (delta=1) or remove (delta=-1) the contribution of one analyzed file.
+    Call with +1 when a file becomes "done" and with -1 before a "done" file
+    is reset for re-analysis, while its structured fields are still the old ones.
+    Files in any other state are not counted, so nothing is applied for them.
+    """
+    if file_meta.analysis_status != "done":
+        return
+    _upsert(session, Counter({key: delta for key in rollup_keys(file_meta)}))
+
+
+def rebuild_rollups(session: Session, files: Iterable[FileMeta]) -> int:
+    """Recompute every rollup row from scratch from the given "done" files."""
+    counts: Counter = Counter()
+    total = 0
+    for file_meta in files:
+        if file_meta.analysis_status != "done":
+            continue
+        counts.update(rollup_keys(file_meta))
+        total += 1
+
+    session.execute(delete(StatsRollup))
+    _upsert(session, counts)
+    return total
+
+
+def done_files(session: Session, batch_size: int = 500) -> Iterable[FileMeta]:
+    """Iterate all "done" files in id order, one batch at a time."""
+    last_id = 0
+    while True:
+        batch = session.exec(
+            select(FileMeta)
+            .where(FileMeta.analysis_status == "done", FileMeta.id > last_id)
+            .order_by(FileMeta.id)
+            .limit(batch_size)
+        ).all()
+        if not batch:
+            return
+        yield from batch
+        last_id = batch[-1].id
+        session.expunge_all()
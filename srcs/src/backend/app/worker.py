@@ -1,16 +1,38 @@
 import os
 import time
 from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
-from sqlmodel import Session, select
+from prometheus_client import start_http_server
+from sqlalchemy import update
+from sqlmodel import Session
 
 from .db import engine, init_db
 from .models import FileMeta
-from .analysis import analyze_file
+from .analysis import analyze_file, extract_file
+from .extraction import ExtractedDocument, detect_format, transcript_document
+from .metrics import FILES_PROCESSED, STAGE_COLUMNS, STAGE_SECONDS, WORKER_METRICS_PORT, stage_timer
+from .resilience import (
+    MAX_FILE_ATTEMPTS,
+    CircuitOpenError,
+    Deadline,
+    call_dependency,
+    get_breaker,
+    is_transient,
+    park_until,
+)
+from .reference import reference_cache
+from .scheduler import ESTIMATE_BATCH, FairScheduler, fill_missing_estimates
+from .stats import apply_rollup
 
 POLL_INTERVAL = 5  # seconds
 
+# time budget of one file across transcription, analysis and indexing
+FILE_DEADLINE_SECONDS = float(os.getenv("FILE_DEADLINE_SECONDS", "1200"))
+WHISPER_TIMEOUT = float(os.getenv("WHISPER_TIMEOUT", "600"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "300"))
+
 # URL of the Whisper service (internal Docker hostname)
 WHISPER_URL = os.getenv("WHISPER_URL", "http://whisper:8000/transcribe")
 # Root where tusd stores uploaded files inside the container
@@ -34,7 +56,12 @@ def is_audio_file(file_meta: FileMeta) -> bool:
         or ""
     ).lower()
 
-    return name.endswith(".wav") or name.endswith(".mp3") or name.endswith(".m4a") or name.endswith(".flac")
+    if name.endswith(".wav") or name.endswith(".mp3") or name.endswith(".m4a") or name.endswith(".flac"):
+        return True
+
+    # tusd stores uploads without extension, so fall back to the file's magic bytes
+    path = os.path.join(UPLOAD_ROOT, file_meta.tus_id)
+    return os.path.exists(path) and detect_format(path, name) == "audio"
 
 
 def build_audio_rel_path(file_meta: FileMeta) -> str:
@@ -64,9 +91,10 @@ def build_audio_rel_path(file_meta: FileMeta) -> str:
     raise RuntimeError(f"Cannot determine audio path for FileMeta id={file_meta.id}")
 
 
-def transcribe_with_whisper(file_meta: FileMeta) -> str:
+def transcribe_with_whisper(file_meta: FileMeta, timeout: float = WHISPER_TIMEOUT) -> Tuple[str, List[Dict[str, Any]]]:
     """
-    Call the Whisper HTTP API and return the transcript text.
+    Call the Whisper HTTP API and return the transcript text and its
+    timestamped segments.
     """
     rel_path = build_audio_rel_path(file_meta)
 
@@ -75,7 +103,7 @@ def transcribe_with_whisper(file_meta: FileMeta) -> str:
         "language": "cs",   # Czech; can be made dynamic if needed
     }
 
-    response = requests.post(WHISPER_URL, json=payload, timeout=600)
+    response = requests.post(WHISPER_URL, json=payload, timeout=timeout)
     response.raise_for_status()
     data = response.json()
 
@@ -83,52 +111,238 @@ def transcribe_with_whisper(file_meta: FileMeta) -> str:
     if not text:
         raise RuntimeError(f"Whisper returned empty transcript for path={rel_path}")
 
-    return text
+    return text, data.get("segments") or []
+
+_rag = None
+
+
+def get_rag():
+    """Connect to the vector store on first use, not on every file."""
+    global _rag
+    if _rag is None:
+        from .chat.RAG import RAG
+        _rag = RAG()
+    return _rag
+
+
+def index_document(session: Session, file_meta: FileMeta, doc: ExtractedDocument) -> List[str]:
+    # the chunk index is committed together with the file's status
+    return get_rag().add_document(
+        doc,
+        file_meta.id,
+        file_meta.filename,
+        reference_cache.school(file_meta.school_id),
+        file_meta.uploaded_at,
+        analysis_type=file_meta.analysis_type,
+        session=session,
+    )
+
+
+def delete_stale_chunks(chunk_ids: List[str]) -> None:
+    """Remove the vectors of chunks dropped by a committed re-index."""
+    if not chunk_ids:
+        return
+    try:
+        get_rag().delete_chunks(chunk_ids)
+    except Exception as e:
+        # the rows are gone already, a leftover vector only wastes space
+        print(f"Could not delete {len(chunk_ids)} stale chunks from the vector store: {e}")
+
+
+def mark_processing(file_meta: FileMeta) -> None:
+    now = datetime.utcnow()
+    file_meta.analysis_status = "processing"
+    file_meta.analysis_started_at = now
+    # time in the queue since the upload, or since it became due again after a retry
+    queued_since = file_meta.analysis_retry_at or file_meta.uploaded_at
+    file_meta.wait_seconds = max((now - queued_since).total_seconds(), 0.0)
+    STAGE_SECONDS.labels("wait").observe(file_meta.wait_seconds)
+
+
+def requeue_interrupted() -> None:
+    """Files left "processing" by a worker that died mid-file go back to the queue."""
+    with Session(engine) as session:
+        session.execute(
+            update(FileMeta)
+            .where(FileMeta.analysis_status == "processing")
+            .values(analysis_status="pending")
+        )
+        session.commit()
+
+
+def estimate_queue() -> None:
+    """Files queued before costs and priority classes existed get both, or no claim would see them."""
+    while True:
+        with Session(engine) as session:
+            filled = fill_missing_estimates(session)
+            session.commit()
+        if filled < ESTIMATE_BATCH:
+            return
+
+
+def next_file(session: Session, scheduler: FairScheduler) -> Optional[FileMeta]:
+    """
+    Next file to claim, leaving files queued whose dependencies are down.
+    The claim only reads: changes pending in `session` are not flushed for
+    it, so on SQLite it does not run while holding the write lock.
+    """
+    down = {name for name in ("whisper", "llm", "index") if not get_breaker(name).available()}
+    if down & {"llm", "index"}:
+        return None
+    with session.no_autoflush:
+        return scheduler.next_file(session, skip_audio="whisper" in down)
+
+
+def process_file(
+    session: Session,
+    f: FileMeta,
+    deadline: Deadline,
+    durations: Dict[str, float],
+    transcript: Optional[Dict[str, Any]] = None,
+) -> List[str]:
+    """
+    Run all stages of one file in `session`. Stage durations go to `durations`,
+    a fresh Whisper result also to `transcript`, so it survives a rollback.
+    Returns the chunk ids to delete from the vector store once `session` is
+    committed.
+    """
+    # 1) Get the text once: Whisper transcript for audio, parsed file otherwise
+    if is_audio_file(f):
+        content = f.get_content()
+        if f.analysis_attempts and content.transcript_text and content.extracted_text:
+            # parked after a successful transcription: do not pay for Whisper again.
+            # The blocks are offsets into the document text, not into Whisper's raw text.
+            doc = ExtractedDocument.from_stored(content.extracted_text, content.document_structure)
+        else:
+            with stage_timer("transcribe", durations):
+                text, segments = call_dependency(
+                    "whisper", deadline,
+                    lambda: transcribe_with_whisper(f, timeout=deadline.timeout(WHISPER_TIMEOUT, "whisper")),
+                )
+            doc = transcript_document(text, segments)
+
+            # persisted together with the final status
+            content.transcript_text = text
+            content.extracted_text = doc.text
+            content.document_structure = doc.blocks
+            if transcript is not None:
+                transcript.update(text=text, document=doc.text, blocks=doc.blocks)
+    else:
+        with stage_timer("extract", durations):
+            doc = extract_file(f)
+
+    # 2) Run your existing metadata / analysis pipeline on that text
+    with stage_timer("analysis", durations):
+        call_dependency(
+            "llm", deadline,
+            lambda: analyze_file(session, f, override_text=doc.text, timeout=deadline.timeout(LLM_TIMEOUT, "analysis")),
+        )
+
+    # 3) Chunk and embed the same text for the chatbot
+    with stage_timer("index", durations):
+        return call_dependency("index", deadline, lambda: index_document(session, f, doc))
+
+
+def record_durations(f: FileMeta, durations: Dict[str, float]) -> None:
+    for stage, column in STAGE_COLUMNS.items():
+        if stage != "wait":
+            setattr(f, column, durations.get(stage))
+
+
+def reload_after_failure(session: Session, file_id: int, transcript: Dict[str, Any]) -> FileMeta:
+    """
+    Roll back whatever the failed run left in the session and load the file
+    again. After a failed flush the session refuses all work until it is
+    rolled back. A transcript from this run is kept, so a retry does not pay
+    for Whisper again.
+    """
+    session.rollback()
+    f = session.get(FileMeta, file_id)
+    if transcript:
+        content = f.get_content()
+        content.transcript_text = transcript["text"]
+        content.extracted_text = transcript["document"]
+        content.document_structure = transcript["blocks"]
+    return f
+
+
+def record_failure(f: FileMeta, error: Exception) -> None:
+    """Park the file for a later retry if the failure is transient, fail it otherwise."""
+    attempts = f.analysis_attempts or 0
+    # an open circuit means the file was not even tried
+    if not isinstance(error, CircuitOpenError):
+        attempts += 1
+    f.analysis_attempts = attempts
+    f.analysis_error = str(error)[:512]
+
+    if is_transient(error) and attempts < MAX_FILE_ATTEMPTS:
+        f.analysis_status = "parked"
+        f.analysis_retry_at = park_until(attempts, error)
+        print(f"Parked file {f.id} until {f.analysis_retry_at:%H:%M:%S} (attempt {attempts}): {error}")
+    else:
+        f.analysis_status = "failed"
+        f.analysis_finished_at = datetime.utcnow()
+        f.analysis_retry_at = None
+
 
 def main():
     init_db()
+    requeue_interrupted()
+    estimate_queue()
+    start_http_server(WORKER_METRICS_PORT)
+    scheduler = FairScheduler()
 
     while True:
         with Session(engine) as session:
-            pending_files = session.exec(
-                select(FileMeta).where(FileMeta.analysis_status == "pending")
-            ).all()
+            f = next_file(session, scheduler)
 
-            if not pending_files:
+            if f is None:
+                session.commit()
                 time.sleep(POLL_INTERVAL)
                 continue
 
-            for f in pending_files:
-                f.analysis_status = "processing"
-                f.analysis_started_at = datetime.utcnow()
-                session.add(f)
-                session.commit()
+            mark_processing(f)
+            session.add(f)
+            session.commit()
 
+            while f is not None:
+                file_id = f.id
+                durations: Dict[str, float] = {}
+                transcript: Dict[str, Any] = {}
+                stale_chunks: List[str] = []
+                following = None
                 try:
-                    # 1) For audio files: get transcript from Whisper
-                    override_text = None
-                    if is_audio_file(f):
-                        transcript = transcribe_with_whisper(f)
-
-                        f.transcript_text = transcript
-                        session.add(f)
-                        session.commit()
-
-                        override_text = transcript
-
-                    # 2) Run your existing metadata / analysis pipeline
-                    analyze_file(session, f, override_text=override_text)
+                    with stage_timer("total", durations):
+                        stale = process_file(session, f, Deadline(FILE_DEADLINE_SECONDS), durations, transcript)
+                    # claim the next file before the rollup and the flush write
+                    following = next_file(session, scheduler)
 
                     f.analysis_status = "done"
                     f.analysis_finished_at = datetime.utcnow()
                     f.analysis_error = None
+                    f.analysis_retry_at = None
+                    apply_rollup(session, f, 1)
+                    # write now, so a locked database fails this file instead of the commit below
+                    session.flush()
+                    stale_chunks = stale
                 except Exception as e:
-                    f.analysis_status = "failed"
-                    f.analysis_finished_at = datetime.utcnow()
-                    f.analysis_error = str(e)[:512]
-
+                    f = reload_after_failure(session, file_id, transcript)
+                    record_failure(f, e)
+                    if following is None:
+                        following = next_file(session, scheduler)
+                record_durations(f, durations)
+                FILES_PROCESSED.labels(f.analysis_status).inc()
                 session.add(f)
-                session.commit()
+
+                # finish this file and claim the next one in a single write transaction
+                if following is not None:
+                    mark_processing(following)
+                    session.add(following)
+                with stage_timer("commit"):
+                    session.commit()
+                # a rollback would have restored the chunk rows, so their vectors go only now
+                delete_stale_chunks(stale_chunks)
+                f = following
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,41 @@
+"""
+The app reads its configuration from the environment at import time, so the
+test database and data directories are set up here, before any test module
+imports `app`.
+"""
+import os
+import tempfile
+
+import pytest
+
+DATA_DIR = tempfile.mkdtemp(prefix="backend-tests-")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(DATA_DIR, 'app.db')}"
+os.environ["UPLOAD_ROOT"] = os.path.join(DATA_DIR, "uploads")
+os.environ["VECTOR_STORE"] = "local"
+os.environ["VECTOR_STORE_DIR"] = os.path.join(DATA_DIR, "vectors")
+os.environ["CHAT_EAGER_INIT"] = "false"
+# lock contention should fail a test quickly instead of hanging it
+os.environ["SQLITE_BUSY_TIMEOUT_MS"] = "2000"
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from app.db import engine, init_db
+    init_db()
+    return engine
+
+
+@pytest.fixture
+def session(engine):
+    from sqlmodel import Session
+    with Session(engine) as session:
+        yield session
+
+
+@pytest.fixture(scope="session")
+def client(engine):
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,35 @@
+from app.chat import chunking
+from app.chat.chunking import CHUNK_SIZE, QUESTION_RE, chunk_form, chunk_table
+
+
+def test_question_lines_end_with_a_colon():
+    assert QUESTION_RE.match("Co vám seminář dal:")
+    assert not QUESTION_RE.match("Jméno: Jan Novák")
+
+
+def test_form_units_start_at_questions():
+    text = "Co vám seminář dal:\nNové metody.\nCo zlepšit:\nVíce času."
+    assert [chunk.text for chunk in chunk_form(text)] == [text]
+    assert chunk_form(text)[0].metadata == {"chunk_type": "form_answers"}
+
+
+def test_table_rows_repeat_the_header():
+    header = "jméno | třída | hodnocení"
+    rows = [f"žák {i} | 5.A | {i % 5 + 1}" for i in range(200)]
+    chunks = chunk_table("\n".join([header] + rows))
+    assert len(chunks) > 1
+    assert all(chunk.text.startswith(header + "\n") for chunk in chunks)
+    assert all(len(chunk.text) <= CHUNK_SIZE for chunk in chunks)
+
+
+def test_long_table_header_is_shortened(monkeypatch):
+    monkeypatch.setattr(chunking, "TABLE_HEADER_MAX_CHARS", 100)
+    header = " | ".join(f"otázka číslo {i}" for i in range(100))
+    rows = [" | ".join(str(i) for _ in range(10)) for i in range(100)]
+    chunks = chunk_table("\n".join([header] + rows))
+
+    texts = "\n".join(chunk.text for chunk in chunks)
+    assert "otázka číslo 99" in texts
+    assert all(len(chunk.text) <= CHUNK_SIZE for chunk in chunks)
+    # rows are packed many to a chunk instead of one chunk per row
+    assert len(chunks) < len(rows) / 5
@@ -0,0 +1,53 @@
+import json
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from app.models import FileMeta
+from app.routers import export as export_router
+
+SCHOOL_ID = 41
+
+
+def finished_file(tus_id, finished_at):
+    return FileMeta(
+        tus_id=tus_id,
+        filename=f"{tus_id}.txt",
+        school_id=SCHOOL_ID,
+        analysis_status="done",
+        analysis_finished_at=finished_at,
+    )
+
+
+def export(client, since=None):
+    params = {"format": "ndjson", "school_id": SCHOOL_ID}
+    if since is not None:
+        params["since"] = since
+    response = client.get("/export/files", params=params)
+    assert response.status_code == 200
+    ids = [json.loads(line)["id"] for line in response.text.splitlines() if line]
+    return ids, response.headers["X-Export-Until"]
+
+
+def test_incremental_exports_hand_over_a_file_committed_after_the_first_export(engine, client, monkeypatch):
+    with Session(engine) as session:
+        old = finished_file("tus-export-old", datetime.utcnow() - timedelta(days=1))
+        session.add(old)
+        session.commit()
+        old_id = old.id
+
+    # the worker has stamped the file but not committed it yet
+    with Session(engine) as worker_session:
+        late = finished_file("tus-export-late", datetime.utcnow() - timedelta(seconds=1))
+        worker_session.add(late)
+        worker_session.flush()
+        first, until = export(client)
+        worker_session.commit()
+        late_id = late.id
+
+    # the next export runs once the settle time has passed
+    monkeypatch.setattr(export_router, "EXPORT_SETTLE_SECONDS", 0)
+    second, _ = export(client, since=until)
+
+    assert first == [old_id]
+    assert second == [late_id]
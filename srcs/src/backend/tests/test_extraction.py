@@ -0,0 +1,109 @@
+import codecs
+
+import pytest
+from openpyxl import Workbook
+
+from app import extraction
+from app.extraction import detect_format, extract_document
+
+
+def test_utf16_text_is_not_sniffed_as_binary(tmp_path):
+    text = "Škola v přírodě\nZpětná vazba: výborná\n"
+    for bom, encoding in ((codecs.BOM_UTF16_LE, "utf-16-le"), (codecs.BOM_UTF16_BE, "utf-16-be")):
+        path = tmp_path / f"notes-{encoding}.txt"
+        path.write_bytes(bom + text.encode(encoding))
+
+        assert detect_format(str(path)) == "text"
+        assert extract_document(str(path)).text == text.rstrip("\n")
+
+
+@pytest.mark.parametrize("brand, filename, expected", [
+    (b"M4A ", None, "audio"),
+    (b"mp42", "rozhovor.m4a", "audio"),
+    (b"mp42", "video.mp4", "video"),
+    (b"mp42", None, "video"),
+    (b"qt  ", "video.mov", "video"),
+    (b"heic", "foto.heic", "image"),
+    (b"avif", None, "image"),
+])
+def test_iso_media_files_are_told_apart_by_their_brand(tmp_path, brand, filename, expected):
+    path = tmp_path / "upload"
+    path.write_bytes(b"\x00\x00\x00\x20ftyp" + brand + b"\x00\x00\x02\x00" + brand + b"isom" + b"\x00" * 64)
+    assert detect_format(str(path), filename) == expected
+
+
+def test_xlsx_sheet_stops_at_max_chars(tmp_path):
+    workbook = Workbook()
+    for i in range(1000):
+        workbook.active.append([f"row {i}", "x" * 50])
+    path = tmp_path / "sheet.xlsx"
+    workbook.save(path)
+
+    blocks = list(extraction.iter_blocks(str(path), max_chars=500))
+    assert len(blocks) == 1
+    assert len(blocks[0][1]) < 600
+
+
+class RecordingPool:
+    """Runs tasks inline and remembers how many were queued at most."""
+
+    def __init__(self):
+        self.pending = []
+        self.max_pending = 0
+        self.cancelled = 0
+
+    def submit(self, fn, *args):
+        pool = self
+
+        class LazyFuture:
+            def result(self):
+                pool.pending.remove(self)
+                return fn(*args)
+
+            def cancel(self):
+                pool.pending.remove(self)
+                pool.cancelled += 1
+                return True
+
+        future = LazyFuture()
+        self.pending.append(future)
+        self.max_pending = max(self.max_pending, len(self.pending))
+        return future
+
+
+@pytest.fixture
+def large_pdf(tmp_path):
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for _ in range(100):
+        writer.add_blank_page(width=200, height=200)
+    path = tmp_path / "large.pdf"
+    with open(path, "wb") as f:
+        writer.write(f)
+    return str(path)
+
+
+def test_pdf_page_ranges_in_flight_are_bounded(monkeypatch, large_pdf):
+    pool = RecordingPool()
+    monkeypatch.setattr(extraction, "_get_pool", lambda: pool)
+    monkeypatch.setattr(extraction, "EXTRACTION_WORKERS", 2)
+    monkeypatch.setattr(extraction, "PDF_PARALLEL_MIN_PAGES", 10)
+    monkeypatch.setattr(extraction, "PDF_PAGES_PER_TASK", 5)
+    monkeypatch.setattr(extraction, "PDF_MAX_IN_FLIGHT", 3)
+
+    blocks = extraction.iter_blocks(large_pdf)
+    labels = [label for _, _, label in blocks]
+    assert labels == [f"page {n}" for n in range(1, 101)]
+    assert pool.max_pending == 3
+
+    # stopping early cancels what is still queued
+    blocks = extraction.iter_blocks(large_pdf)
+    next(blocks)
+    blocks.close()
+    assert pool.cancelled == 2
+    assert not pool.pending
+
+
+def test_pdf_pool_uses_spawn():
+    assert extraction._get_pool()._mp_context.get_start_method() == "spawn"
@@ -0,0 +1,33 @@
+def create(client, path, payload):
+    response = client.post(path, json=payload)
+    assert response.status_code == 200, response.text
+    return response.json()["id"]
+
+
+def test_file_list_filters_by_region_one_page_at_a_time(client):
+    region_id = create(client, "/regions", {"name": "Kraj Vysočina"})
+    other_region_id = create(client, "/regions", {"name": "Zlínský kraj"})
+    school_id = create(client, "/schools", {"name": "ZŠ Jihlava", "region_id": region_id})
+    other_school_id = create(client, "/schools", {"name": "ZŠ Zlín", "region_id": other_region_id})
+    in_region = [
+        create(client, "/files", {"tus_id": f"tus-region-{i}", "filename": f"zapis-{i}.txt", "school_id": school_id})
+        for i in range(5)
+    ]
+    create(client, "/files", {"tus_id": "tus-region-other", "filename": "zapis.txt", "school_id": other_school_id})
+
+    ids, pages, cursor = [], 0, None
+    while True:
+        params = {"region_id": region_id, "limit": 2, "fields": "id,school_id"}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/files", params=params)
+        assert response.status_code == 200
+        assert len(response.json()) <= 2
+        ids += [item["id"] for item in response.json()]
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert ids == in_region
+    assert pages == 3
@@ -0,0 +1,47 @@
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from app import ollama_client
+
+
+class SlowRouter:
+    """One endpoint that takes `wait` seconds to become free."""
+    pools = {"analysis": ["ollama"]}
+
+    def __init__(self, wait):
+        self.wait = wait
+
+    @contextmanager
+    def endpoint(self, pool, exclude=(), timeout=None):
+        time.sleep(self.wait)
+        yield SimpleNamespace(url="http://ollama:11434")
+
+
+@pytest.fixture
+def posted(monkeypatch):
+    calls = []
+
+    def post(url, json, timeout):
+        calls.append(timeout)
+        return SimpleNamespace(raise_for_status=lambda: None, json=lambda: {"response": '{"ok": true}'})
+
+    monkeypatch.setattr(requests, "post", post)
+    return calls
+
+
+def test_queue_wait_is_taken_off_the_request_timeout(monkeypatch, posted):
+    monkeypatch.setattr(ollama_client, "get_router", lambda: SlowRouter(0.3))
+    assert ollama_client.ask_llm("prompt", timeout=1.0) == {"ok": True}
+    (timeout,) = posted
+    assert 0 < timeout <= 0.7
+
+
+def test_no_request_after_the_whole_budget_went_to_waiting(monkeypatch, posted):
+    monkeypatch.setattr(ollama_client, "get_router", lambda: SlowRouter(0.3))
+    with pytest.raises(requests.Timeout):
+        ollama_client.ask_llm("prompt", timeout=0.2)
+    assert posted == []
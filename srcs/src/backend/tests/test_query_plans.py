@@ -0,0 +1,84 @@
+"""
+The hot queries must stay index lookups as the tables grow: a SCAN or a
+temporary sort here means every page or every claim reads the whole table.
+"""
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, delete
+
+from app.models import FileMeta
+from app.scheduler import FairScheduler
+
+
+@contextmanager
+def captured_queries(engine):
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def query_plans(engine, queries, table="filemeta"):
+    plans = []
+    for statement, parameters in queries:
+        if f"FROM {table}" not in statement:
+            continue
+        with engine.connect() as conn:
+            rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        plans.append([row[3] for row in rows])
+    assert plans, f"no query on {table} was run"
+    return plans
+
+
+def assert_indexed(plan, using, sorts=0):
+    assert any(using in step for step in plan), plan
+    assert not any(step.startswith(("SCAN filemeta", "SCAN TABLE filemeta")) for step in plan), plan
+    assert sum("TEMP B-TREE" in step for step in plan) == sorts, plan
+
+
+@pytest.mark.parametrize("query, using", [
+    ("cursor=5", "USING INTEGER PRIMARY KEY"),
+    ("cursor=5&order=desc", "USING INTEGER PRIMARY KEY"),
+    ("cursor=5&status=done", "USING INDEX ix_filemeta_status_id"),
+    ("cursor=5&school_id=3", "USING INDEX ix_filemeta_school_id"),
+    ("cursor=5&analysis_type=pdf&order=desc", "USING INDEX ix_filemeta_type_id"),
+])
+def test_file_list_pages_use_an_index(engine, client, query, using):
+    with captured_queries(engine) as queries:
+        response = client.get(f"/files?{query}")
+    assert response.status_code == 200
+    for plan in query_plans(engine, queries):
+        assert_indexed(plan, using)
+
+
+def test_queue_claim_reads_only_index_ranges(engine):
+    school_ids = [40001, 40002]
+    with Session(engine) as session:
+        for i in range(20):
+            session.add(FileMeta(
+                tus_id=f"tus-plan-{i}", filename=f"plan-{i}.txt", school_id=school_ids[i % 2],
+                analysis_status="parked" if i % 5 == 0 else "pending",
+                analysis_retry_at=datetime.utcnow() - timedelta(minutes=1),
+                queue_priority=0, cost_estimate=20.0 + i, uploaded_at=datetime(2024, 1, 1) + timedelta(hours=i),
+            ))
+        session.commit()
+
+    try:
+        with captured_queries(engine) as queries, Session(engine) as session:
+            assert FairScheduler().next_file(session, skip_audio=True) is not None
+        for plan in query_plans(engine, queries):
+            using = "INTEGER PRIMARY KEY" if any("PRIMARY KEY" in step for step in plan) else "ix_filemeta_queue_"
+            assert_indexed(plan, using)
+    finally:
+        with Session(engine) as session:
+            session.exec(delete(FileMeta).where(FileMeta.school_id.in_(school_ids)))
+            session.commit()
@@ -0,0 +1,25 @@
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import resilience
+from app.resilience import Deadline, call_dependency, get_breaker
+
+
+def test_a_locked_database_is_not_retried_or_blamed_on_the_dependency(monkeypatch):
+    monkeypatch.setattr(resilience.time, "sleep", lambda seconds: pytest.fail("retried a locked database"))
+    breaker = get_breaker("test-locked-db")
+    calls = []
+
+    def locked():
+        calls.append(1)
+        raise OperationalError("UPDATE filemeta", {}, sqlite3.OperationalError("database is locked"))
+
+    for _ in range(breaker.failure_threshold + 1):
+        with pytest.raises(OperationalError):
+            call_dependency("test-locked-db", Deadline(60), locked)
+
+    assert len(calls) == breaker.failure_threshold + 1
+    assert breaker.failures == 0
+    assert breaker.available()
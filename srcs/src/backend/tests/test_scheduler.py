@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import Session, delete, update
+
+from app import scheduler
+from app.models import FileMeta
+from app.scheduler import (
+    COST_LLM_SECONDS,
+    PRIORITY_INTERACTIVE,
+    PRIORITY_UPLOAD,
+    FairScheduler,
+    fill_missing_estimates,
+    school_candidates,
+)
+
+BUSY_SCHOOL, QUIET_SCHOOL = 39001, 39002
+START = datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def queue(engine, monkeypatch):
+    monkeypatch.setattr(scheduler, "SCHEDULER_CANDIDATES", 5)
+    with Session(engine) as session:
+        # the busy school's oldest uploads are its most expensive ones
+        for i in range(30):
+            session.add(FileMeta(
+                tus_id=f"tus-busy-{i}", filename=f"busy-{i}.txt", school_id=BUSY_SCHOOL,
+                uploaded_at=START + timedelta(minutes=i), cost_estimate=100.0 - i,
+            ))
+        for i in range(3):
+            session.add(FileMeta(
+                tus_id=f"tus-quiet-{i}", filename=f"quiet-{i}.mp3", school_id=QUIET_SCHOOL,
+                uploaded_at=START + timedelta(minutes=i), cost_estimate=50.0, audio_seconds=60.0,
+            ))
+        # queued before costs were estimated
+        session.add(FileMeta(tus_id="tus-unestimated", filename="old.txt", school_id=QUIET_SCHOOL, uploaded_at=START))
+        session.commit()
+    yield
+    with Session(engine) as session:
+        session.exec(delete(FileMeta).where(FileMeta.school_id.in_([BUSY_SCHOOL, QUIET_SCHOOL])))
+        session.commit()
+
+
+def candidates(engine, school_id, **kwargs):
+    with Session(engine) as session:
+        return school_candidates(session, PRIORITY_UPLOAD, school_id, datetime.utcnow(), **kwargs)
+
+
+def test_claim_fetches_the_cheapest_and_oldest_files_of_a_school(engine, queue):
+    busy = candidates(engine, BUSY_SCHOOL)
+    assert len(busy) == 10
+    costs = sorted(q.cost for q in busy)
+    # the five cheapest (newest) and the five oldest (most expensive)
+    assert costs == [71.0, 72.0, 73.0, 74.0, 75.0, 96.0, 97.0, 98.0, 99.0, 100.0]
+
+
+def test_claim_can_leave_out_audio(engine, queue):
+    assert [q.is_audio for q in candidates(engine, QUIET_SCHOOL)] == [True, True, True]
+    assert candidates(engine, QUIET_SCHOOL, skip_audio=True) == []
+
+
+def test_files_queued_before_cost_estimates_are_estimated_once(engine, queue):
+    with Session(engine) as session:
+        assert fill_missing_estimates(session) >= 1
+        session.commit()
+        assert fill_missing_estimates(session) == 0
+
+    quiet = candidates(engine, QUIET_SCHOOL, skip_audio=True)
+    assert [q.cost for q in quiet] == [COST_LLM_SECONDS]
+
+
+def test_schools_take_turns_and_skip_theirs_without_due_files(engine, queue):
+    with Session(engine) as session:
+        session.exec(
+            update(FileMeta)
+            .where(FileMeta.school_id.in_([BUSY_SCHOOL, QUIET_SCHOOL]))
+            .values(queue_priority=PRIORITY_INTERACTIVE)
+        )
+        session.commit()
+
+        fair = FairScheduler()
+        claimed = []
+        for _ in range(3):
+            f = fair.next_file(session)
+            f.analysis_status = "processing"
+            claimed.append(f.school_id)
+        # the busy school's first file costs twice as much, so the quiet school goes twice
+        assert claimed == [BUSY_SCHOOL, QUIET_SCHOOL, QUIET_SCHOOL]
+
+        # with Whisper down the quiet school has nothing to offer and passes its turn
+        claimed = [fair.next_file(session, skip_audio=True).school_id for _ in range(2)]
+        assert claimed == [BUSY_SCHOOL, BUSY_SCHOOL]
+        session.rollback()
@@ -0,0 +1,40 @@
+from sqlmodel import select
+
+from app.analysis import sync_facets
+from app.models import FileMeta, StatsRollup
+from app.stats import apply_rollup
+
+SCHOOL_ID = 31031
+
+
+def add_file(session, status):
+    file_meta = FileMeta(
+        tus_id=f"tus-stats-{status}",
+        filename="report.txt",
+        school_id=SCHOOL_ID,
+        analysis_status=status,
+        intervention=["Mentoring"],
+    )
+    sync_facets(file_meta)
+    session.add(file_meta)
+    return file_meta
+
+
+def rollup_counts(session):
+    rows = session.exec(select(StatsRollup).where(StatsRollup.school_id == SCHOOL_ID)).all()
+    return {(row.field, row.value): row.file_count for row in rows}
+
+
+def test_rollup_and_facets_count_done_files_only(session, client):
+    done = add_file(session, "done")
+    for status in ("parked", "processing", "failed"):
+        parked = add_file(session, status)
+        apply_rollup(session, parked, 1)
+    apply_rollup(session, done, 1)
+    session.commit()
+
+    assert rollup_counts(session) == {("", ""): 1, ("intervention", "Mentoring"): 1}
+
+    response = client.get("/files/facets", params={"field": "intervention", "school_id": SCHOOL_ID})
+    assert response.status_code == 200
+    assert response.json() == [{"field": "intervention", "value": "Mentoring", "count": 1}]
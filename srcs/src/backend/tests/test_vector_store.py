@@ -0,0 +1,39 @@
+import threading
+
+from app.bench.vector_store import FakeEmbeddings
+from app.chat.vector_store import LocalVectorStore
+
+
+def store(path):
+    return LocalVectorStore(FakeEmbeddings(dim=16), collection_name="test", persist_directory=str(path))
+
+
+def test_reader_reloads_after_compaction_by_another_writer(tmp_path):
+    writer, reader = store(tmp_path), store(tmp_path)
+    texts = [f"dokument číslo {i}" for i in range(20)]
+    writer.add_texts(texts, ids=[str(i) for i in range(20)])
+    assert reader.count() == 20
+
+    # deleting more than COMPACT_DELETED_RATIO of the rows rewrites the files
+    writer.delete(ids=[str(i) for i in range(10)])
+    assert writer.generation == reader.generation + 1
+
+    assert reader.count() == 10
+    assert reader.generation == writer.generation
+    for text in texts[10:]:
+        (doc,) = reader.similarity_search(text, k=1)
+        assert doc.page_content == text
+
+
+def test_readers_wait_for_a_writer_holding_the_lock(tmp_path):
+    writer, reader = store(tmp_path), store(tmp_path)
+    writer.add_texts(["první"], ids=["1"])
+    counts = []
+
+    with writer._file_lock():
+        thread = threading.Thread(target=lambda: counts.append(reader.count()))
+        thread.start()
+        thread.join(0.3)
+        assert thread.is_alive()
+    thread.join(5)
+    assert counts == [1]
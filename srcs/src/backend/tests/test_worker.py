@@ -0,0 +1,182 @@
+import os
+import sqlite3
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, select
+
+from app import analysis, worker
+from app.bench.fake_ollama import ANALYSIS_RESPONSE
+from app.bench.vector_store import FakeEmbeddings
+from app.chat.RAG import RAG
+from app.chat.vector_store import LocalVectorStore
+from app.models import ChunkSource, FileMeta
+from app.resilience import Deadline, is_transient
+
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    rag = RAG.__new__(RAG)
+    rag.vector_store = LocalVectorStore(FakeEmbeddings(dim=32), collection_name="test", persist_directory=str(tmp_path))
+    monkeypatch.setattr(worker, "_rag", rag)
+    monkeypatch.setattr(analysis, "ask_llm", lambda prompt, timeout=300: dict(ANALYSIS_RESPONSE))
+    return rag
+
+
+def upload(engine, tus_id, text):
+    os.makedirs(analysis.UPLOAD_DIR, exist_ok=True)
+    with open(os.path.join(analysis.UPLOAD_DIR, tus_id), "w", encoding="utf-8") as f:
+        f.write(text)
+    with Session(engine) as session:
+        file_meta = FileMeta(tus_id=tus_id, filename=f"{tus_id}.txt", school_id=1)
+        worker.mark_processing(file_meta)
+        session.add(file_meta)
+        session.commit()
+        return file_meta.id
+
+
+def test_process_file_indexes_inside_the_worker_transaction(engine, rag):
+    """The chunk index must not open a second write transaction next to the worker's (SQLite locks)."""
+    text = "\n".join(f"Účastník {i} hodnotí seminář o inkluzi jako přínosný pro svou praxi." for i in range(50))
+    file_id = upload(engine, "tus-worker-index", text)
+
+    with Session(engine) as session:
+        f = session.get(FileMeta, file_id)
+        durations = {}
+        worker.process_file(session, f, Deadline(60), durations)
+        f.analysis_status = "done"
+        session.add(f)
+        session.commit()
+
+    with Session(engine) as session:
+        f = session.get(FileMeta, file_id)
+        assert f.analysis_status == "done"
+        assert f.facets
+        sources = session.exec(select(ChunkSource).where(ChunkSource.file_id == file_id)).all()
+    assert sources
+    assert rag.vector_store.count() == len(sources)
+    assert set(durations) >= {"extract", "analysis", "index"}
+
+
+def rewrite(tus_id, text):
+    with open(os.path.join(analysis.UPLOAD_DIR, tus_id), "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def stored_ids(store):
+    store._refresh()
+    return set(store._row_of)
+
+
+def test_reindex_deletes_old_vectors_only_after_the_commit(engine, rag):
+    file_id = upload(engine, "tus-worker-reindex", "První verze zápisu z porady o inkluzi a výsledcích žáků.")
+    with Session(engine) as session:
+        assert worker.process_file(session, session.get(FileMeta, file_id), Deadline(60), {}) == []
+        session.commit()
+    with Session(engine) as session:
+        old_ids = set(session.exec(select(ChunkSource.chunk_id).where(ChunkSource.file_id == file_id)).all())
+
+    rewrite("tus-worker-reindex", "Úplně jiný text o školní jídelně, rozvrhu a mimoškolních aktivitách.")
+    # the re-index fails after it dropped the old chunks: they come back with their vectors
+    with Session(engine) as session:
+        stale = worker.process_file(session, session.get(FileMeta, file_id), Deadline(60), {})
+        assert set(stale) == old_ids
+        session.rollback()
+    assert old_ids <= stored_ids(rag.vector_store)
+    with Session(engine) as session:
+        assert set(session.exec(select(ChunkSource.chunk_id).where(ChunkSource.file_id == file_id)).all()) == old_ids
+
+    with Session(engine) as session:
+        stale = worker.process_file(session, session.get(FileMeta, file_id), Deadline(60), {})
+        session.commit()
+    worker.delete_stale_chunks(stale)
+    assert not old_ids & stored_ids(rag.vector_store)
+    with Session(engine) as session:
+        sources = session.exec(select(ChunkSource).where(ChunkSource.file_id == file_id)).all()
+    assert rag.vector_store.count() == len(sources)
+
+
+def test_locked_database_parks_the_file_and_keeps_the_transcript(engine):
+    file_id = upload(engine, "tus-worker-locked", "Krátký zápis.")
+    blocker = sqlite3.connect(engine.url.database, isolation_level=None)
+
+    with Session(engine) as session:
+        f = session.get(FileMeta, file_id)
+        # what process_file records after a successful Whisper call
+        transcript = {
+            "text": "Přepis nahrávky.",
+            "document": "Přepis nahrávky.",
+            "blocks": [{"kind": "transcript", "start": 0, "end": 16}],
+        }
+        f.get_content().transcript_text = transcript["text"]
+        f.analysis_status = "done"
+
+        # another process holds the write lock for longer than busy_timeout
+        blocker.execute("BEGIN IMMEDIATE")
+        with pytest.raises(OperationalError) as error:
+            session.flush()
+        blocker.execute("ROLLBACK")
+        assert is_transient(error.value)
+
+        f = worker.reload_after_failure(session, file_id, transcript)
+        worker.record_failure(f, error.value)
+        session.commit()
+
+    blocker.close()
+    with Session(engine) as session:
+        f = session.get(FileMeta, file_id)
+        assert f.analysis_status == "parked"
+        assert f.analysis_attempts == 1
+        assert "database is locked" in f.analysis_error
+        assert f.content.transcript_text == "Přepis nahrávky."
+
+
+def test_retry_reuses_the_transcript_with_matching_block_offsets(engine, monkeypatch):
+    segments = [
+        {"text": " Dobrý den.", "start": 0.0, "end": 1.0},
+        {"text": "Druhá věta,", "start": 1.0, "end": 2.0},
+        {"text": " třetí věta je delší.", "start": 2.0, "end": 4.0},
+    ]
+    whisper_calls = []
+
+    def transcribe(file_meta, timeout):
+        whisper_calls.append(file_meta.id)
+        # Whisper's text is its raw segments joined without a separator
+        return "".join(s["text"] for s in segments).strip(), segments
+
+    def analysis_down(prompt, timeout=300):
+        raise RuntimeError("analysis failed")
+
+    indexed = []
+    monkeypatch.setattr(worker, "transcribe_with_whisper", transcribe)
+    monkeypatch.setattr(worker, "index_document", lambda session, f, doc: indexed.append(doc) or [])
+
+    with Session(engine) as session:
+        f = FileMeta(tus_id="tus-worker-audio", filename="porada.mp3", school_id=1)
+        worker.mark_processing(f)
+        session.add(f)
+        session.commit()
+        file_id = f.id
+
+        monkeypatch.setattr(analysis, "ask_llm", analysis_down)
+        transcript = {}
+        with pytest.raises(RuntimeError) as error:
+            worker.process_file(session, f, Deadline(60), {}, transcript)
+        f = worker.reload_after_failure(session, file_id, transcript)
+        worker.record_failure(f, error.value)
+        session.commit()
+
+    monkeypatch.setattr(analysis, "ask_llm", lambda prompt, timeout=300: dict(ANALYSIS_RESPONSE))
+    with Session(engine) as session:
+        worker.process_file(session, session.get(FileMeta, file_id), Deadline(60), {})
+
+    assert whisper_calls == [file_id]
+    doc = indexed[0]
+    assert [doc.text[b["start"]:b["end"]] for b in doc.blocks] == [s["text"].strip() for s in segments]
+
+
+def test_only_lock_errors_of_the_database_are_transient():
+    locked = OperationalError("UPDATE filemeta", {}, sqlite3.OperationalError("database is locked"))
+    missing = OperationalError("SELECT", {}, sqlite3.OperationalError("no such table: filemeta"))
+    assert is_transient(locked)
+    assert not is_transient(missing)
@@ -5,7 +5,14 @@ import { config } from './config.js'
 
 const DEFAULT_SCHOOLS_PAGE_SIZE = 10
 const DEFAULT_FILES_PAGE_SIZE = 10
-const UNKNOWN_DOCUMENT_TYPE_VALUE = '__unknown__'
+// the table only needs these columns; text and JSON blobs are fetched per file when its details are opened
+const FILE_LIST_FIELDS = [
+    'id', 'filename', 'tus_id', 'school_id', 'analysis_status', 'analysis_type', 'analysis_error',
+    'uploaded_at', 'analysis_started_at', 'analysis_finished_at', 'audio_seconds',
+].join(',')
+const FILE_DETAIL_FIELDS = 'id,basic_stats,llm_summary,transcript_text'
+// analysis types the LLM assigns, offered in the document type filter
+const DOCUMENT_TYPES = ['attendance_checklist', 'feedback_form', 'record']
 
 const FILE_FORMAT_DEFINITIONS = [
     {
@@ -36,7 +43,9 @@ const DEFAULT_FILE_FORMAT = {
 
 let regions = []
 let schools = []
+// only the page of files on screen; filtering and paging happen in the backend
 let files = []
+const fileDetails = new Map()
 
 const schoolPagination = {
     page: 1,
@@ -45,7 +54,12 @@ const schoolPagination = {
 
 const filePagination = {
     page: 1,
-    pageSize: DEFAULT_FILES_PAGE_SIZE
+    pageSize: DEFAULT_FILES_PAGE_SIZE,
+    // cursors[i] loads page i + 1 (null: first page)
+    cursors: [null],
+    nextCursor: null,
+    // a response to an older request (filters changed meanwhile) is dropped
+    request: 0
 }
 
 function escapeHtml(str) {
@@ -83,29 +97,72 @@ function showAlert(message, type = 'success') {
 
 async function loadData() {
     try {
-        const [regionData, schoolData, fileData] = await Promise.all([
+        const [regionData, schoolData] = await Promise.all([
             regionsApi.list(),
             schoolsApi.list(),
-            filesApi.list(),
         ])
 
         regions = regionData
         schools = schoolData
-        files = fileData
         schoolPagination.page = 1
-        filePagination.page = 1
 
         renderRegions()
         renderRegionSelects()
         renderSchoolFilterSelect()
         renderDocumentTypeFilterSelect()
-        renderFileFormatFilterSelect()
         renderSchools()
-        renderFiles()
     } catch (error) {
         console.error('Failed to load admin data:', error)
         showAlert('Unable to load data from backend. Check console for details.', 'error')
+        return
     }
+    await reloadFiles()
+}
+
+function fileFilters() {
+    const value = id => document.getElementById(id)?.value || null
+    const schoolId = value('files-school-filter')
+    return {
+        status: value('files-status-filter'),
+        analysis_type: value('files-doc-type-filter'),
+        // a school is more specific than its region
+        school_id: schoolId,
+        region_id: schoolId ? null : value('files-region-filter'),
+    }
+}
+
+async function loadFilesPage() {
+    const request = ++filePagination.request
+    try {
+        const page = await filesApi.page({
+            ...fileFilters(),
+            fields: FILE_LIST_FIELDS,
+            limit: filePagination.pageSize,
+            cursor: filePagination.cursors[filePagination.page - 1],
+        })
+        if (request !== filePagination.request) return
+        if (!page.items.length && filePagination.page > 1) {
+            // the files of this page are gone (e.g. filtered by status and retried)
+            filePagination.page -= 1
+            return loadFilesPage()
+        }
+
+        files = page.items
+        filePagination.nextCursor = page.nextCursor
+        renderFiles()
+    } catch (error) {
+        if (request !== filePagination.request) return
+        console.error('Failed to load files:', error)
+        showAlert('Unable to load files from backend. Check console for details.', 'error')
+    }
+}
+
+// back to the first page, after the filters, the page size or the data changed
+function reloadFiles() {
+    filePagination.page = 1
+    filePagination.cursors = [null]
+    fileDetails.clear()
+    return loadFilesPage()
 }
 
 function formatDateTime(iso) {
@@ -312,32 +369,17 @@ function renderDocumentTypeFilterSelect() {
     const prevValue = select.value
     select.innerHTML = '<option value="">All document types</option>'
 
-    const typeMap = new Map()
-    files.forEach(file => {
-        const { type, label, icon } = getDocumentTypeInfo(file)
-        const value = type ?? UNKNOWN_DOCUMENT_TYPE_VALUE
-        if (!typeMap.has(value)) {
-            typeMap.set(value, {
-                label: label || 'Unknown document type',
-                icon: icon || ''
-            })
-        }
-    })
-
-    const sortedTypes = Array
-        .from(typeMap.entries())
-        .sort((a, b) => a[1].label.localeCompare(b[1].label))
-
-    sortedTypes.forEach(([value, info]) => {
-        const option = document.createElement('option')
-        option.value = value
-        const text = info.icon ? `${info.icon} ${info.label}` : info.label
-        option.textContent = text
-        select.appendChild(option)
-    })
+    DOCUMENT_TYPES
+        .map(type => getDocumentTypeInfo({ analysis_type: type }))
+        .sort((a, b) => a.label.localeCompare(b.label))
+        .forEach(info => {
+            const option = document.createElement('option')
+            option.value = info.type
+            option.textContent = `${info.icon} ${info.label}`
+            select.appendChild(option)
+        })
 
-    const optionExists = sortedTypes.some(([value]) => value === prevValue)
-    select.value = optionExists ? prevValue : ''
+    select.value = DOCUMENT_TYPES.includes(prevValue) ? prevValue : ''
 }
 
 function getFileFormatInfo(file) {
@@ -353,7 +395,8 @@ function getFileFormatInfo(file) {
         return match
     }
 
-    if (!extension && file?.transcript_text) {
+    // audio duration is only estimated for audio uploads
+    if (!extension && file?.audio_seconds != null) {
         const audioFormat = FILE_FORMAT_DEFINITIONS.find(def => def.value === 'audio')
         if (audioFormat) {
             return audioFormat
@@ -364,22 +407,11 @@ function getFileFormatInfo(file) {
 }
 
 function getDocumentTypeInfo(file) {
-    const raw = file.llm_summary
-    if (!raw) {
+    const detectedType = file.analysis_type || null
+    if (!detectedType) {
         return { type: null, icon: '📄', label: 'Unknown document type' }
     }
 
-    let obj = raw
-    if (typeof raw === 'string') {
-        try {
-            obj = JSON.parse(raw)
-        } catch (e) {
-            return { type: null, icon: '📄', label: 'Unknown document type' }
-        }
-    }
-
-    const detectedType = obj?.data?.type || obj?.type || null
-
     switch (detectedType) {
         case 'attendance_checklist':
             return { type: detectedType, icon: '📋', label: 'Attendance checklist' }
@@ -392,97 +424,21 @@ function getDocumentTypeInfo(file) {
     }
 }
 
-function renderFileFormatFilterSelect() {
-    const select = document.getElementById('files-format-filter')
-    if (!select) return
-
-    const prevValue = select.value
-    select.innerHTML = '<option value="">All formats</option>'
-
-    const formatMap = new Map()
-    files.forEach(file => {
-        const { value, label, icon } = getFileFormatInfo(file)
-        if (!formatMap.has(value)) {
-            formatMap.set(value, { label, icon })
-        }
-    })
-
-    const sortedFormats = Array
-        .from(formatMap.entries())
-        .sort((a, b) => a[1].label.localeCompare(b[1].label))
-
-    sortedFormats.forEach(([value, info]) => {
-        const option = document.createElement('option')
-        option.value = value
-        option.textContent = info.icon ? `${info.icon} ${info.label}` : info.label
-        select.appendChild(option)
-    })
-
-    const optionExists = formatMap.has(prevValue)
-    select.value = optionExists ? prevValue : ''
-}
-
 function renderFiles() {
     const container = document.getElementById('files-list')
     if (!container) return
 
-    const regionFilter = document.getElementById('files-region-filter')?.value || ''
-    const schoolFilter = document.getElementById('files-school-filter')?.value || ''
-    const docTypeFilter = document.getElementById('files-doc-type-filter')?.value || ''
-    const formatFilter = document.getElementById('files-format-filter')?.value || ''
-    const statusFilter = document.getElementById('files-status-filter')?.value || ''
-
-    const filteredFiles = files.filter(file => {
-        const school = schools.find(s => s.id === file.school_id)
-        const matchesRegion = regionFilter
-            ? school && String(school.region_id) === regionFilter
-            : true
-        const matchesSchool = schoolFilter
-            ? String(file.school_id) === schoolFilter
-            : true
-        const { type } = getDocumentTypeInfo(file)
-        const docTypeValue = type ?? UNKNOWN_DOCUMENT_TYPE_VALUE
-        const matchesDocType = docTypeFilter
-            ? docTypeValue === docTypeFilter
-            : true
-        const fileFormat = getFileFormatInfo(file)
-        const matchesFormat = formatFilter
-            ? fileFormat.value === formatFilter
-            : true
-        const fileStatus = file.analysis_status || 'pending'
-        const matchesStatus = statusFilter
-            ? fileStatus === statusFilter
-            : true
-        return matchesRegion && matchesSchool && matchesDocType && matchesFormat && matchesStatus
-    })
-
-    if (!filteredFiles.length) {
-        const emptyMessage = schoolFilter
-            ? 'No files uploaded for the selected school'
+    if (!files.length) {
+        const filters = fileFilters()
+        const emptyMessage = Object.values(filters).some(Boolean)
+            ? 'No files match the selected filters'
             : 'No files uploaded yet'
         container.innerHTML = `<div class="empty-state">${emptyMessage}</div>`
-        renderFilePagination({ totalItems: 0, totalPages: 0, start: 0, end: 0 })
+        renderFilePagination()
         return
     }
 
-    const safePageSize = Math.max(1, Number(filePagination.pageSize) || DEFAULT_FILES_PAGE_SIZE)
-    if (safePageSize !== filePagination.pageSize) {
-        filePagination.pageSize = safePageSize
-    }
-
-    const totalItems = filteredFiles.length
-    const totalPages = Math.max(Math.ceil(totalItems / safePageSize), 1)
-    if (filePagination.page > totalPages) {
-        filePagination.page = totalPages
-    }
-    const currentPage = Math.max(filePagination.page, 1)
-    filePagination.page = currentPage
-
-    const startIndex = (currentPage - 1) * safePageSize
-    const paginatedFiles = filteredFiles.slice(startIndex, startIndex + safePageSize)
-    const endIndex = startIndex + paginatedFiles.length
-
-    container.innerHTML = paginatedFiles.map(file => {
+    container.innerHTML = files.map(file => {
         const school = schools.find(s => s.id === file.school_id)
         const region = school ? regions.find(r => r.id === school.region_id) : null
 
@@ -495,6 +451,7 @@ function renderFiles() {
             pending: 'badge-secondary',
             processing: 'badge-info',
             done: 'badge-success',
+            parked: 'badge-warning',
             failed: 'badge-danger',
         }[status] || 'badge-secondary'
 
@@ -503,25 +460,6 @@ function renderFiles() {
         const { label: formatLabel, icon: formatIcon } = getFileFormatInfo(file)
         const formatDisplay = formatIcon ? `${formatIcon} ${formatLabel}` : formatLabel
 
-        const basicStatsPreview = file.basic_stats
-            ? `<pre class="file-json-preview">${JSON.stringify(file.basic_stats, null, 2)}</pre>`
-            : '<span class="text-muted">No basic stats</span>'
-
-        const llmSummaryPreview = file.llm_summary
-            ? `<pre class="file-json-preview">${JSON.stringify(file.llm_summary, null, 2)}</pre>`
-            : '<span class="text-muted">No LLM summary</span>'
-
-        const transcriptPreview = file.transcript_text
-            ? `
-                <details class="file-details">
-                    <summary>Transcript</summary>
-                    <pre class="file-json-preview file-transcript-preview">
-                        ${escapeHtml(file.transcript_text)}
-                    </pre>
-                </details>
-            `
-            : ''
-
                 return `
             <div class="list-item">
                 <div class="list-item-info">
@@ -553,15 +491,10 @@ function renderFiles() {
                             ? `<div class="list-item-meta text-danger">Error: ${file.analysis_error}</div>`
                             : ''
                     }
-                    <details class="file-details">
-                        <summary>Basic stats</summary>
-                        ${basicStatsPreview}
-                    </details>
-                    <details class="file-details">
-                        <summary>LLM summary</summary>
-                        ${llmSummaryPreview}
+                    <details class="file-details" data-file-id="${file.id}">
+                        <summary>Basic stats, LLM summary and transcript</summary>
+                        <div class="file-details-body">${renderFileDetails(fileDetails.get(file.id))}</div>
                     </details>
-                    ${transcriptPreview}
                 </div>
                 <div class="list-item-actions" style="display: flex; flex-direction: column; gap: 8px;">
                     <button class="btn btn-secondary" onclick="previewFile('${file.id}')">
@@ -576,37 +509,82 @@ function renderFiles() {
         `
     }).join('')
 
-    renderFilePagination({
-        totalItems,
-        totalPages,
-        start: startIndex + 1,
-        end: endIndex
+    container.querySelectorAll('details[data-file-id]').forEach(details => {
+        details.addEventListener('toggle', () => {
+            if (details.open) {
+                loadFileDetails(Number(details.dataset.fileId), details)
+            }
+        })
     })
+
+    renderFilePagination()
 }
 
-function renderFilePagination({ totalItems, totalPages, start, end }) {
+function renderFileDetails(details) {
+    if (!details) {
+        return '<span class="text-muted">Loading…</span>'
+    }
+
+    const basicStatsPreview = details.basic_stats
+        ? `<pre class="file-json-preview">${JSON.stringify(details.basic_stats, null, 2)}</pre>`
+        : '<span class="text-muted">No basic stats</span>'
+
+    const llmSummaryPreview = details.llm_summary
+        ? `<pre class="file-json-preview">${escapeHtml(JSON.stringify(details.llm_summary, null, 2))}</pre>`
+        : '<span class="text-muted">No LLM summary</span>'
+
+    const transcriptPreview = details.transcript_text
+        ? `
+            <div class="list-item-meta">Transcript</div>
+            <pre class="file-json-preview file-transcript-preview">${escapeHtml(details.transcript_text)}</pre>
+        `
+        : ''
+
+    return `
+        <div class="list-item-meta">Basic stats</div>
+        ${basicStatsPreview}
+        <div class="list-item-meta">LLM summary</div>
+        ${llmSummaryPreview}
+        ${transcriptPreview}
+    `
+}
+
+async function loadFileDetails(id, element) {
+    const body = element.querySelector('.file-details-body')
+    if (!fileDetails.has(id)) {
+        try {
+            fileDetails.set(id, await filesApi.get(id, { fields: FILE_DETAIL_FIELDS }))
+        } catch (error) {
+            console.error('Failed to load file details:', error)
+            if (body) body.innerHTML = '<span class="text-danger">Unable to load details</span>'
+            return
+        }
+    }
+    if (body) body.innerHTML = renderFileDetails(fileDetails.get(id))
+}
+
+function renderFilePagination() {
     const container = document.getElementById('files-pagination')
     if (!container) return
 
-    if (!totalItems) {
+    const currentPage = filePagination.page
+    if (!files.length) {
         container.innerHTML = ''
         return
     }
 
-    const pageCount = Math.max(totalPages, 1)
-    const currentPage = Math.min(Math.max(filePagination.page, 1), pageCount)
-    const rangeStart = Math.min(start, totalItems)
-    const rangeEnd = Math.min(end, totalItems)
+    const rangeStart = (currentPage - 1) * filePagination.pageSize + 1
+    const rangeEnd = rangeStart + files.length - 1
     const prevDisabled = currentPage <= 1
-    const nextDisabled = currentPage >= pageCount
+    const nextDisabled = !filePagination.nextCursor
 
     container.innerHTML = `
-        <div class="pagination-info">Ukazují se ${rangeStart}-${rangeEnd} z ${totalItems}</div>
+        <div class="pagination-info">Ukazují se ${rangeStart}-${rangeEnd}</div>
         <div class="pagination-controls">
             <button type="button" class="btn btn-secondary" data-action="prev" ${prevDisabled ? 'disabled' : ''}>
                 Previous
             </button>
-            <div class="pagination-page">Page ${currentPage} / ${pageCount}</div>
+            <div class="pagination-page">Page ${currentPage}</div>
             <button type="button" class="btn btn-secondary" data-action="next" ${nextDisabled ? 'disabled' : ''}>
                 Next
             </button>
@@ -616,15 +594,15 @@ function renderFilePagination({ totalItems, totalPages, start, end }) {
     container.querySelector('[data-action="prev"]')?.addEventListener('click', () => {
         if (filePagination.page > 1) {
             filePagination.page -= 1
-            renderFiles()
+            loadFilesPage()
         }
     })
 
     container.querySelector('[data-action="next"]')?.addEventListener('click', () => {
-        const maxPage = Math.max(pageCount, 1)
-        if (filePagination.page < maxPage) {
+        if (filePagination.nextCursor) {
+            filePagination.cursors[filePagination.page] = filePagination.nextCursor
             filePagination.page += 1
-            renderFiles()
+            loadFilesPage()
         }
     })
 }
@@ -689,7 +667,8 @@ async function retryFile(id) {
     try {
         await filesApi.retry(id)
         showAlert('Analysis was successfully refreshed', 'success')
-        await loadData()
+        fileDetails.delete(Number(id))
+        await loadFilesPage()
     } catch (err) {
         console.error('Error refreshing analysis:', err)
         showAlert('Failed to refresh analysis', 'error')
@@ -719,7 +698,6 @@ function setupForms() {
     const filesRegionFilter = document.getElementById('files-region-filter')
     const filesSchoolFilter = document.getElementById('files-school-filter')
     const filesDocTypeFilter = document.getElementById('files-doc-type-filter')
-    const filesFormatFilter = document.getElementById('files-format-filter')
     const filesStatusFilter = document.getElementById('files-status-filter')
     const filesPageSizeSelect = document.getElementById('files-page-size')
 
@@ -749,27 +727,13 @@ function setupForms() {
     })
 
     filesRegionFilter?.addEventListener('change', () => {
-        filePagination.page = 1
         renderSchoolFilterSelect()
         renderSchools()
-        renderFiles()
-    })
-    filesSchoolFilter?.addEventListener('change', () => {
-        filePagination.page = 1
-        renderFiles()
-    })
-    filesDocTypeFilter?.addEventListener('change', () => {
-        filePagination.page = 1
-        renderFiles()
-    })
-    filesFormatFilter?.addEventListener('change', () => {
-        filePagination.page = 1
-        renderFiles()
-    })
-    filesStatusFilter?.addEventListener('change', () => {
-        filePagination.page = 1
-        renderFiles()
+        reloadFiles()
     })
+    filesSchoolFilter?.addEventListener('change', () => reloadFiles())
+    filesDocTypeFilter?.addEventListener('change', () => reloadFiles())
+    filesStatusFilter?.addEventListener('change', () => reloadFiles())
 
     if (filesPageSizeSelect) {
         const parsedValue = Number(filesPageSizeSelect.value)
@@ -782,8 +746,7 @@ function setupForms() {
             filePagination.pageSize = !Number.isNaN(newSize) && newSize > 0
                 ? newSize
                 : DEFAULT_FILES_PAGE_SIZE
-            filePagination.page = 1
-            renderFiles()
+            reloadFiles()
         })
     }
 
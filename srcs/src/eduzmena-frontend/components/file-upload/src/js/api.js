@@ -44,6 +44,40 @@ async function request(path, options = {}) {
     return text ? JSON.parse(text) : null
 }
 
+/**
+ * Build a query string from an object, skipping empty values
+ * @param {Record<string, any>} params
+ * @returns {string}
+ */
+function buildQuery(params = {}) {
+    const search = new URLSearchParams()
+    Object.entries(params).forEach(([key, value]) => {
+        if (value !== null && value !== undefined && value !== '') {
+            search.set(key, value)
+        }
+    })
+    const query = search.toString()
+    return query ? `?${query}` : ''
+}
+
+/**
+ * Fetch one page of a keyset-paginated endpoint
+ * @param {string} path
+ * @param {Record<string, any>} params
+ * @returns {Promise<{items: any[], nextCursor: string | null}>}
+ */
+async function requestPage(path, params = {}) {
+    const response = await fetch(buildUrl(`${path}${buildQuery(params)}`))
+    if (!response.ok) {
+        const errorText = await response.text().catch(() => 'Unknown error')
+        throw new Error(`Request failed (${response.status}): ${errorText}`)
+    }
+    return {
+        items: await response.json(),
+        nextCursor: response.headers.get('X-Next-Cursor'),
+    }
+}
+
 export const regionsApi = {
     list: () => request('/regions'),
     create: (payload) => request('/regions', { method: 'POST', body: JSON.stringify(payload) }),
@@ -62,7 +96,9 @@ export const schoolsApi = {
 }
 
 export const filesApi = {
-    list: () => request('/files'),
+    list: (params = {}) => request(`/files${buildQuery(params)}`),
+    page: (params = {}) => requestPage('/files', params),
+    get: (id, params = {}) => request(`/files/${id}${buildQuery(params)}`),
     create: (payload) => request('/files', { method: 'POST', body: JSON.stringify(payload) }),
     retry: (id) => request(`/files/${id}/retry`, {
         method: 'POST',
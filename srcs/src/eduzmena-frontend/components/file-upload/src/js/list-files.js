@@ -3,11 +3,22 @@
 import { filesApi } from './api.js'
 import { config } from './config.js'
 
+const PAGE_SIZE = 100
+
 let uploadedFiles = []
+// cursors of the pages shown so far; the current page starts after the last one (null: first page)
+let cursors = [null]
+let nextCursor = null
 
 async function fetchFiles() {
     try {
-        uploadedFiles = await filesApi.list()
+        const page = await filesApi.page({
+            limit: PAGE_SIZE,
+            order: 'desc',
+            cursor: cursors[cursors.length - 1],
+        })
+        uploadedFiles = page.items
+        nextCursor = page.nextCursor
         renderFiles()
     } catch (error) {
         console.error('Error fetching files:', error)
@@ -24,6 +35,7 @@ function renderFiles() {
 
     if (!uploadedFiles.length) {
         container.innerHTML = '<div class="empty-state">No files uploaded yet</div>'
+        renderPagination()
         return
     }
 
@@ -45,6 +57,44 @@ function renderFiles() {
             </div>
         `
     }).join('')
+    renderPagination()
+}
+
+function renderPagination() {
+    let container = document.getElementById('files-pagination')
+    if (!container) {
+        container = document.createElement('div')
+        container.id = 'files-pagination'
+        container.className = 'files-pagination'
+        document.getElementById('files-list').after(container)
+    }
+
+    const pageNumber = cursors.length
+    container.innerHTML = `
+        <div class="pagination-controls">
+            <button type="button" class="btn btn-secondary" data-action="prev" ${pageNumber <= 1 ? 'disabled' : ''}>
+                Newer
+            </button>
+            <div class="pagination-page">Page ${pageNumber}</div>
+            <button type="button" class="btn btn-secondary" data-action="next" ${nextCursor ? '' : 'disabled'}>
+                Older
+            </button>
+        </div>
+    `
+
+    container.querySelector('[data-action="prev"]')?.addEventListener('click', () => {
+        if (cursors.length > 1) {
+            cursors.pop()
+            fetchFiles()
+        }
+    })
+
+    container.querySelector('[data-action="next"]')?.addEventListener('click', () => {
+        if (nextCursor) {
+            cursors.push(nextCursor)
+            fetchFiles()
+        }
+    })
 }
 
 function refreshFiles() {
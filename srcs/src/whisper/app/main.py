@@ -1,9 +1,11 @@
 import os
-from typing import Optional
+import time
+from typing import List, Optional
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
 from faster_whisper import WhisperModel
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
 
 # ----- Model loading (one global instance) -----
 model_name = os.getenv("WHISPER_MODEL", "small")
@@ -12,6 +14,18 @@ compute_type = os.getenv("WHISPER_COMPUTE_TYPE", "int8")  # int8 / float16 / flo
 
 model = WhisperModel(model_name, device=device, compute_type=compute_type)
 
+# ----- Metrics -----
+TRANSCRIPTION_SECONDS = Histogram(
+    "whisper_transcription_seconds", "Duration of a transcription request",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600),
+)
+REAL_TIME_FACTOR = Histogram(
+    "whisper_real_time_factor", "Processing time per second of audio",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 3, 5),
+)
+AUDIO_SECONDS = Counter("whisper_audio_seconds_total", "Seconds of audio transcribed")
+FAILURES = Counter("whisper_failures_total", "Transcription requests that failed")
+
 # ----- API schema -----
 class TranscriptionRequest(BaseModel):
     # Path to audio file relative to /data (e.g. "uploads/xyz.wav")
@@ -19,8 +33,15 @@ class TranscriptionRequest(BaseModel):
     language: Optional[str] = "cs"  # default Czech
 
 
+class TranscriptionSegment(BaseModel):
+    start: float  # seconds
+    end: float
+    text: str
+
+
 class TranscriptionResponse(BaseModel):
     text: str
+    segments: List[TranscriptionSegment] = []
 
 
 app = FastAPI(title="Whisper STT", version="0.1.0")
@@ -31,6 +52,11 @@ def health():
     return {"status": "ok", "model": model_name, "device": device}
 
 
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.post("/transcribe", response_model=TranscriptionResponse)
 def transcribe(req: TranscriptionRequest):
     # If not absolute, treat as relative to /data shared volume
@@ -41,14 +67,27 @@ def transcribe(req: TranscriptionRequest):
     if not os.path.exists(audio_path):
         raise HTTPException(status_code=404, detail=f"File not found: {audio_path}")
 
+    started = time.perf_counter()
     try:
         segments, info = model.transcribe(
             audio_path,
             language=req.language,
             beam_size=5,
         )
+        # segments is a lazy generator: decoding happens while iterating
+        segments = [
+            TranscriptionSegment(start=segment.start, end=segment.end, text=segment.text)
+            for segment in segments
+        ]
     except Exception as e:
+        FAILURES.inc()
         raise HTTPException(status_code=500, detail=str(e))
 
+    elapsed = time.perf_counter() - started
+    TRANSCRIPTION_SECONDS.observe(elapsed)
+    if info.duration:
+        AUDIO_SECONDS.inc(info.duration)
+        REAL_TIME_FACTOR.observe(elapsed / info.duration)
+
     text = "".join(segment.text for segment in segments)
-    return TranscriptionResponse(text=text)
+    return TranscriptionResponse(text=text, segments=segments)